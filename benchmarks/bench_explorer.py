@@ -0,0 +1,65 @@
+"""
+GeneExplorer sweep time against scoring every variant with calculateGeneCodes, over
+synthetic features and a grid of thresholds and weights.
+
+    python benchmarks/bench_explorer.py [--sizes 50 10000 1000000] [--steps 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from bench_genes import makeFeatures  # noqa: E402
+from GeneExplorer import GeneExplorer  # noqa: E402
+from genes import GENE_MODEL, calculateGeneCodes  # noqa: E402
+
+
+def makeGrid(steps):
+    def around(name, spread):
+        value = GENE_MODEL[name]
+        return list(np.linspace(value - spread, value + spread, steps))
+
+    return {
+        "moodThreshold": around("moodThreshold", 0.1),
+        "tempoThreshold": around("tempoThreshold", 20),
+        "complexityThreshold": around("complexityThreshold", 0.05),
+        "instrumentalThreshold": around("instrumentalThreshold", 0.2),
+        "energyWeight": around("energyWeight", 0.1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 10_000, 1_000_000])
+    parser.add_argument("--steps", type=int, default=5, help="values per grid parameter")
+    parser.add_argument("--sample", type=int, default=20, help="variants timed one by one")
+    args = parser.parse_args()
+
+    grid = makeGrid(args.steps)
+    print(f"{'rows':>10} {'variants':>9} {'sweep (ms)':>11} {'one by one (ms)':>16} {'speedup':>8}")
+    for n in args.sizes:
+        explorer = GeneExplorer(makeFeatures(n))
+        start = time.perf_counter()
+        variants, counts = explorer.sweepCounts(grid)
+        sweepSeconds = time.perf_counter() - start
+
+        # Time a sample of variants one by one and check they agree with the sweep
+        sample = np.linspace(0, len(variants) - 1, args.sample).astype(int)
+        start = time.perf_counter()
+        for i in sample:
+            codes = calculateGeneCodes(explorer.columns, dict(GENE_MODEL, **variants[i]))
+            assert (np.bincount(codes, minlength=counts.shape[1]) == counts[i]).all()
+        oneByOne = (time.perf_counter() - start) / len(sample) * len(variants)
+
+        print(
+            f"{n:>10} {len(variants):>9} {sweepSeconds * 1000:>11.1f} "
+            f"{oneByOne * 1000:>16.1f} {oneByOne / sweepSeconds:>7.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
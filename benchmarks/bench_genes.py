@@ -0,0 +1,79 @@
+"""
+Compare the row-wise UserGenes.calculateGene against the vectorized genes.calculateGenes.
+
+    python benchmarks/bench_genes.py [--sizes 50 10000 1000000] [--max-rowwise 1000000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from genes import calculateGenes  # noqa: E402
+from UserGenes import UserGenes  # noqa: E402
+
+
+def makeFeatures(n, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "valence": rng.random(n),
+            "mode": rng.integers(0, 2, n),
+            "tempo": rng.uniform(50, 200, n),
+            "instrumentalness": rng.random(n),
+            "speechiness": rng.random(n),
+            "acousticness": rng.random(n),
+            "energy": rng.random(n),
+            "danceability": rng.random(n),
+            "time_signature": rng.choice([3, 4, 4, 4, 5], n),
+        }
+    )
+    # Pin a few rows exactly on the thresholds to exercise the comparisons
+    edges = min(n, 4)
+    df.loc[: edges - 1, "tempo"] = 100.0
+    df.loc[: edges - 1, "instrumentalness"] = 0.5
+    df.loc[: edges - 1, "valence"] = 0.625
+    df.loc[: edges - 1, "mode"] = 0
+    return df
+
+
+def timeIt(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 10_000, 1_000_000])
+    parser.add_argument(
+        "--max-rowwise",
+        type=int,
+        default=1_000_000,
+        help="skip the row-wise run above this many rows",
+    )
+    args = parser.parse_args()
+
+    # calculateGene does not touch self, so no Spotify client is needed
+    rowwise = lambda row: UserGenes.calculateGene(None, row)  # noqa: E731
+
+    print(f"{'rows':>10} {'row-wise (s)':>14} {'vectorized (s)':>16} {'speedup':>9}")
+    for n in args.sizes:
+        df = makeFeatures(n)
+
+        vectorTime, vectorGenes = timeIt(lambda: calculateGenes(df))
+
+        if n <= args.max_rowwise:
+            rowTime, rowGenes = timeIt(lambda: df.apply(rowwise, axis=1))
+            assert (np.asarray(vectorGenes, dtype=object) == rowGenes.to_numpy()).all()
+            print(f"{n:>10} {rowTime:>14.4f} {vectorTime:>16.4f} {rowTime / vectorTime:>8.0f}x")
+        else:
+            print(f"{n:>10} {'skipped':>14} {vectorTime:>16.4f} {'-':>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Per-profile memory of the old stringly-typed track frame versus the compact schema,
+built from the recentTracks.csv fixture scaled up with synthetic track IDs.
+
+    python benchmarks/bench_memory.py [--scales 1 100 1000]
+"""
+import argparse
+import ast
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from genes import calculateGenes  # noqa: E402
+from trackSchema import (  # noqa: E402
+    ArtistTable,
+    compactAudioFeatures,
+    createCompactTrackFrame,
+)
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "..", "recentTracks.csv")
+LIST_COLUMNS = ["artistNames", "artistLinks", "artistGenres"]
+FEATURE_COLUMNS = [
+    "danceability", "energy", "key", "loudness", "mode", "speechiness",
+    "acousticness", "instrumentalness", "liveness", "valence", "tempo", "type",
+    "uri", "track_href", "analysis_url", "duration_ms", "time_signature",
+]
+
+
+def loadFixture(scale):
+    base = pd.read_csv(FIXTURE, index_col=0, converters={c: ast.literal_eval for c in LIST_COLUMNS})
+    frames = []
+    for i in range(scale):
+        frame = base.copy()
+        frame["id"] = frame["id"] + f"-{i}"
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def toSpotifyObjects(oldDF):
+    tracks, artists = [], {}
+    for row in oldDF.itertuples(index=False):
+        credited = [
+            {"id": link.rsplit("/", 1)[1], "name": name}
+            for name, link in zip(row.artistNames, row.artistLinks)
+        ]
+        tracks.append(
+            {
+                "id": row.id,
+                "name": row.trackName,
+                "popularity": int(row.trackPopularity.split()[0]),
+                "duration_ms": int(row.trackDurationMs.split()[0]),
+                "explicit": bool(row.trackExplicit),
+                "album": {
+                    "name": row.albumName,
+                    "album_type": row.albumType,
+                    "release_date": row.albumReleaseDate,
+                    "images": [{"url": row.albumCoverURL}],
+                },
+                "artists": credited,
+            }
+        )
+        artists[row.artistID] = {
+            "id": row.artistID,
+            "popularity": int(row.artistPopularity.split()[0]),
+            "genres": row.artistGenres,
+        }
+    return tracks, list(artists.values())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 100, 1000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'before (bytes)':>16} {'after (bytes)':>15} {'ratio':>7}")
+    for scale in args.scales:
+        oldDF = loadFixture(scale)
+        before = int(oldDF.memory_usage(deep=True).sum())
+
+        tracks, artistInfo = toSpotifyObjects(oldDF)
+        artists = ArtistTable()
+        artists.add(tracks, artistInfo)
+        newDF = createCompactTrackFrame(tracks).merge(
+            compactAudioFeatures(
+                oldDF[["id"] + FEATURE_COLUMNS].drop_duplicates(subset="id")
+            ),
+            on="id",
+        )
+        newDF["gene"] = calculateGenes(newDF)
+        newDF["inLibrary"] = oldDF["inLibrary"].to_numpy()
+        after = int(newDF.memory_usage(deep=True).sum()) + artists.memoryUsage()
+
+        print(f"{len(oldDF):>8} {before:>16} {after:>15} {before / after:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
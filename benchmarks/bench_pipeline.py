@@ -0,0 +1,120 @@
+"""
+Offline timings for the profile pipeline and every Flask route, served by FakeSpotify
+from the checked-in fixtures. No network, Spotify account or Mongo needed.
+
+    python benchmarks/bench_pipeline.py [--scale 10000] [--latency 0.05] [--repeat 3]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# app.py builds its OAuth helpers at import time, so give it placeholder settings
+for name, value in {
+    "SPOTIPY_CLIENT_ID": "benchmark",
+    "SPOTIPY_CLIENT_SECRET": "benchmark",
+    "SPOTIPY_REDIRECT_URI": "http://localhost:5000/callback/",
+    "SPOTIFY_CLIENT_ID": "benchmark",
+    "SPOTIFY_CLIENT_SECRET": "benchmark",
+    "SPOTIFY_REDIRECT_URI": "http://localhost:5000/callback/",
+    "HISTORY_DB_PATH": ":memory:",
+}.items():
+    os.environ.setdefault(name, value)
+os.environ.pop("OPENAI_API_KEY", None)
+
+import pandas as pd  # noqa: E402
+
+import app as webapp  # noqa: E402
+from FakeSpotify import FakeSpotify  # noqa: E402
+from UserGenes import UserGenes  # noqa: E402
+
+
+def timeIt(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def report(name, seconds, calls=None, repeat=1):
+    callText = "" if calls is None else f"  {sum(calls.values()) / repeat:.0f} Spotify calls"
+    print(f"{name:<42} {seconds * 1000:>10.1f} ms{callText}")
+
+
+def benchUserGenes(sp, repeat):
+    print("UserGenes")
+
+    def initTracks():
+        UserGenes(sp).initTracksDF()
+
+    sp.resetCounts()
+    report("  initTracksDF", timeIt(initTracks, repeat), sp.callCounts, repeat)
+
+    user = UserGenes(sp)
+    sp.resetCounts()
+    report("  initLibraryDF", timeIt(user.initLibraryDF, 1), sp.callCounts)
+    library = user.libraryDF
+    print(f"  ({len(library)} library tracks)")
+
+    features = pd.DataFrame(library.drop(columns="gene"))
+    report("  addGeneColumn (library)", timeIt(lambda: user.addGeneColumn(features), repeat))
+    report(
+        "  getGeneDataFromDF (library, indexed)",
+        timeIt(lambda: user.getGeneDataFromDF(user.libraryDF), repeat),
+    )
+    report(
+        "  getGeneDataFromDF (unindexed frame)",
+        timeIt(lambda: user.getGeneDataFromDF(features.assign(gene=library["gene"])), repeat),
+    )
+
+
+def benchRoutes(sp, repeat):
+    print("Flask routes (cold = caches cleared before each request)")
+    webapp.get_spotify_client = lambda token_info: sp
+    client = webapp.app.test_client()
+    with client.session_transaction() as session:
+        session["token_info"] = {"access_token": "benchmark"}
+        session["user_id"] = sp.userId
+        session["logged_in"] = True
+
+    client.get("/sidebar_card_data")
+    gene = client.get("/chart_data").get_json()["data"][0]["genre"]
+
+    for route in ["/", "/dashboard_stream", "/chart_data", "/sidebar_card_data", f"/songs/{gene}"]:
+        for temperature in ("cold", "warm"):
+
+            def request():
+                if temperature == "cold":
+                    webapp.profile_cache.clear()
+                    webapp.entity_cache.clear()
+                    webapp.cache.clear()
+                response = client.get(route)
+                # Streamed responses only do their work as the body is read
+                response.get_data()
+                assert response.status_code == 200, (route, response.status_code)
+
+            client.get("/sidebar_card_data")
+            sp.resetCounts()
+            seconds = timeIt(request, repeat)
+            report(f"  GET {route} ({temperature})", seconds, sp.callCounts, repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=int, default=10_000, help="tracks in the fake catalogue")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per fake Spotify call")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    sp = FakeSpotify(scale=args.scale, latency=args.latency)
+    benchUserGenes(sp, args.repeat)
+    benchRoutes(sp, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
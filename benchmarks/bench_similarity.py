@@ -0,0 +1,62 @@
+"""
+Query latency of SimilarityIndex over FakeSpotify's synthetic catalogue, for whole-index
+nearest-track lookups and gene-restricted centroid lookups, from memory and memory-mapped.
+
+    python benchmarks/bench_similarity.py [--scales 10000 100000] [--queries 200]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from FakeSpotify import FakeSpotify  # noqa: E402
+from genes import GENE_CATEGORIES  # noqa: E402
+from SimilarityIndex import SimilarityIndex  # noqa: E402
+
+
+def medianMs(fn, queries):
+    samples = []
+    for i in range(queries):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'tracks':>8} {'storage':>8} {'track k=20 (ms)':>16} {'gene k=20 (ms)':>15}")
+    for scale in args.scales:
+        sp = FakeSpotify(scale=scale)
+        features = pd.DataFrame(list(sp.features_.values()))
+        index = SimilarityIndex()
+        index.add(features)
+
+        path = os.path.join(tempfile.mkdtemp(), "similarity")
+        index.save(path)
+        for storage, loaded in (("memory", index), ("mmap", SimilarityIndex(path))):
+            trackIds = loaded.ids
+            trackMs = medianMs(
+                lambda i: loaded.nearestToTrack(trackIds[i % len(trackIds)], 20), args.queries
+            )
+            geneMs = medianMs(
+                lambda i: loaded.nearest(
+                    loaded.matrix[i % len(trackIds)], 20, gene=GENE_CATEGORIES[i % 16]
+                ),
+                args.queries,
+            )
+            print(f"{len(loaded):>8} {storage:>8} {trackMs:>16.3f} {geneMs:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Cold-start cost of the app's entry modules: wall time to import each one in a fresh
+interpreter, the resident set size afterwards, and the slowest imports it pulls in.
+
+    python benchmarks/bench_startup.py [--modules UserGenes app] [--repeat 5] [--top 8]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# app.py builds its OAuth helpers at import time, so give it placeholder settings
+ENV = {
+    "SPOTIPY_CLIENT_ID": "benchmark",
+    "SPOTIPY_CLIENT_SECRET": "benchmark",
+    "SPOTIPY_REDIRECT_URI": "http://localhost:5000/callback/",
+    "SPOTIFY_CLIENT_ID": "benchmark",
+    "SPOTIFY_CLIENT_SECRET": "benchmark",
+    "SPOTIFY_REDIRECT_URI": "http://localhost:5000/callback/",
+    "HISTORY_DB_PATH": ":memory:",
+}
+
+PROBE = """
+import resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+# ru_maxrss is KiB on Linux and bytes on macOS
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+rss = rss / 1024 if sys.platform != "darwin" else rss / 1024 / 1024
+print(elapsed, rss, len(sys.modules))
+"""
+
+
+def run(module, importTime=False):
+    env = dict(os.environ, **ENV, PYTHONPATH=SRC)
+    command = [sys.executable] + (["-X", "importtime"] if importTime else [])
+    result = subprocess.run(
+        command + ["-c", PROBE.format(module=module)],
+        env=env,
+        cwd=SRC,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stdout, result.stderr
+
+
+def slowestImports(stderr, top):
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not name.startswith("  "):
+            continue
+        rows.append((int(cumulative), name.strip()))
+    # Only top-level packages, their children are already in the cumulative time
+    topLevel = [(us, name) for us, name in rows if "." not in name]
+    return sorted(topLevel, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", nargs="+", default=["UserGenes", "app"])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    for module in args.modules:
+        samples = [run(module)[0].split() for _ in range(args.repeat)]
+        seconds = statistics.median(float(s[0]) for s in samples)
+        rss = statistics.median(float(s[1]) for s in samples)
+        print(f"import {module}: {seconds * 1000:.0f} ms, {rss:.1f} MiB RSS, {samples[0][2]} modules")
+        for us, name in slowestImports(run(module, importTime=True)[1], args.top):
+            print(f"    {name:<24} {us / 1000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+SPOTIFY_IMAGE_URL = "https://i.scdn.co/image/"
+IMAGE_ID = re.compile(r"[0-9a-f]{16,64}")
+
+# Widths /art serves; the largest is the size Spotify's first album image comes in,
+# so it is passed through rather than re-encoded
+THUMBNAIL_SIZES = (64, 128, 300, 640)
+ORIGINAL_SIZE = 640
+
+
+def imageId(url):
+    """
+    Spotify CDN image ID of an album cover URL, or None for any other URL.
+    """
+    if not isinstance(url, str) or not url.startswith(SPOTIFY_IMAGE_URL):
+        return None
+    candidate = url[len(SPOTIFY_IMAGE_URL) :]
+    return candidate if IMAGE_ID.fullmatch(candidate) else None
+
+
+def imageMimetype(data):
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
+
+
+def resizeImage(data, size, quality=85):
+    """
+    JPEG no wider or taller than size; images already that small are returned as is.
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        if max(image.size) <= size:
+            return data
+        image = image.convert("RGB")
+        image.thumbnail((size, size), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=quality, optimize=True, progressive=True)
+        return output.getvalue()
+
+
+class HTTPImageFetcher:
+    """
+    Fetches covers from Spotify's image CDN.
+    """
+
+    def __init__(self, session=None, timeout=10, baseURL=SPOTIFY_IMAGE_URL):
+        self.session = session
+        self.timeout = timeout
+        self.baseURL = baseURL
+
+    def __call__(self, imageId):
+        if self.session is None:
+            import requests
+
+            self.session = requests.Session()
+        response = self.session.get(f"{self.baseURL}{imageId}", timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.content
+
+
+class DirectoryImageFetcher:
+    """
+    Serves covers from local files named after their image ID, with or without an
+    image extension; for tests and offline runs.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def __call__(self, imageId):
+        for name in (imageId, f"{imageId}.jpg", f"{imageId}.jpeg", f"{imageId}.png"):
+            path = os.path.join(self.directory, name)
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    return f.read()
+        return None
+
+
+class AlbumArtCache:
+    """
+    Album covers and their thumbnails on disk. Image bytes are stored once under
+    their SHA-256 (blobs/), so identical images share a file and the digest doubles
+    as an ETag; refs/ maps an image ID and size to its digest. Each cover is fetched
+    from origin once and each thumbnail generated once, even across restarts. Image
+    IDs origin does not have are remembered for missingTTL seconds, so requests for
+    them do not reach origin again until then.
+    """
+
+    def __init__(
+        self,
+        directory,
+        fetcher,
+        quality=85,
+        missingTTL=300,
+        maxMissing=10000,
+        maxRefs=10000,
+        clock=time.monotonic,
+    ):
+        """
+        :param fetcher: callable taking an image ID and returning its bytes, or None when
+            origin has no such image
+        :param maxMissing: the oldest unknown image IDs are forgotten beyond this many
+        :param maxRefs: least recently used refs are only kept on disk beyond this many
+        """
+        self.directory = directory
+        self.fetcher = fetcher
+        self.quality = quality
+        self.missingTTL = missingTTL
+        self.maxMissing = maxMissing
+        self.maxRefs = maxRefs
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        # Only for keys being generated; each entry counts the requests holding or awaiting it
+        self.keyLocks = {}
+        self.refs = OrderedDict()
+        self.missing = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.missingHits = 0
+        self.originFetches = 0
+        self.originBytes = 0
+        self.servedBytes = 0
+
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "refs"), exist_ok=True)
+
+    def get(self, imageId, size=ORIGINAL_SIZE):
+        """
+        :return: (image bytes, SHA-256 hex digest), or None when origin has no such image
+        """
+        if not IMAGE_ID.fullmatch(imageId) or size not in THUMBNAIL_SIZES:
+            raise ValueError(f"Unsupported image {imageId!r} at size {size}")
+
+        digest = self._readRef(imageId, size)
+        if digest is not None:
+            data = self._readBlob(digest)
+            if data is not None:
+                with self.lock:
+                    self.hits += 1
+                    self.servedBytes += len(data)
+                return data, digest
+
+        key = (imageId, size)
+        keyLock = self._lockFor(key)
+        try:
+            with keyLock:
+                # Another request may have generated it while this one waited
+                digest = self._readRef(imageId, size)
+                data = self._readBlob(digest) if digest is not None else None
+                if data is None:
+                    with self.lock:
+                        self.misses += 1
+                    data = self._generate(imageId, size)
+                    if data is None:
+                        return None
+                    digest = self._store(imageId, size, data)
+        finally:
+            self._releaseLock(key)
+
+        with self.lock:
+            self.servedBytes += len(data)
+        return data, digest
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "missingHits": self.missingHits,
+                "originFetches": self.originFetches,
+                "originBytes": self.originBytes,
+                "servedBytes": self.servedBytes,
+            }
+
+    def _generate(self, imageId, size):
+        if size == ORIGINAL_SIZE:
+            if self._isMissing(imageId):
+                return None
+            data = self.fetcher(imageId)
+            with self.lock:
+                if data is None:
+                    self.missing[imageId] = self.clock() + self.missingTTL
+                    self.missing.move_to_end(imageId)
+                    while len(self.missing) > self.maxMissing:
+                        self.missing.popitem(last=False)
+                else:
+                    self.originFetches += 1
+                    self.originBytes += len(data)
+            return data
+
+        original = self.get(imageId, ORIGINAL_SIZE)
+        if original is None:
+            return None
+        return resizeImage(original[0], size, self.quality)
+
+    def _isMissing(self, imageId):
+        with self.lock:
+            expiresAt = self.missing.get(imageId)
+            if expiresAt is None:
+                return False
+            if self.clock() >= expiresAt:
+                del self.missing[imageId]
+                return False
+            self.missingHits += 1
+            return True
+
+    def _store(self, imageId, size, data):
+        digest = hashlib.sha256(data).hexdigest()
+        blobPath = self._blobPath(digest)
+        if not os.path.exists(blobPath):
+            os.makedirs(os.path.dirname(blobPath), exist_ok=True)
+            self._writeAtomic(blobPath, data)
+        self._writeAtomic(self._refPath(imageId, size), digest.encode())
+        self._rememberRef((imageId, size), digest)
+        return digest
+
+    def _readRef(self, imageId, size):
+        with self.lock:
+            digest = self.refs.get((imageId, size))
+            if digest is not None:
+                self.refs.move_to_end((imageId, size))
+        if digest is not None:
+            return digest
+        try:
+            with open(self._refPath(imageId, size)) as f:
+                digest = f.read().strip()
+        except FileNotFoundError:
+            return None
+        self._rememberRef((imageId, size), digest)
+        return digest
+
+    def _rememberRef(self, key, digest):
+        with self.lock:
+            self.refs[key] = digest
+            self.refs.move_to_end(key)
+            while len(self.refs) > self.maxRefs:
+                self.refs.popitem(last=False)
+
+    def _readBlob(self, digest):
+        try:
+            with open(self._blobPath(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _blobPath(self, digest):
+        return os.path.join(self.directory, "blobs", digest[:2], digest)
+
+    def _refPath(self, imageId, size):
+        return os.path.join(self.directory, "refs", f"{imageId}-{size}")
+
+    def _lockFor(self, key):
+        with self.lock:
+            if key not in self.keyLocks:
+                self.keyLocks[key] = {"lock": threading.Lock(), "users": 0}
+            self.keyLocks[key]["users"] += 1
+            return self.keyLocks[key]["lock"]
+
+    def _releaseLock(self, key):
+        with self.lock:
+            entry = self.keyLocks[key]
+            entry["users"] -= 1
+            if entry["users"] == 0:
+                del self.keyLocks[key]
+
+    @staticmethod
+    def _writeAtomic(path, data):
+        # Written beside the live file and swapped in, so readers never see a partial one
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, path)
@@ -0,0 +1,302 @@
+import io
+import json
+import os
+import threading
+from array import array
+
+import numpy as np
+import pandas as pd
+
+from Instrumentation import instrumentation
+from batching import DEFAULT_MAX_WORKERS, fetchInChunks
+
+PITCH_CLASSES = 12
+TIMBRE_COEFFICIENTS = 12
+
+# Fixed layout of a track's float32 summary; the store's files depend on this order
+SUMMARY_COLUMNS = (
+    [
+        "duration",
+        "sectionCount",
+        "sectionTempoMean",
+        "sectionTempoStd",
+        "sectionLoudnessMean",
+        "sectionLoudnessStd",
+        "sectionLoudnessRange",
+        "segmentsPerSecond",
+        "segmentLoudnessMaxMean",
+        # Mean standard deviation of the timbre coefficients, one number for how much the sound changes
+        "timbreSpread",
+    ]
+    + [f"timbreMean{i}" for i in range(TIMBRE_COEFFICIENTS)]
+    + [f"timbreVar{i}" for i in range(TIMBRE_COEFFICIENTS)]
+    + [f"pitchMean{i}" for i in range(PITCH_CLASSES)]
+    + [f"pitchVar{i}" for i in range(PITCH_CLASSES)]
+)
+SUMMARY_SIZE = len(SUMMARY_COLUMNS)
+
+
+def meanStd(values):
+    if not len(values):
+        return np.nan, np.nan
+    return float(values.mean()), float(values.std())
+
+
+def reduceAnalysis(duration, sectionTempo, sectionLoudness, loudnessMax, timbre, pitches):
+    """
+    Fixed-size summary of one track's audio analysis, in SUMMARY_COLUMNS order.
+    :param timbre: (segments, 12) array; pitches likewise
+    """
+    summary = np.full(SUMMARY_SIZE, np.nan, dtype=np.float32)
+    sectionTempo = np.asarray(sectionTempo, dtype=np.float64)
+    sectionLoudness = np.asarray(sectionLoudness, dtype=np.float64)
+    loudnessMax = np.asarray(loudnessMax, dtype=np.float64)
+    timbre = np.asarray(timbre, dtype=np.float64).reshape(-1, TIMBRE_COEFFICIENTS)
+    pitches = np.asarray(pitches, dtype=np.float64).reshape(-1, PITCH_CLASSES)
+
+    summary[0] = duration if duration is not None else np.nan
+    summary[1] = len(sectionTempo)
+    summary[2:4] = meanStd(sectionTempo)
+    summary[4:6] = meanStd(sectionLoudness)
+    if len(sectionLoudness):
+        summary[6] = sectionLoudness.max() - sectionLoudness.min()
+    if duration:
+        summary[7] = len(timbre) / duration
+    summary[8] = meanStd(loudnessMax)[0]
+
+    if len(timbre):
+        timbreVariance = timbre.var(axis=0)
+        summary[9] = np.sqrt(timbreVariance).mean()
+        summary[10:22] = timbre.mean(axis=0)
+        summary[22:34] = timbreVariance
+    if len(pitches):
+        summary[34:46] = pitches.mean(axis=0)
+        summary[46:58] = pitches.var(axis=0)
+    return summary
+
+
+def summarizeAnalysis(analysis):
+    """
+    :param analysis: an audio-analysis document as returned by spotipy's audio_analysis
+    """
+    sections = analysis.get("sections") or []
+    segments = analysis.get("segments") or []
+    return reduceAnalysis(
+        (analysis.get("track") or {}).get("duration"),
+        [section["tempo"] for section in sections],
+        [section["loudness"] for section in sections],
+        [segment["loudness_max"] for segment in segments],
+        [segment["timbre"] for segment in segments],
+        [segment["pitches"] for segment in segments],
+    )
+
+
+def summarizeAnalysisStream(stream):
+    """
+    Summary of a raw audio-analysis JSON document read from a binary file object.
+    With ijson installed the document is parsed as a stream of numbers into compact
+    float arrays, so the segment dicts are never built; without it it is loaded whole.
+    """
+    try:
+        import ijson
+    except ImportError:
+        return summarizeAnalysis(json.load(stream))
+
+    duration = None
+    columns = {
+        "sections.item.tempo": array("f"),
+        "sections.item.loudness": array("f"),
+        "segments.item.loudness_max": array("f"),
+        "segments.item.timbre.item": array("f"),
+        "segments.item.pitches.item": array("f"),
+    }
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if event != "number":
+            continue
+        column = columns.get(prefix)
+        if column is not None:
+            column.append(value)
+        elif prefix == "track.duration":
+            duration = value
+
+    timbre = columns["segments.item.timbre.item"]
+    pitches = columns["segments.item.pitches.item"]
+    if len(timbre) % TIMBRE_COEFFICIENTS or len(pitches) % PITCH_CLASSES:
+        raise ValueError("Audio analysis segments must have 12 timbre and 12 pitch values")
+    return reduceAnalysis(
+        duration,
+        columns["sections.item.tempo"],
+        columns["sections.item.loudness"],
+        columns["segments.item.loudness_max"],
+        np.frombuffer(timbre, dtype=np.float32),
+        np.frombuffer(pitches, dtype=np.float32),
+    )
+
+
+def summarize(payload):
+    if isinstance(payload, dict):
+        return summarizeAnalysis(payload)
+    if isinstance(payload, (bytes, bytearray)):
+        payload = io.BytesIO(payload)
+    return summarizeAnalysisStream(payload)
+
+
+class AnalysisStore:
+    """
+    Audio-analysis summaries by track ID, each SUMMARY_SIZE float32 values. With a
+    path, summaries are appended to a flat .f32 file that is memory-mapped for reads,
+    and the track IDs to a line-per-ID .ids file, so every track is downloaded and
+    parsed once across restarts and the pages are shared between worker processes.
+    Only one process should append to a given path.
+    """
+
+    def __init__(self, path=None):
+        """
+        :param path: file prefix to keep the store under; None keeps it in memory only
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.positions = {}
+        self.matrix = np.empty((0, SUMMARY_SIZE), dtype=np.float32)
+        self.ingested = 0
+        self.failures = 0
+        if path is not None:
+            self.open()
+
+    @property
+    def dataPath(self):
+        return f"{self.path}.f32"
+
+    @property
+    def idsPath(self):
+        return f"{self.path}.ids"
+
+    def open(self):
+        trackIds = []
+        if os.path.exists(self.idsPath):
+            with open(self.idsPath) as f:
+                trackIds = f.read().split()
+
+        rowBytes = SUMMARY_SIZE * 4
+        size = os.path.getsize(self.dataPath) if os.path.exists(self.dataPath) else 0
+        rows = min(len(trackIds), size // rowBytes)
+        # Summaries are written before their IDs, so a crash normally leaves extra rows;
+        # trim whichever file is ahead so appends stay aligned
+        if size != rows * rowBytes:
+            with open(self.dataPath, "ab") as f:
+                f.truncate(rows * rowBytes)
+        if len(trackIds) != rows:
+            with open(self.idsPath, "w") as f:
+                f.write("".join(f"{trackId}\n" for trackId in trackIds[:rows]))
+
+        self.positions = {trackId: i for i, trackId in enumerate(trackIds[:rows])}
+        self.remap(rows)
+
+    def remap(self, rows):
+        if rows == 0:
+            self.matrix = np.empty((0, SUMMARY_SIZE), dtype=np.float32)
+        else:
+            self.matrix = np.memmap(
+                self.dataPath, dtype=np.float32, mode="r", shape=(rows, SUMMARY_SIZE)
+            )
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, trackId):
+        return trackId in self.positions
+
+    def missing(self, trackIds):
+        with self.lock:
+            return [trackId for trackId in dict.fromkeys(trackIds) if trackId not in self.positions]
+
+    def append(self, trackIds, summaries):
+        """
+        Add summaries of tracks not stored yet; already stored tracks are skipped.
+        :return: number of tracks added
+        """
+        with self.lock:
+            new = {}
+            for trackId, summary in zip(trackIds, summaries):
+                if trackId not in self.positions and trackId not in new:
+                    new[trackId] = summary
+            if not new:
+                return 0
+
+            block = np.ascontiguousarray(np.stack(list(new.values())), dtype=np.float32)
+            rows = len(self.positions)
+            if self.path is None:
+                self.matrix = np.concatenate([self.matrix, block])
+            else:
+                with open(self.dataPath, "ab") as f:
+                    f.write(block.tobytes())
+                with open(self.idsPath, "a") as f:
+                    f.write("".join(f"{trackId}\n" for trackId in new))
+                self.remap(rows + len(new))
+
+            for i, trackId in enumerate(new):
+                self.positions[trackId] = rows + i
+            return len(new)
+
+    def get(self, trackIds):
+        """
+        :return: (len(trackIds), SUMMARY_SIZE) float32 array, NaN rows for unknown tracks
+        """
+        with self.lock:
+            matrix = self.matrix
+            positions = np.array(
+                [self.positions.get(trackId, -1) for trackId in trackIds], dtype=np.int64
+            )
+        result = np.full((len(positions), SUMMARY_SIZE), np.nan, dtype=np.float32)
+        known = positions >= 0
+        result[known] = matrix[positions[known]]
+        return result
+
+    def frame(self, trackIds, columns=SUMMARY_COLUMNS):
+        """
+        Summaries of trackIds as a DataFrame indexed by track ID.
+        """
+        trackIds = list(dict.fromkeys(trackIds))
+        indices = [SUMMARY_COLUMNS.index(column) for column in columns]
+        return pd.DataFrame(
+            self.get(trackIds)[:, indices], index=pd.Index(trackIds, name="id"), columns=list(columns)
+        )
+
+    def ingest(self, trackIds, fetch, maxWorkers=DEFAULT_MAX_WORKERS):
+        """
+        Download, summarize and store the tracks of trackIds not stored yet.
+        :param fetch: callable taking a track ID and returning its analysis as a dict,
+            raw JSON bytes or a binary file object
+        :return: number of tracks added
+        """
+        missing = self.missing(trackIds)
+        if not missing:
+            return 0
+
+        def fetchSummary(trackId):
+            try:
+                return summarize(fetch(trackId))
+            except Exception as e:
+                print(f"Error fetching audio analysis of {trackId}: {e}")
+                instrumentation.recordError("AnalysisStore.ingest", e)
+                return None
+
+        # The analysis endpoint takes one track per call
+        summaries = fetchInChunks(
+            lambda chunk: [fetchSummary(chunk[0])], missing, 1, maxWorkers
+        )
+        fetched = [(t, s) for t, s in zip(missing, summaries) if s is not None]
+        added = self.append([t for t, _ in fetched], [s for _, s in fetched])
+        with self.lock:
+            self.ingested += added
+            self.failures += len(missing) - len(fetched)
+        return added
+
+    def stats(self):
+        with self.lock:
+            return {
+                "tracks": len(self.positions),
+                "bytes": len(self.positions) * SUMMARY_SIZE * 4,
+                "ingested": self.ingested,
+                "failures": self.failures,
+            }
@@ -0,0 +1,220 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from genes import GENE_CATEGORIES
+
+GENE_POSITIONS = {gene: i for i, gene in enumerate(GENE_CATEGORIES)}
+
+
+def geneVector(geneData):
+    """
+    getGeneDataFromDF output as a count array in GENE_CATEGORIES order.
+    """
+    counts = np.zeros(len(GENE_CATEGORIES), dtype=np.int64)
+    for row in geneData:
+        counts[GENE_POSITIONS[row["genre"]]] += row["count"]
+    return counts
+
+
+class SpaceSaving:
+    """
+    Top-k heavy hitters in at most capacity counters (Metwally et al.). Counts of
+    reported items are overestimated by at most their error, and two sketches merge
+    into one with the same guarantee.
+    """
+
+    def __init__(self, capacity=200):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+
+    def add(self, item, count=1):
+        if item in self.counts or len(self.counts) < self.capacity:
+            self.counts[item] = self.counts.get(item, 0) + count
+            self.errors.setdefault(item, 0)
+            return
+
+        # Replace the smallest counter; its count becomes the newcomer's error bound
+        smallest = min(self.counts, key=self.counts.get)
+        floor = self.counts.pop(smallest)
+        del self.errors[smallest]
+        self.counts[item] = floor + count
+        self.errors[item] = floor
+
+    def remove(self, item, count=1):
+        # Only tracked items can be taken back out; untracked ones already fell below the floor
+        if item in self.counts:
+            self.counts[item] = max(0, self.counts[item] - count)
+
+    def merge(self, other):
+        for item, count in other.counts.items():
+            self.add(item, count)
+
+    def top(self, k):
+        ranked = sorted(self.counts.items(), key=lambda pair: (-pair[1], str(pair[0])))
+        return [
+            {"name": item, "count": count, "maxError": self.errors[item]}
+            for item, count in ranked[:k]
+            if count > 0
+        ]
+
+
+class CohortStats:
+    """
+    Population gene statistics across every profile built. Each user's contribution
+    (gene counts, artist and genre counts, genre x gene counts) is added to running
+    totals, sums of shares and top-k sketches, and taken back out when that user is
+    ingested again, so queries never touch per-user tracks.
+    """
+
+    def __init__(self, sketchCapacity=200):
+        self.lock = threading.Lock()
+        self.contributions = {}
+
+        self.geneCounts = np.zeros(len(GENE_CATEGORIES), dtype=np.int64)
+        # Per-gene sum and sum of squares of users' shares, for population mean and spread
+        self.shareSums = np.zeros(len(GENE_CATEGORIES))
+        self.shareSquares = np.zeros(len(GENE_CATEGORIES))
+        self.genreGenes = {}
+        self.artistNames = {}
+        self.artists = SpaceSaving(sketchCapacity)
+        self.genres = SpaceSaving(sketchCapacity)
+
+    @staticmethod
+    def profileContribution(user):
+        """
+        Counts a UserGenes profile adds to the cohort, from its deduplicated tracks.
+        """
+        df = user.getSelectedDF()
+        genes = geneVector(user.getGeneDataFromDF(df))
+        artists = df["artistID"].astype(str).value_counts()
+
+        genreRows = df[["artistID", "gene"]].astype(str).merge(
+            user.artists.artistGenresDF.astype(str), on="artistID"
+        )
+        genreGenes = pd.crosstab(genreRows["genre"], genreRows["gene"]).reindex(
+            columns=GENE_CATEGORIES, fill_value=0
+        )
+        names = user.artists.artistsDF["artistName"]
+        return {
+            "genes": genes,
+            "artists": artists.to_dict(),
+            "artistNames": {artistId: names.get(artistId) for artistId in artists.index},
+            "genres": genreGenes.sum(axis=1).to_dict(),
+            "genreGenes": {
+                genre: counts.to_numpy(dtype=np.int64)
+                for genre, counts in genreGenes.iterrows()
+            },
+        }
+
+    def ingestProfile(self, userId, user):
+        self.ingest(userId, self.profileContribution(user))
+
+    def ingest(self, userId, contribution):
+        with self.lock:
+            previous = self.contributions.pop(userId, None)
+            if previous is not None:
+                self._apply(previous, -1)
+            self._apply(contribution, 1)
+            self.contributions[userId] = contribution
+            self.artistNames.update(contribution.get("artistNames", {}))
+
+    def _apply(self, contribution, sign):
+        genes = contribution["genes"]
+        self.geneCounts += sign * genes
+        total = genes.sum()
+        if total:
+            shares = genes / total
+            self.shareSums += sign * shares
+            self.shareSquares += sign * shares**2
+
+        for sketch, counts in ((self.artists, contribution["artists"]), (self.genres, contribution["genres"])):
+            for item, count in counts.items():
+                if sign > 0:
+                    sketch.add(item, count)
+                else:
+                    sketch.remove(item, count)
+
+        for genre, counts in contribution["genreGenes"].items():
+            current = self.genreGenes.get(genre)
+            if current is None:
+                current = self.genreGenes[genre] = np.zeros(len(GENE_CATEGORIES), dtype=np.int64)
+            current += sign * counts
+            if sign < 0 and not current.any():
+                del self.genreGenes[genre]
+
+    def merge(self, other):
+        """
+        Fold in another CohortStats, e.g. one built by a different worker process.
+        Users present in both keep other's contribution.
+        """
+        with other.lock:
+            contributions = dict(other.contributions)
+        for userId, contribution in contributions.items():
+            self.ingest(userId, contribution)
+
+    # Queries
+    def populationGenes(self):
+        with self.lock:
+            counts = self.geneCounts.copy()
+            users = len(self.contributions)
+        total = counts.sum()
+        return {
+            "users": users,
+            "tracks": int(total),
+            "genes": [
+                {"genre": gene, "count": int(count), "share": float(count / total) if total else 0.0}
+                for gene, count in zip(GENE_CATEGORIES, counts)
+                if count
+            ],
+        }
+
+    def topArtists(self, k=10):
+        with self.lock:
+            return [
+                {**artist, "artistName": self.artistNames.get(artist["name"])}
+                for artist in self.artists.top(k)
+            ]
+
+    def topGenres(self, k=10):
+        with self.lock:
+            return self.genres.top(k)
+
+    def genesForGenre(self, genre, k=3):
+        with self.lock:
+            counts = self.genreGenes.get(genre)
+            counts = None if counts is None else counts.copy()
+        if counts is None:
+            return []
+        order = np.argsort(-counts, kind="stable")[:k]
+        return [
+            {"genre": GENE_CATEGORIES[i], "count": int(counts[i])} for i in order if counts[i]
+        ]
+
+    def compareUser(self, userId):
+        """
+        The user's share of each gene next to the population's mean share and spread.
+        """
+        with self.lock:
+            contribution = self.contributions.get(userId)
+            users = len(self.contributions)
+            mean = self.shareSums / users if users else self.shareSums
+            variance = self.shareSquares / users - mean**2 if users else self.shareSquares
+        if contribution is None:
+            return None
+
+        genes = contribution["genes"]
+        shares = genes / genes.sum() if genes.sum() else genes.astype(float)
+        spread = np.sqrt(np.clip(variance, 0, None))
+        return [
+            {
+                "genre": gene,
+                "share": float(share),
+                "populationShare": float(populationShare),
+                "zScore": float((share - populationShare) / deviation) if deviation > 0 else 0.0,
+            }
+            for gene, share, populationShare, deviation in zip(GENE_CATEGORIES, shares, mean, spread)
+            if share or populationShare
+        ]
@@ -0,0 +1,150 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from Instrumentation import inContext, instrumentation
+
+
+class EnrichmentGraph:
+    """
+    Runs named fetch steps as a small dependency graph: each step starts as soon as
+    the steps it depends on have finished, so independent Spotify calls overlap and
+    the wall time approaches that of the slowest chain of dependent calls.
+    """
+
+    def __init__(self, maxWorkers=4, clock=time.perf_counter):
+        self.maxWorkers = maxWorkers
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.steps = {}
+        self.futures = {}
+        self.timings = {}
+        self.claimed = set()
+        self.executor = None
+        self.started = None
+
+    def add(self, name, fn, dependencies=()):
+        """
+        :param fn: callable receiving the results of dependencies, in order
+        """
+        for dependency in dependencies:
+            if dependency not in self.steps:
+                raise ValueError(f"Unknown dependency {dependency!r} of {name!r}")
+        self.steps[name] = (fn, tuple(dependencies))
+        self.futures[name] = Future()
+        return self
+
+    def start(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.maxWorkers)
+        self.started = self.clock()
+        # Bound here so steps started from pool threads still nest under the caller's span
+        self.runStep = inContext(self._runStep)
+        for name, (_, dependencies) in self.steps.items():
+            if not dependencies and self._claim(name):
+                self._submit(name)
+        return self
+
+    def result(self, name):
+        return self.futures[name].result()
+
+    def run(self):
+        """
+        Run every step and wait for all of them.
+        :return: dict of step name to result
+        """
+        self.start()
+        try:
+            return {name: self.result(name) for name in self.steps}
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    def _submit(self, name):
+        try:
+            self.executor.submit(self.runStep, name)
+        except RuntimeError as e:
+            # The graph was shut down before this step's dependencies finished
+            self._finish(name, self.clock(), exception=e)
+
+    def _claim(self, name):
+        # Two dependencies finishing together must not both start their dependent
+        with self.lock:
+            if name in self.claimed:
+                return False
+            self.claimed.add(name)
+            return True
+
+    def _runStep(self, name):
+        fn, dependencies = self.steps[name]
+        start = self.clock()
+        try:
+            with instrumentation.span("enrich", step=name):
+                result = fn(*(self.futures[d].result() for d in dependencies))
+        except Exception as e:
+            self._finish(name, start, exception=e)
+        else:
+            self._finish(name, start, result=result)
+
+    def _finish(self, name, start, result=None, exception=None):
+        with self.lock:
+            self.timings[name] = (start - self.started, self.clock() - self.started)
+        if exception is None:
+            self.futures[name].set_result(result)
+        else:
+            self.futures[name].set_exception(exception)
+
+        for dependent, (_, dependencies) in self.steps.items():
+            if name not in dependencies:
+                continue
+            if exception is not None:
+                # A failed step fails everything downstream of it without running it
+                if self._claim(dependent):
+                    self._finish(dependent, self.clock(), exception=exception)
+            elif all(self.futures[d].done() for d in dependencies) and self._claim(dependent):
+                self._submit(dependent)
+
+    def criticalPath(self):
+        """
+        The chain of steps that determined the finish time: from the step that ended
+        last, repeatedly step back to the dependency that ended last.
+        """
+        with self.lock:
+            timings = dict(self.timings)
+        if not timings:
+            return []
+        name = max(timings, key=lambda step: timings[step][1])
+        path = [name]
+        while True:
+            dependencies = [d for d in self.steps[name][1] if d in timings]
+            if not dependencies:
+                return path[::-1]
+            name = max(dependencies, key=lambda step: timings[step][1])
+            path.append(name)
+
+    def report(self):
+        """
+        Per-step start, end and duration in ms from when the graph started, plus the
+        critical path and how long it took.
+        """
+        with self.lock:
+            timings = dict(self.timings)
+        path = self.criticalPath()
+        wall = max((end for _, end in timings.values()), default=0.0)
+        busy = sum(end - start for start, end in timings.values())
+        return {
+            "steps": {
+                name: {
+                    "startMs": round(start * 1000, 1),
+                    "endMs": round(end * 1000, 1),
+                    "ms": round((end - start) * 1000, 1),
+                }
+                for name, (start, end) in timings.items()
+            },
+            "criticalPath": path,
+            "criticalPathMs": round(wall * 1000, 1),
+            # Sum of step durations over wall time; 1.0 means nothing overlapped
+            "parallelism": round(busy / wall, 2) if wall else 0.0,
+        }
@@ -0,0 +1,170 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from Instrumentation import instrumentation
+
+# Tracks and audio features never change once published; artist genres and popularity drift slowly
+DEFAULT_TTLS = {
+    "track": 7 * 24 * 3600,
+    "artist": 24 * 3600,
+    "audio_features": 30 * 24 * 3600,
+}
+
+
+class RedisEntityBackend:
+    """
+    Shared second tier for EntityCache so gunicorn workers reuse each other's lookups.
+    Any client exposing mget and pipeline().setex works, including fakeredis in tests.
+    """
+
+    def __init__(self, client, prefix="genegenetics:entity"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def fromURL(cls, url, **kwargs):
+        import redis
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def _key(self, entityType, entityId):
+        return f"{self.prefix}:{entityType}:{entityId}"
+
+    def getMany(self, entityType, ids):
+        raw = self.client.mget([self._key(entityType, entityId) for entityId in ids])
+        return {
+            entityId: json.loads(value)
+            for entityId, value in zip(ids, raw)
+            if value is not None
+        }
+
+    def setMany(self, entityType, values, ttl):
+        pipe = self.client.pipeline()
+        for entityId, value in values.items():
+            pipe.setex(self._key(entityType, entityId), int(ttl), json.dumps(value))
+        pipe.execute()
+
+
+class EntityCache:
+    """
+    Cross-user cache for Spotify track, artist and audio feature objects.
+    Lookups go local LRU -> optional shared backend -> Spotify, and only the
+    misses are sent upstream.
+    """
+
+    def __init__(self, maxBytes=64 * 1024 * 1024, ttls=None, backend=None, clock=time.time):
+        self.maxBytes = maxBytes
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.backend = backend
+        self.clock = clock
+
+        self.entries = OrderedDict()
+        self.bytesHeld = 0
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.backendHits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def getMany(self, entityType, ids, fetchMissing):
+        """
+        Resolve ids to Spotify objects, preserving order and duplicates.
+        :param entityType: one of the DEFAULT_TTLS keys
+        :param ids: list of Spotify IDs
+        :param fetchMissing: callable taking a list of unique uncached IDs and returning their objects in order
+        :return: list of objects aligned with ids, None where Spotify had nothing
+        """
+        found = {}
+        missing = []
+        now = self.clock()
+
+        with self.lock:
+            for entityId in dict.fromkeys(ids):
+                entry = self.entries.get((entityType, entityId))
+                if entry is not None and entry["expiresAt"] > now:
+                    self.entries.move_to_end((entityType, entityId))
+                    found[entityId] = entry["value"]
+                    self.hits += 1
+                else:
+                    if entry is not None:
+                        self._remove((entityType, entityId))
+                    missing.append(entityId)
+
+        if missing and self.backend is not None:
+            try:
+                shared = self.backend.getMany(entityType, missing)
+            except Exception as e:
+                print(f"Error reading shared entity cache: {e}")
+                instrumentation.recordError("EntityCache.backendRead", e)
+                shared = {}
+            if shared:
+                self._storeLocal(entityType, shared)
+                found.update(shared)
+                with self.lock:
+                    self.backendHits += len(shared)
+                missing = [entityId for entityId in missing if entityId not in shared]
+
+        if missing:
+            with self.lock:
+                self.misses += len(missing)
+            fetched = {
+                entityId: value
+                for entityId, value in zip(missing, fetchMissing(missing))
+                if value is not None
+            }
+            self._storeLocal(entityType, fetched)
+            if fetched and self.backend is not None:
+                try:
+                    self.backend.setMany(entityType, fetched, self.ttls[entityType])
+                except Exception as e:
+                    print(f"Error writing shared entity cache: {e}")
+                    instrumentation.recordError("EntityCache.backendWrite", e)
+            found.update(fetched)
+
+        return [found.get(entityId) for entityId in ids]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.backendHits + self.misses
+            return {
+                "hits": self.hits,
+                "backendHits": self.backendHits,
+                "misses": self.misses,
+                "hitRatio": (self.hits + self.backendHits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytesHeld": self.bytesHeld,
+                "maxBytes": self.maxBytes,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytesHeld = 0
+
+    def _storeLocal(self, entityType, values):
+        expiresAt = self.clock() + self.ttls[entityType]
+        with self.lock:
+            for entityId, value in values.items():
+                key = (entityType, entityId)
+                if key in self.entries:
+                    self._remove(key)
+
+                size = len(json.dumps(value))
+                if size > self.maxBytes:
+                    continue
+
+                self.entries[key] = {"value": value, "size": size, "expiresAt": expiresAt}
+                self.bytesHeld += size
+
+            while self.bytesHeld > self.maxBytes:
+                _, entry = self.entries.popitem(last=False)
+                self.bytesHeld -= entry["size"]
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.bytesHeld -= entry["size"]
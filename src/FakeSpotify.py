@@ -0,0 +1,325 @@
+import ast
+import hashlib
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "..")
+
+FEATURE_COLUMNS = [
+    "danceability",
+    "energy",
+    "key",
+    "loudness",
+    "mode",
+    "speechiness",
+    "acousticness",
+    "instrumentalness",
+    "liveness",
+    "valence",
+    "tempo",
+    "time_signature",
+]
+
+# Continuous features that synthetic tracks jitter, with the range they are clipped to
+JITTERED_FEATURES = {
+    "danceability": (0, 1),
+    "energy": (0, 1),
+    "speechiness": (0, 1),
+    "acousticness": (0, 1),
+    "instrumentalness": (0, 1),
+    "liveness": (0, 1),
+    "valence": (0, 1),
+    "tempo": (40, 220),
+}
+
+
+PLAY_INTERVAL_MS = 3 * 60 * 1000
+
+
+def syntheticId(baseId, copy):
+    # Spotify IDs are 22 base62 characters; a hex digest slice keeps them unique and stable
+    return hashlib.sha1(f"{baseId}:{copy}".encode()).hexdigest()[:22]
+
+
+class FakeSpotify:
+    """
+    Offline stand-in for spotipy.Spotify serving the checked-in CSV fixtures.
+    Supports the endpoints UserGenes uses, optional per-call latency and
+    synthetic scale-up to arbitrarily many tracks.
+    """
+
+    def __init__(self, fixtureDir=FIXTURE_DIR, scale=None, latency=0.0, seed=0, userId="fake-user"):
+        """
+        :param scale: total number of tracks to serve; extra tracks are jittered copies of the fixtures
+        :param latency: seconds slept per call, or a dict of endpoint name -> seconds
+        """
+        self.latency = latency
+        self.userId = userId
+        self.callCounts = {}
+        self.lock = threading.Lock()
+
+        self.tracks_ = {}
+        self.artists_ = {}
+        self.features_ = {}
+        self.loadTopTracks(os.path.join(fixtureDir, "dfs", "topTracks.csv"))
+        self.loadRecentTracks(os.path.join(fixtureDir, "recentTracks.csv"))
+
+        self.baseIds = list(self.tracks_)
+        if scale is not None and scale > len(self.baseIds):
+            self.scaleUp(scale, np.random.default_rng(seed))
+        self.trackIds = list(self.tracks_)
+
+        self.savedIds = set(self.trackIds[::3])
+        self.now = pd.Timestamp("2023-03-25T12:00:00Z")
+        self.start = self.now
+
+    # Fixture loading
+    def loadTopTracks(self, path):
+        df = pd.read_csv(path)
+        for row in df.to_dict("records"):
+            artists = ast.literal_eval(row["artists"])
+            self.tracks_[row["id"]] = {
+                "id": row["id"],
+                "name": row["name"],
+                "popularity": int(row["popularity"]),
+                "duration_ms": int(row["duration_ms_x"]),
+                "explicit": bool(row["explicit"]),
+                "album": ast.literal_eval(row["album"]),
+                "artists": artists,
+                "external_urls": ast.literal_eval(row["external_urls"]),
+            }
+            for artist in artists:
+                self.artists_.setdefault(
+                    artist["id"], {"id": artist["id"], "popularity": 50, "genres": []}
+                )
+            self.features_[row["id"]] = self.featuresFromRow(row)
+
+    def loadRecentTracks(self, path):
+        df = pd.read_csv(
+            path,
+            index_col=0,
+            converters={c: ast.literal_eval for c in ["artistNames", "artistLinks", "artistGenres"]},
+        )
+        for row in df.drop_duplicates(subset="id").to_dict("records"):
+            artists = [
+                {"id": link.rsplit("/", 1)[1], "name": name, "external_urls": {"spotify": link}}
+                for name, link in zip(row["artistNames"], row["artistLinks"])
+            ]
+            self.tracks_.setdefault(
+                row["id"],
+                {
+                    "id": row["id"],
+                    "name": row["trackName"],
+                    "popularity": int(str(row["trackPopularity"]).split()[0]),
+                    "duration_ms": int(str(row["trackDurationMs"]).split()[0]),
+                    "explicit": bool(row["trackExplicit"]),
+                    "album": {
+                        "name": row["albumName"],
+                        "album_type": row["albumType"],
+                        "release_date": row["albumReleaseDate"],
+                        "images": [{"url": row["albumCoverURL"]}],
+                    },
+                    "artists": artists,
+                    "external_urls": {"spotify": row["spotifyURL"]},
+                },
+            )
+            self.artists_[row["artistID"]] = {
+                "id": row["artistID"],
+                "popularity": int(str(row["artistPopularity"]).split()[0]),
+                "genres": row["artistGenres"],
+            }
+            for artist in artists:
+                self.artists_.setdefault(
+                    artist["id"], {"id": artist["id"], "popularity": 50, "genres": []}
+                )
+            self.features_.setdefault(row["id"], self.featuresFromRow(row))
+
+    @staticmethod
+    def featuresFromRow(row):
+        features = {name: row[name] for name in FEATURE_COLUMNS}
+        for name in ("key", "mode", "time_signature"):
+            features[name] = int(features[name])
+        features.update(
+            {
+                "id": row["id"],
+                "type": "audio_features",
+                "uri": f"spotify:track:{row['id']}",
+                "track_href": f"https://api.spotify.com/v1/tracks/{row['id']}",
+                "analysis_url": f"https://api.spotify.com/v1/audio-analysis/{row['id']}",
+                "duration_ms": int(row.get("duration_ms_y", row.get("duration_ms"))),
+            }
+        )
+        return features
+
+    def scaleUp(self, total, rng):
+        baseCount = len(self.baseIds)
+        extra = total - baseCount
+        names = list(JITTERED_FEATURES)
+        low = np.array([JITTERED_FEATURES[name][0] for name in names], dtype=np.float64)
+        high = np.array([JITTERED_FEATURES[name][1] for name in names], dtype=np.float64)
+
+        baseMatrix = np.array(
+            [[self.features_[baseId][name] for name in names] for baseId in self.baseIds],
+            dtype=np.float64,
+        )
+        sources = np.arange(extra) % baseCount
+        jittered = np.clip(
+            baseMatrix[sources] + rng.normal(0, 1, (extra, len(names))) * (high - low) * 0.1,
+            low,
+            high,
+        )
+
+        for i in range(extra):
+            baseId = self.baseIds[sources[i]]
+            copy = i // baseCount + 1
+            trackId = syntheticId(baseId, copy)
+
+            track = dict(self.tracks_[baseId])
+            track["id"] = trackId
+            track["name"] = f"{track['name']} #{copy}"
+            track["external_urls"] = {"spotify": f"https://open.spotify.com/track/{trackId}"}
+            self.tracks_[trackId] = track
+
+            features = dict(self.features_[baseId])
+            features.update(zip(names, jittered[i].tolist()))
+            features.update(
+                {
+                    "id": trackId,
+                    "uri": f"spotify:track:{trackId}",
+                    "track_href": f"https://api.spotify.com/v1/tracks/{trackId}",
+                    "analysis_url": f"https://api.spotify.com/v1/audio-analysis/{trackId}",
+                }
+            )
+            self.features_[trackId] = features
+
+    # Call accounting
+    def call(self, endpoint):
+        with self.lock:
+            self.callCounts[endpoint] = self.callCounts.get(endpoint, 0) + 1
+        delay = self.latency.get(endpoint, 0.0) if isinstance(self.latency, dict) else self.latency
+        if delay:
+            time.sleep(delay)
+
+    def resetCounts(self):
+        with self.lock:
+            self.callCounts = {}
+
+    # spotipy.Spotify surface
+    def current_user(self):
+        self.call("current_user")
+        return {"id": self.userId}
+
+    def tracks(self, tracks, market=None):
+        self.call("tracks")
+        return {"tracks": [self.tracks_.get(trackId) for trackId in tracks]}
+
+    def artist(self, artist_id):
+        self.call("artist")
+        return self.artists_.get(artist_id)
+
+    def artists(self, artists):
+        self.call("artists")
+        return {"artists": [self.artists_.get(artistId) for artistId in artists]}
+
+    def audio_features(self, tracks=[]):
+        self.call("audio_features")
+        return [self.features_.get(trackId) for trackId in tracks]
+
+    def audio_analysis(self, track_id):
+        self.call("audio_analysis")
+        features = self.features_.get(track_id)
+        if features is None:
+            return None
+
+        # Synthetic but stable per track: sections around the track's tempo and
+        # loudness, segments about every quarter second
+        rng = np.random.default_rng(int(hashlib.sha1(track_id.encode()).hexdigest()[:8], 16))
+        duration = features["duration_ms"] / 1000
+        sectionCount = max(1, int(duration // 25))
+        segmentCount = max(1, int(duration / rng.uniform(0.15, 0.4)))
+        timbreSpread = 10 + 40 * features["energy"]
+        return {
+            "track": {"duration": duration, "tempo": features["tempo"], "loudness": features["loudness"]},
+            "sections": [
+                {
+                    "start": i * duration / sectionCount,
+                    "duration": duration / sectionCount,
+                    "tempo": features["tempo"] + rng.normal(0, 2),
+                    "loudness": features["loudness"] + rng.normal(0, 2),
+                }
+                for i in range(sectionCount)
+            ],
+            "segments": [
+                {
+                    "start": i * duration / segmentCount,
+                    "duration": duration / segmentCount,
+                    "loudness_max": features["loudness"] + rng.normal(0, 3),
+                    "pitches": rng.uniform(0, 1, 12).round(3).tolist(),
+                    "timbre": (rng.normal(0, timbreSpread, 12)).round(3).tolist(),
+                }
+                for i in range(segmentCount)
+            ],
+        }
+
+    def current_user_saved_tracks_contains(self, tracks=None):
+        self.call("current_user_saved_tracks_contains")
+        return [trackId in self.savedIds for trackId in tracks]
+
+    def current_user_saved_tracks(self, limit=20, offset=0, market=None):
+        self.call("current_user_saved_tracks")
+        savedIds = [trackId for trackId in self.trackIds if trackId in self.savedIds]
+        page = savedIds[offset : offset + limit]
+        return {
+            "items": [{"track": self.tracks_[trackId]} for trackId in page],
+            "total": len(savedIds),
+        }
+
+    def current_user_top_tracks(self, limit=20, offset=0, time_range="medium_term"):
+        self.call("current_user_top_tracks")
+        topIds = self.baseIds[:50]
+        return {
+            "items": [self.tracks_[trackId] for trackId in topIds[offset : offset + limit]],
+            "total": len(topIds),
+        }
+
+    def current_user_recently_played(self, limit=50, after=None, before=None):
+        self.call("current_user_recently_played")
+        # One play every three minutes, newest first, cycling through the catalogue;
+        # moving now forward plays the tracks before the first one again
+        nowMs = self.now.value // 1_000_000
+        shift = (self.now - self.start).value // 1_000_000 // PLAY_INTERVAL_MS
+        first = 0
+        if before is not None:
+            first = max(0, (nowMs - int(before)) // PLAY_INTERVAL_MS + 1)
+        last = min(first + limit, len(self.trackIds))
+        if after is not None:
+            last = min(last, max(0, -(-(nowMs - int(after)) // PLAY_INTERVAL_MS)))
+
+        plays = [
+            {
+                "track": self.tracks_[self.trackIds[(i - shift) % len(self.trackIds)]],
+                "played_at": pd.Timestamp(nowMs - i * PLAY_INTERVAL_MS, unit="ms").strftime(
+                    "%Y-%m-%dT%H:%M:%S.000Z"
+                ),
+            }
+            for i in range(first, last)
+        ]
+
+        cursors = None
+        if plays:
+            cursors = {
+                "after": str(nowMs - first * PLAY_INTERVAL_MS),
+                "before": str(nowMs - (last - 1) * PLAY_INTERVAL_MS),
+            }
+        return {"items": plays, "cursors": cursors, "next": None}
+
+    def recommendations(self, seed_artists=None, seed_genres=None, seed_tracks=None, limit=20, **kwargs):
+        self.call("recommendations")
+        seeds = ",".join((seed_artists or []) + (seed_tracks or []) + (seed_genres or []))
+        start = int(hashlib.sha1(seeds.encode()).hexdigest(), 16) % len(self.trackIds)
+        picked = [self.trackIds[(start + i) % len(self.trackIds)] for i in range(limit)]
+        return {"tracks": [self.tracks_[trackId] for trackId in picked], "seeds": []}
@@ -0,0 +1,153 @@
+import itertools
+
+import numpy as np
+
+from genes import (
+    ANALYSIS_GENE_FEATURES,
+    GENE_CATEGORIES,
+    GENE_FEATURES,
+    GENE_MODEL,
+    calculateGeneCodes,
+    geneScores,
+)
+
+# GENE_MODEL cut-offs in geneScores order, with the searchsorted side that counts the
+# cut-offs a score clears: mood, tempo and complexity must exceed theirs, while
+# instrumentalness only has to reach its own
+THRESHOLDS = [
+    ("moodThreshold", "left"),
+    ("tempoThreshold", "left"),
+    ("complexityThreshold", "left"),
+    ("instrumentalThreshold", "right"),
+]
+
+# Position in the (mood, tempo, complexity, instrumental) cleared/not-cleared counts of
+# each gene code: S, L and M are the sides that did not clear, I is the side that did
+ABOVE_INDEX_BY_CODE = np.array(
+    [
+        (1 - (code >> 3 & 1)) * 8 + (1 - (code >> 2 & 1)) * 4 + (1 - (code >> 1 & 1)) * 2 + (code & 1)
+        for code in range(len(GENE_CATEGORIES))
+    ]
+)
+
+
+def countWeightSettings(grid):
+    """
+    Weight combinations a sweep of grid scores every track under. Each costs a pass
+    over all the tracks, while threshold combinations come almost free.
+    """
+    thresholdNames = {name for name, _ in THRESHOLDS}
+    settings = 1
+    for name, values in grid.items():
+        if name not in thresholdNames:
+            settings *= len(values)
+    return settings
+
+
+class GeneExplorer:
+    """
+    Gene distributions of one set of tracks under many GENE_MODEL variants. Tracks
+    are scored once per weight setting; every threshold combination is then answered
+    from cumulative counts of the scores' positions among the cut-offs, so a grid of
+    thousands of variants costs little more than scoring the tracks once.
+    """
+
+    def __init__(self, features):
+        """
+        :param features: DataFrame with the GENE_FEATURES columns, and optionally the
+            ANALYSIS_GENE_FEATURES ones; rows missing a gene feature are left out
+        """
+        complete = features[GENE_FEATURES].notna().all(axis=1).to_numpy()
+        names = GENE_FEATURES + [name for name in ANALYSIS_GENE_FEATURES if name in features]
+        self.columns = {
+            name: np.asarray(features[name], dtype=np.float64)[complete] for name in names
+        }
+        self.tracks = int(complete.sum())
+
+    def counts(self, model=GENE_MODEL):
+        codes = calculateGeneCodes(self.columns, model)
+        return np.bincount(codes, minlength=len(GENE_CATEGORIES))
+
+    def sweepCounts(self, grid):
+        """
+        :param grid: GENE_MODEL parameter name -> values to try; every combination is
+            evaluated and the others keep their GENE_MODEL value
+        :return: (list of parameter dicts, one per variant, with only the grid's
+            parameters; int64 array of gene counts, one row per variant)
+        """
+        unknown = sorted(set(grid) - set(GENE_MODEL))
+        if unknown:
+            raise ValueError(f"Unknown gene model parameters: {', '.join(unknown)}")
+
+        thresholdNames = [name for name, _ in THRESHOLDS]
+        weightNames = [name for name in grid if name not in thresholdNames]
+        weightSettings = [
+            dict(zip(weightNames, values))
+            for values in itertools.product(*(grid[name] for name in weightNames))
+        ]
+        cutoffs = [
+            np.unique(np.asarray(grid.get(name, [GENE_MODEL[name]]), dtype=np.float64))
+            for name in thresholdNames
+        ]
+        bins = [len(values) + 1 for values in cutoffs]
+
+        # Histogram over (weight setting, cut-offs cleared per score)
+        histogram = np.zeros((len(weightSettings), int(np.prod(bins))), dtype=np.int64)
+        for w, weights in enumerate(weightSettings):
+            scores = geneScores(self.columns, dict(GENE_MODEL, **weights))
+            flat = 0
+            for score, values, (_, side), size in zip(scores, cutoffs, THRESHOLDS, bins):
+                flat = flat * size + np.searchsorted(values, score, side=side)
+            histogram[w] = np.bincount(flat, minlength=histogram.shape[1])
+        counts = histogram.reshape([len(weightSettings)] + bins)
+
+        # Along each score's axis, turn "cleared exactly j cut-offs" into the tracks
+        # that did not clear / did clear cut-off i, for every i
+        axis = 1
+        for size in bins:
+            cumulative = np.cumsum(counts, axis=axis)
+            notCleared = np.take(cumulative, range(size - 1), axis=axis)
+            total = np.take(cumulative, [size - 1], axis=axis)
+            counts = np.stack([notCleared, total - notCleared], axis=axis)
+            axis += 2
+
+        # (weights, side, i1, side, i2, ...) -> (weights, i1..i4, 16 sides) -> gene order
+        counts = counts.transpose(0, 2, 4, 6, 8, 1, 3, 5, 7)
+        counts = counts.reshape(-1, len(GENE_CATEGORIES))[:, ABOVE_INDEX_BY_CODE]
+
+        thresholdGrid = [name for name in thresholdNames if name in grid]
+        variants = [
+            {
+                **weights,
+                **{
+                    name: float(value)
+                    for name, value in zip(thresholdNames, thresholds)
+                    if name in thresholdGrid
+                },
+            }
+            for weights in weightSettings
+            for thresholds in itertools.product(*cutoffs)
+        ]
+        return variants, counts
+
+    def sweep(self, grid):
+        """
+        sweepCounts as plain data, with each variant's total variation distance from
+        the GENE_MODEL distribution as its shift.
+        """
+        variants, counts = self.sweepCounts(grid)
+        baseline = self.counts()
+        total = max(self.tracks, 1)
+        shifts = np.abs(counts - baseline).sum(axis=1) / (2 * total)
+        return {
+            "tracks": self.tracks,
+            "baseline": dict(zip(GENE_CATEGORIES, baseline.tolist())),
+            "variants": [
+                {
+                    "parameters": parameters,
+                    "counts": dict(zip(GENE_CATEGORIES, row)),
+                    "shift": round(float(shift), 4),
+                }
+                for parameters, row, shift in zip(variants, counts.tolist(), shifts)
+            ],
+        }
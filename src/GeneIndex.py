@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+from trackSchema import appendCategorical
+
+TRAIT_COLUMNS = {
+    "energy": "energy",
+    "mood": "valence",
+    "tempo": "tempo",
+    "instrumentation": "instrumentalness",
+}
+
+
+class GeneIndex:
+    """
+    Per-gene row positions, counts and pre-sorted trait rankings for one track
+    DataFrame, so gene counts, examples and trait extremes are lookups rather
+    than boolean-mask scans. append() extends it without rebuilding.
+    """
+
+    def __init__(self, df, traits=TRAIT_COLUMNS):
+        self.df = df.iloc[0:0]
+        self.traits = {
+            trait: column for trait, column in traits.items() if column in df
+        }
+        self.positions = {}
+        self.total = 0
+
+        # Stable orderings of row positions per trait column, ascending for
+        # nsmallest-style lookups and on negated values for nlargest-style ones
+        self.rankings = {}
+        self.sortedValues = {}
+        self.nanCounts = {}
+        for column in self.traits.values():
+            for direction in ("asc", "desc"):
+                self.rankings[column, direction] = np.empty(0, dtype=np.int64)
+                self.sortedValues[column, direction] = np.empty(0, dtype=np.float64)
+            self.nanCounts[column] = 0
+
+        self.append(df)
+
+    def append(self, df):
+        offset = self.total
+        self.df = df if offset == 0 else appendCategorical([self.df, df])
+        self.total += len(df)
+
+        genes = np.asarray(df["gene"], dtype=object)
+        codes, uniques = pd.factorize(genes)
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        # factorize numbers genes by first appearance, which keeps chart order stable
+        for code, gene in enumerate(uniques):
+            newPositions = order[bounds[code] : bounds[code + 1]] + offset
+            if gene in self.positions:
+                self.positions[gene] = np.concatenate([self.positions[gene], newPositions])
+            else:
+                self.positions[gene] = newPositions
+
+        for column in self.traits.values():
+            values = np.asarray(df[column], dtype=np.float64)
+            self.nanCounts[column] += int(np.isnan(values).sum())
+            self._insertSorted((column, "asc"), values, offset)
+            self._insertSorted((column, "desc"), -values, offset)
+
+    def _insertSorted(self, key, values, offset):
+        newOrder = np.argsort(values, kind="stable")
+        newValues = values[newOrder]
+        # Ties go after existing rows, matching a stable sort of the combined frame
+        insertAt = np.searchsorted(self.sortedValues[key], newValues, side="right")
+        self.rankings[key] = np.insert(self.rankings[key], insertAt, newOrder + offset)
+        self.sortedValues[key] = np.insert(self.sortedValues[key], insertAt, newValues)
+
+    def genes(self):
+        return list(self.positions)
+
+    def count(self, gene):
+        return len(self.positions.get(gene, ()))
+
+    def counts(self):
+        return {gene: len(positions) for gene, positions in self.positions.items()}
+
+    def percentages(self):
+        return {
+            gene: len(positions) / self.total * 100
+            for gene, positions in self.positions.items()
+        }
+
+    def geneData(self):
+        return [
+            {"genre": gene, "count": len(positions)}
+            for gene, positions in self.positions.items()
+        ]
+
+    def rows(self, gene):
+        return self.df.iloc[self.positions.get(gene, np.empty(0, dtype=np.int64))]
+
+    def largest(self, trait, n):
+        return self._extremes(trait, n, "desc")
+
+    def smallest(self, trait, n):
+        return self._extremes(trait, n, "asc")
+
+    def _extremes(self, trait, n, direction):
+        column = self.traits[trait]
+        # NaNs sort last and, as with nlargest/nsmallest, are never returned
+        available = self.total - self.nanCounts[column]
+        return self.df.iloc[self.rankings[column, direction][: min(n, available)]]
@@ -0,0 +1,274 @@
+import sqlite3
+import threading
+
+import pandas as pd
+
+from genes import GENE_FEATURES
+
+
+def playedAtToMs(playedAt):
+    return int(pd.Timestamp(playedAt).value // 1_000_000)
+
+
+class SQLiteHistoryStore:
+    """
+    Append-only listening history. Each play is stored once per (user, played_at)
+    and each track's gene and audio features once, so gene distributions over the
+    whole accumulated history come from indexed queries instead of Spotify.
+    """
+
+    def __init__(self, path="history.db"):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+
+        featureColumns = ", ".join(f"{name} REAL" for name in GENE_FEATURES)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS plays (
+                    user_id TEXT NOT NULL,
+                    played_at_ms INTEGER NOT NULL,
+                    played_at TEXT NOT NULL,
+                    track_id TEXT NOT NULL,
+                    PRIMARY KEY (user_id, played_at_ms)
+                )
+                """
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS plays_track ON plays (track_id)"
+            )
+            self.conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS track_genes (
+                    track_id TEXT PRIMARY KEY,
+                    gene TEXT NOT NULL,
+                    {featureColumns}
+                )
+                """
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS track_genes_gene ON track_genes (gene)"
+            )
+
+    def latestCursor(self, userId):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT MAX(played_at_ms) FROM plays WHERE user_id = ?", (userId,)
+            ).fetchone()
+        return row[0]
+
+    def recordPlays(self, userId, plays):
+        """
+        :param plays: iterable of (track_id, played_at) pairs
+        :return: number of plays that were not already stored
+        """
+        rows = [
+            (userId, playedAtToMs(playedAt), playedAt, trackId)
+            for trackId, playedAt in plays
+        ]
+        with self.lock, self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO plays VALUES (?, ?, ?, ?)", rows
+            )
+            return self.conn.total_changes - before
+
+    def recentPlays(self, userId, limit=50):
+        """
+        :return: (track_id, played_at) pairs of userId's latest plays, most recent first
+        """
+        with self.lock:
+            return self.conn.execute(
+                "SELECT track_id, played_at FROM plays WHERE user_id = ? "
+                "ORDER BY played_at_ms DESC LIMIT ?",
+                (userId, limit),
+            ).fetchall()
+
+    def playedTrackIds(self, userId):
+        with self.lock:
+            return {
+                row[0]
+                for row in self.conn.execute(
+                    "SELECT DISTINCT track_id FROM plays WHERE user_id = ?", (userId,)
+                )
+            }
+
+    def knownTrackIds(self, trackIds):
+        trackIds = list(set(trackIds))
+        known = set()
+        with self.lock:
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(trackIds), 500):
+                chunk = trackIds[i : i + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                known.update(
+                    row[0]
+                    for row in self.conn.execute(
+                        f"SELECT track_id FROM track_genes WHERE track_id IN ({placeholders})",
+                        chunk,
+                    )
+                )
+        return known
+
+    def recordTrackGenes(self, df):
+        """
+        :param df: DataFrame with id, gene and the GENE_FEATURES columns
+        """
+        columns = ["id", "gene"] + GENE_FEATURES
+        rows = (
+            df[columns]
+            .drop_duplicates(subset="id")
+            .astype({"gene": str})
+            .itertuples(index=False, name=None)
+        )
+        placeholders = ", ".join("?" * len(columns))
+        with self.lock, self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO track_genes VALUES ({placeholders})", rows
+            )
+
+    def trackFeatures(self):
+        """
+        Gene features of every track any user has played, one row per track.
+        """
+        query = f"SELECT track_id AS id, {', '.join(GENE_FEATURES)} FROM track_genes"
+        with self.lock:
+            return pd.read_sql_query(query, self.conn)
+
+    def geneCounts(self, userId, sinceMs=None):
+        query = """
+            SELECT g.gene, COUNT(*) FROM plays p
+            JOIN track_genes g ON g.track_id = p.track_id
+            WHERE p.user_id = ?
+        """
+        params = [userId]
+        if sinceMs is not None:
+            query += " AND p.played_at_ms >= ?"
+            params.append(sinceMs)
+        query += " GROUP BY g.gene ORDER BY g.gene"
+
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [{"genre": gene, "count": count} for gene, count in rows]
+
+    def getPlays(self, userId, sinceMs=None):
+        """
+        Every stored play for userId joined with its gene and features, oldest first.
+        """
+        query = f"""
+            SELECT p.played_at_ms, p.track_id, g.gene, {", ".join("g." + name for name in GENE_FEATURES)}
+            FROM plays p JOIN track_genes g ON g.track_id = p.track_id
+            WHERE p.user_id = ?
+        """
+        params = [userId]
+        if sinceMs is not None:
+            query += " AND p.played_at_ms >= ?"
+            params.append(sinceMs)
+        query += " ORDER BY p.played_at_ms"
+
+        with self.lock:
+            return pd.read_sql_query(query, self.conn, params=params)
+
+
+class MongoHistoryStore:
+    """
+    Same interface as SQLiteHistoryStore on top of a pymongo (or mongomock) database.
+    """
+
+    def __init__(self, db):
+        self.plays = db["recentTracks"]
+        self.trackGenes = db["trackGenes"]
+
+        self.plays.create_index([("user_id", 1), ("played_at_ms", 1)], unique=True)
+        self.plays.create_index([("track_id", 1)])
+        self.trackGenes.create_index([("gene", 1)])
+
+    def latestCursor(self, userId):
+        latest = self.plays.find_one(
+            {"user_id": userId}, sort=[("played_at_ms", -1)]
+        )
+        return latest["played_at_ms"] if latest else None
+
+    def recordPlays(self, userId, plays):
+        inserted = 0
+        for trackId, playedAt in plays:
+            result = self.plays.update_one(
+                {"user_id": userId, "played_at_ms": playedAtToMs(playedAt)},
+                {"$setOnInsert": {"played_at": playedAt, "track_id": trackId}},
+                upsert=True,
+            )
+            inserted += 1 if result.upserted_id is not None else 0
+        return inserted
+
+    def recentPlays(self, userId, limit=50):
+        rows = self.plays.find({"user_id": userId}, sort=[("played_at_ms", -1)], limit=limit)
+        return [(doc["track_id"], doc["played_at"]) for doc in rows]
+
+    def playedTrackIds(self, userId):
+        return set(self.plays.distinct("track_id", {"user_id": userId}))
+
+    def knownTrackIds(self, trackIds):
+        return {
+            doc["_id"]
+            for doc in self.trackGenes.find(
+                {"_id": {"$in": list(set(trackIds))}}, {"_id": 1}
+            )
+        }
+
+    def recordTrackGenes(self, df):
+        for record in df[["id", "gene"] + GENE_FEATURES].drop_duplicates(subset="id").to_dict("records"):
+            trackId = record.pop("id")
+            record["gene"] = str(record["gene"])
+            self.trackGenes.replace_one({"_id": trackId}, record, upsert=True)
+
+    def trackFeatures(self):
+        rows = self.trackGenes.find({}, {name: 1 for name in GENE_FEATURES})
+        return pd.DataFrame(
+            [{"id": doc["_id"], **{name: doc[name] for name in GENE_FEATURES}} for doc in rows],
+            columns=["id"] + GENE_FEATURES,
+        )
+
+    def _joinedPipeline(self, userId, sinceMs):
+        match = {"user_id": userId}
+        if sinceMs is not None:
+            match["played_at_ms"] = {"$gte": sinceMs}
+        return [
+            {"$match": match},
+            {
+                "$lookup": {
+                    "from": self.trackGenes.name,
+                    "localField": "track_id",
+                    "foreignField": "_id",
+                    "as": "track",
+                }
+            },
+            {"$unwind": "$track"},
+        ]
+
+    def geneCounts(self, userId, sinceMs=None):
+        pipeline = self._joinedPipeline(userId, sinceMs) + [
+            {"$group": {"_id": "$track.gene", "count": {"$sum": 1}}},
+            {"$sort": {"_id": 1}},
+        ]
+        return [
+            {"genre": doc["_id"], "count": doc["count"]}
+            for doc in self.plays.aggregate(pipeline)
+        ]
+
+    def getPlays(self, userId, sinceMs=None):
+        pipeline = self._joinedPipeline(userId, sinceMs) + [
+            {"$sort": {"played_at_ms": 1}}
+        ]
+        rows = [
+            {
+                "played_at_ms": doc["played_at_ms"],
+                "track_id": doc["track_id"],
+                "gene": doc["track"]["gene"],
+                **{name: doc["track"][name] for name in GENE_FEATURES},
+            }
+            for doc in self.plays.aggregate(pipeline)
+        ]
+        return pd.DataFrame(
+            rows, columns=["played_at_ms", "track_id", "gene"] + GENE_FEATURES
+        )
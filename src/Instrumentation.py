@@ -0,0 +1,275 @@
+import contextvars
+import functools
+import inspect
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_PREFIX = "genegenetics"
+
+# Innermost open span of a sampled request; unsampled work never creates span objects
+currentSpan = contextvars.ContextVar("currentSpan", default=None)
+
+
+class Span:
+    __slots__ = ("name", "labels", "start", "duration", "error", "children", "token")
+
+    def __init__(self, name, labels, start):
+        self.name = name
+        self.labels = labels
+        self.start = start
+        self.duration = None
+        self.error = None
+        self.children = []
+        self.token = None
+
+    def toDict(self):
+        return {
+            "name": self.name,
+            "labels": self.labels,
+            "durationMs": None if self.duration is None else round(self.duration * 1000, 3),
+            "error": self.error,
+            "children": [child.toDict() for child in list(self.children)],
+        }
+
+    def totals(self, totals=None):
+        """
+        Total seconds and call count per span name below this span.
+        """
+        totals = {} if totals is None else totals
+        for child in list(self.children):
+            if child.duration is not None:
+                seconds, count = totals.get(child.name, (0.0, 0))
+                totals[child.name] = (seconds + child.duration, count + 1)
+            child.totals(totals)
+        return totals
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Instrumentation:
+    """
+    Timing spans for hot paths. Every span feeds a latency histogram; sampled
+    requests also keep the span tree for a Server-Timing header and /debug/traces.
+    """
+
+    def __init__(
+        self,
+        enabled=True,
+        sampleRate=1.0,
+        buckets=DEFAULT_BUCKETS,
+        maxTraces=50,
+        clock=time.perf_counter,
+        rng=random.random,
+    ):
+        """
+        :param sampleRate: fraction of requests whose span tree is kept; histograms see every request
+        """
+        self.enabled = enabled
+        self.sampleRate = sampleRate
+        self.buckets = buckets
+        self.clock = clock
+        self.rng = rng
+
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.traces = deque(maxlen=maxTraces)
+
+    def configure(self, enabled=None, sampleRate=None):
+        if enabled is not None:
+            self.enabled = enabled
+        if sampleRate is not None:
+            self.sampleRate = sampleRate
+
+    # Recording
+    def observe(self, metric, seconds, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def increment(self, metric, amount=1, **labels):
+        key = (metric, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    @contextmanager
+    def span(self, name, **labels):
+        if not self.enabled:
+            yield None
+            return
+
+        parent = currentSpan.get()
+        start = self.clock()
+        span = token = None
+        if parent is not None:
+            span = Span(name, labels, start)
+            parent.children.append(span)
+            token = currentSpan.set(span)
+
+        try:
+            yield span
+        except Exception as e:
+            self.increment("span_errors_total", span=name)
+            if span is not None:
+                span.error = type(e).__name__
+            raise
+        finally:
+            duration = self.clock() - start
+            if span is not None:
+                span.duration = duration
+                currentSpan.reset(token)
+            self.observe("span_seconds", duration, span=name, **labels)
+
+    def recordError(self, name, error):
+        """
+        Count an exception that was handled instead of raised, and mark it on the open
+        span, so errors that only get printed still show up in /metrics and traces.
+        """
+        if not self.enabled:
+            return
+        self.increment("handled_errors_total", where=name, error=type(error).__name__)
+        span = currentSpan.get()
+        if span is not None and span.error is None:
+            span.error = type(error).__name__
+
+    def timed(self, name):
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with self.span(name):
+                    return fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def instrumentMethods(self, cls):
+        """
+        Class decorator timing every public method as "<Class>.<method>".
+        Generator methods are left alone, their callers are timed instead.
+        """
+        for attr, value in list(vars(cls).items()):
+            if attr.startswith("_") or not inspect.isfunction(value):
+                continue
+            if inspect.isgeneratorfunction(value):
+                continue
+            setattr(cls, attr, self.timed(f"{cls.__name__}.{attr}")(value))
+        return cls
+
+    # Request traces
+    def startTrace(self, name, **labels):
+        """
+        :return: the root span when this request is sampled, else None
+        """
+        if not self.enabled or self.rng() >= self.sampleRate:
+            return None
+        root = Span(name, labels, self.clock())
+        root.token = currentSpan.set(root)
+        return root
+
+    def finishTrace(self, root, status=None):
+        duration = self.clock() - root.start
+        root.duration = duration
+        currentSpan.reset(root.token)
+        if status is not None:
+            root.labels["status"] = status
+        with self.lock:
+            self.traces.append(root)
+        return duration
+
+    def recentTraces(self):
+        with self.lock:
+            traces = list(self.traces)
+        return [trace.toDict() for trace in reversed(traces)]
+
+    # Export
+    def renderPrometheus(self):
+        with self.lock:
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self.histograms.items()}
+            counters = dict(self.counters)
+
+        lines = []
+        for metric in sorted({metric for metric, _ in histograms}):
+            name = f"{METRIC_PREFIX}_{metric}"
+            lines.append(f"# TYPE {name} histogram")
+            for (m, labels), (counts, total, count) in sorted(histograms.items()):
+                if m != metric:
+                    continue
+                cumulative = 0
+                for bound, bucketCount in zip(self.buckets, counts):
+                    cumulative += bucketCount
+                    lines.append(
+                        f"{name}_bucket{formatLabels(labels + (('le', repr(bound)),))} {cumulative}"
+                    )
+                lines.append(f"{name}_bucket{formatLabels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{formatLabels(labels)} {total}")
+                lines.append(f"{name}_count{formatLabels(labels)} {count}")
+
+        for metric in sorted({metric for metric, _ in counters}):
+            name = f"{METRIC_PREFIX}_{metric}"
+            lines.append(f"# TYPE {name} counter")
+            for (m, labels), value in sorted(counters.items()):
+                if m == metric:
+                    lines.append(f"{name}{formatLabels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def formatLabels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+        for key, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def serverTiming(root):
+    """
+    Server-Timing header value: total time and call count per span name.
+    """
+    entries = [f"total;dur={root.duration * 1000:.1f}"] if root.duration is not None else []
+    for name, (seconds, count) in root.totals().items():
+        entries.append(f'{name};dur={seconds * 1000:.1f};desc="{count}x"')
+    return ", ".join(entries)
+
+
+def inContext(fn):
+    """
+    Bind fn to the caller's context so spans opened in pool threads nest under
+    the request that scheduled them. Each call runs in its own copy, as one
+    context cannot be entered by two threads at once.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+# Shared by the modules that record spans; app.py configures it from the environment
+instrumentation = Instrumentation()
@@ -0,0 +1,113 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from batching import PAGE_SIZE, chunked, fetchAllPages
+from Instrumentation import inContext
+
+TOP_TRACK_TIME_RANGES = ("short_term", "medium_term", "long_term")
+
+
+class LibraryIngest:
+    """
+    Library-scale ingestion for a UserGenes profile: pages through saved tracks,
+    top tracks for every time range and recently-played history, then enriches
+    the IDs in chunks and streams gene-scored DataFrames back as they complete.
+    """
+
+    def __init__(self, user, chunkSize=1000, chunksInFlight=2):
+        """
+        :param user: UserGenes whose Spotify client and batch helpers are used
+        :param chunkSize: track IDs enriched per streamed DataFrame
+        :param chunksInFlight: chunks being enriched at once, each fanning out its own batch calls
+        """
+        self.user = user
+        self.sp = user.sp
+        self.chunkSize = chunkSize
+        self.chunksInFlight = chunksInFlight
+
+        self.savedTrackIds = None
+
+    def getSavedTrackIds(self):
+        items = fetchAllPages(
+            lambda limit, offset: self.sp.current_user_saved_tracks(
+                limit=limit, offset=offset
+            ),
+            maxWorkers=self.user.maxWorkers,
+        )
+        self.savedTrackIds = [item["track"]["id"] for item in items if item["track"]]
+        return self.savedTrackIds
+
+    def getTopTrackIds(self):
+        with ThreadPoolExecutor(max_workers=len(TOP_TRACK_TIME_RANGES)) as executor:
+            pages = executor.map(
+                inContext(
+                    lambda timeRange: fetchAllPages(
+                        lambda limit, offset: self.sp.current_user_top_tracks(
+                            limit=limit, offset=offset, time_range=timeRange
+                        ),
+                        maxWorkers=self.user.maxWorkers,
+                    )
+                ),
+                TOP_TRACK_TIME_RANGES,
+            )
+            return [item["id"] for items in pages for item in items]
+
+    def getRecentlyPlayedIds(self):
+        # Recently played is cursor-paged, so pages have to be walked in order
+        trackIds = []
+        before = None
+        while True:
+            page = self.sp.current_user_recently_played(limit=PAGE_SIZE, before=before)
+            trackIds.extend(item["track"]["id"] for item in page["items"])
+            if not page["items"] or not page.get("next") or not page.get("cursors"):
+                return trackIds
+            before = page["cursors"]["before"]
+
+    def getLibraryTrackIds(self, sources=("saved", "top", "recent")):
+        loaders = {
+            "saved": self.getSavedTrackIds,
+            "top": self.getTopTrackIds,
+            "recent": self.getRecentlyPlayedIds,
+        }
+        with ThreadPoolExecutor(max_workers=len(sources)) as executor:
+            idLists = list(
+                executor.map(inContext(lambda source: loaders[source]()), sources)
+            )
+
+        return list(dict.fromkeys(trackId for ids in idLists for trackId in ids if trackId))
+
+    def enrichChunk(self, trackIds):
+        df = self.user.createTrackInfoDataFrame(trackIds)
+        if df.empty:
+            return df
+
+        if self.savedTrackIds is not None:
+            # A fully paged library answers inLibrary without saved-contains calls
+            saved = set(self.savedTrackIds)
+            df["inLibrary"] = df["id"].isin(saved)
+        else:
+            df["inLibrary"] = self.user.isInLibrary(df["id"])
+
+        return self.user.mergeAudioFeatures(df)
+
+    def iterLibrary(self, sources=("saved", "top", "recent")):
+        """
+        Yield gene-scored DataFrames chunk by chunk, in library order.
+        """
+        chunks = chunked(self.getLibraryTrackIds(sources), self.chunkSize)
+
+        with ThreadPoolExecutor(max_workers=self.chunksInFlight) as executor:
+            pending = []
+            for chunk in chunks:
+                pending.append(executor.submit(inContext(self.enrichChunk), chunk))
+                if len(pending) >= self.chunksInFlight:
+                    yield pending.pop(0).result()
+            for future in pending:
+                yield future.result()
+
+    def buildLibraryDF(self, sources=("saved", "top", "recent")):
+        frames = [df for df in self.iterLibrary(sources) if not df.empty]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
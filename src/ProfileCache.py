@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import OrderedDict
+
+from Instrumentation import instrumentation
+
+
+class ProfileCache:
+    """
+    Process-wide store of built UserGenes profiles, keyed by Spotify user and access token.
+    A single dashboard view hits index(), /chart_data and /sidebar_card_data; all three
+    are served from the same profile instead of rebuilding recentTracksDF each time.
+    """
+
+    def __init__(self, ttl=300, checkInterval=30, maxEntries=256, clock=time.monotonic):
+        """
+        :param ttl: seconds a built profile may be served before it is rebuilt
+        :param checkInterval: minimum seconds between played_at cursor checks for an entry
+        :param maxEntries: least recently used profiles are dropped beyond this size
+        :param clock: monotonic time source, replaceable for deterministic tests
+        """
+        self.ttl = ttl
+        self.checkInterval = checkInterval
+        self.maxEntries = maxEntries
+        self.clock = clock
+
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Per user rather than per key, so refreshed tokens do not each leave a lock behind
+        self.keyLocks = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.stale = 0
+
+    @staticmethod
+    def makeKey(userId, tokenInfo):
+        return (userId, tokenInfo["access_token"])
+
+    def getOrBuild(self, key, sp, build):
+        """
+        Return the cached profile for key, building it with build() on a miss.
+        :param key: tuple from makeKey
+        :param sp: spotipy client used for the cheap recently-played cursor check
+        :param build: zero-argument callable returning an initialised UserGenes
+        """
+        with self.lockFor(key):
+            profile = self.get(key, sp)
+            if profile is not None:
+                return profile
+
+            profile = build()
+            self.put(key, profile)
+            return profile
+
+    def refresh(self, key, sp, build):
+        """
+        Keep key's profile servable for another ttl without counting a lookup: rebuilt
+        with build() when the user has played something since, else re-stamped.
+        :return: whether build() ran
+        """
+        with self.lockFor(key):
+            entry = self._lookup(key)
+            if entry is not None and self._isFresh(entry, sp):
+                with self.lock:
+                    entry["builtAt"] = self.clock()
+                return False
+
+            self.put(key, build())
+            return True
+
+    def get(self, key, sp):
+        """
+        Return the cached profile for key, or None when the caller has to build it.
+        """
+        entry = self._lookup(key)
+        if entry is not None and self._isFresh(entry, sp):
+            with self.lock:
+                self.hits += 1
+            return entry["profile"]
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, profile):
+        now = self.clock()
+        with self.lock:
+            # A refreshed token leaves the old entry unreachable, so drop it now
+            for otherKey in [k for k in self.entries if k[0] == key[0] and k != key]:
+                del self.entries[otherKey]
+
+            self.entries[key] = {
+                "profile": profile,
+                "builtAt": now,
+                "checkedAt": now,
+                "latestPlayedAt": getattr(profile, "latestPlayedAt", None),
+            }
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxEntries:
+                evictedKey, _ = self.entries.popitem(last=False)
+                self._dropLock(evictedKey[0])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            for userId in list(self.keyLocks):
+                self._dropLock(userId)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "stale": self.stale,
+                "hitRatio": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+            }
+
+    def lockFor(self, key):
+        """
+        The lock getOrBuild and refresh hold while building key's profile; callers
+        that build one themselves hold it too, so concurrent requests build it once.
+        """
+        with self.lock:
+            if key[0] not in self.keyLocks:
+                self.keyLocks[key[0]] = threading.Lock()
+            return self.keyLocks[key[0]]
+
+    def _lookup(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            if self.clock() - entry["builtAt"] > self.ttl:
+                del self.entries[key]
+                self._dropLock(key[0])
+                self.expired += 1
+                return None
+
+            self.entries.move_to_end(key)
+            return entry
+
+    def _dropLock(self, userId):
+        # Called with self.lock held; a lock still held or with entries left stays
+        lock = self.keyLocks.get(userId)
+        if lock is None or lock.locked() or any(k[0] == userId for k in self.entries):
+            return
+        del self.keyLocks[userId]
+
+    def _isFresh(self, entry, sp):
+        now = self.clock()
+        if now - entry["checkedAt"] < self.checkInterval:
+            return True
+
+        try:
+            latest = sp.current_user_recently_played(limit=1)["items"]
+        except Exception as e:
+            print(f"Error checking recently played cursor: {e}")
+            instrumentation.recordError("ProfileCache.cursorCheck", e)
+            return True
+
+        entry["checkedAt"] = now
+        if latest and latest[0]["played_at"] != entry["latestPlayedAt"]:
+            with self.lock:
+                self.stale += 1
+            return False
+
+        return True
@@ -0,0 +1,210 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Instrumentation import instrumentation
+
+
+class ProfileWarmer:
+    """
+    Keeps the profiles of opted-in users built ahead of their next visit. Each user is
+    re-warmed every interval seconds, give or take jitter so users registered together
+    do not hit Spotify together, with at most maxConcurrent warms running at once.
+    Failures back off exponentially and a user is dropped after maxFailures in a row,
+    e.g. once they revoke access.
+    """
+
+    def __init__(
+        self,
+        warm,
+        refreshToken=None,
+        interval=240,
+        jitter=0.2,
+        maxConcurrent=2,
+        retryDelay=30,
+        maxFailures=5,
+        clock=time.monotonic,
+        rng=None,
+    ):
+        """
+        :param warm: callable (userId, tokenInfo, cacheKey) building and publishing the
+            user's profile; returns whether a new profile was built
+        :param refreshToken: callable returning tokenInfo with a valid access token,
+            called before every warm; None uses tokens as registered
+        :param clock: monotonic time source, replaceable for deterministic tests
+        """
+        self.warm = warm
+        self.refreshToken = refreshToken
+        self.interval = interval
+        self.jitter = jitter
+        self.maxConcurrent = maxConcurrent
+        self.retryDelay = retryDelay
+        self.maxFailures = maxFailures
+        self.clock = clock
+        self.rng = rng or random.Random()
+
+        self.lock = threading.Lock()
+        self.users = {}
+        self.inFlight = set()
+        self.executor = ThreadPoolExecutor(max_workers=maxConcurrent)
+        self.stopped = threading.Event()
+        self.thread = None
+
+        self.warmed = 0
+        self.unchanged = 0
+        self.failures = 0
+        self.dropped = 0
+        self.lastLag = 0.0
+
+    def register(self, userId, tokenInfo, cacheKey):
+        """
+        Opt a user in, or update their token. The first warm is one interval away, as
+        registration follows a fresh build.
+        :param cacheKey: key the serving cache looks the user's profile up under
+        """
+        with self.lock:
+            self.users[userId] = {
+                "tokenInfo": tokenInfo,
+                "cacheKey": cacheKey,
+                "nextRunAt": self._nextRun(self.interval),
+                "failures": 0,
+            }
+
+    def unregister(self, userId):
+        with self.lock:
+            self.users.pop(userId, None)
+
+    def isRegistered(self, userId):
+        with self.lock:
+            return userId in self.users
+
+    def runDue(self):
+        """
+        Warm every user whose turn has come, through the bounded pool, and wait for them.
+        :return: number of users warmed, successfully or not
+        """
+        now = self.clock()
+        with self.lock:
+            due = sorted(
+                (entry["nextRunAt"], userId)
+                for userId, entry in self.users.items()
+                if entry["nextRunAt"] <= now and userId not in self.inFlight
+            )
+            self.inFlight.update(userId for _, userId in due)
+
+        futures = [self.executor.submit(self._warmUser, userId) for _, userId in due]
+        for future in futures:
+            future.result()
+        return len(futures)
+
+    def secondsUntilNextRun(self):
+        with self.lock:
+            waiting = [
+                entry["nextRunAt"]
+                for userId, entry in self.users.items()
+                if userId not in self.inFlight
+            ]
+        return max(0.0, min(waiting) - self.clock()) if waiting else self.interval
+
+    def start(self, pollInterval=5):
+        """
+        Run runDue on a daemon thread until stop(), checking at least every pollInterval.
+        """
+        if self.thread is not None:
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(
+            target=self._loop, args=(pollInterval,), name="profile-warmer", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def stats(self):
+        now = self.clock()
+        with self.lock:
+            overdue = [
+                now - entry["nextRunAt"]
+                for userId, entry in self.users.items()
+                if entry["nextRunAt"] <= now and userId not in self.inFlight
+            ]
+            return {
+                "users": len(self.users),
+                "queueDepth": len(overdue),
+                "inFlight": len(self.inFlight),
+                # How far behind schedule the most overdue user is, and the last warm started
+                "lagSeconds": max(overdue, default=0.0),
+                "lastLagSeconds": self.lastLag,
+                "warmed": self.warmed,
+                "unchanged": self.unchanged,
+                "failures": self.failures,
+                "dropped": self.dropped,
+            }
+
+    def _loop(self, pollInterval):
+        while not self.stopped.is_set():
+            try:
+                self.runDue()
+            except Exception as e:
+                print(f"Error warming profiles: {e}")
+                instrumentation.recordError("ProfileWarmer.runDue", e)
+            self.stopped.wait(min(pollInterval, self.secondsUntilNextRun()))
+
+    def _warmUser(self, userId):
+        with self.lock:
+            entry = self.users.get(userId)
+            if entry is not None:
+                self.lastLag = max(0.0, self.clock() - entry["nextRunAt"])
+                tokenInfo, cacheKey = entry["tokenInfo"], entry["cacheKey"]
+        if entry is None:
+            # Unregistered while queued
+            with self.lock:
+                self.inFlight.discard(userId)
+            return
+
+        try:
+            if self.refreshToken is not None:
+                tokenInfo = self.refreshToken(tokenInfo)
+            built = self.warm(userId, tokenInfo, cacheKey)
+        except Exception as e:
+            print(f"Error warming profile of {userId}: {e}")
+            instrumentation.recordError("ProfileWarmer.warmUser", e)
+            self._finish(userId, entry, None, error=True)
+            instrumentation.increment("profile_warm_total", result="error")
+        else:
+            self._finish(userId, entry, tokenInfo, error=False, built=built)
+            instrumentation.increment("profile_warm_total", result="built" if built else "unchanged")
+
+    def _finish(self, userId, entry, tokenInfo, error, built=False):
+        with self.lock:
+            self.inFlight.discard(userId)
+            # A newer registration replaced the entry while this warm ran; keep that one
+            if self.users.get(userId) is not entry:
+                return
+
+            if not error:
+                entry["tokenInfo"] = tokenInfo
+                entry["failures"] = 0
+                entry["nextRunAt"] = self._nextRun(self.interval)
+                if built:
+                    self.warmed += 1
+                else:
+                    self.unchanged += 1
+                return
+
+            self.failures += 1
+            entry["failures"] += 1
+            if entry["failures"] >= self.maxFailures:
+                del self.users[userId]
+                self.dropped += 1
+                return
+            delay = min(self.interval, self.retryDelay * 2 ** (entry["failures"] - 1))
+            entry["nextRunAt"] = self._nextRun(delay)
+
+    def _nextRun(self, delay):
+        return self.clock() + delay * (1 + self.rng.uniform(-self.jitter, self.jitter))
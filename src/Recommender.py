@@ -0,0 +1,122 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from Instrumentation import inContext, instrumentation
+
+
+class Recommender:
+    """
+    Gene-seeded recommendations for a UserGenes profile. Seeds come from the
+    profile's own frame, every gene's sp.recommendations call runs concurrently,
+    and the combined results are enriched with a single round of chunked batch
+    lookups instead of one per gene. Genes the API returns nothing new for fall
+    back to the nearest tracks in the profile's SimilarityIndex, when it has one.
+    """
+
+    def __init__(self, user, seedArtists=2, seedTracks=2):
+        self.user = user
+        self.sp = user.sp
+        self.similarityIndex = user.similarityIndex
+        self.seedArtists = seedArtists
+        self.seedTracks = seedTracks
+
+    def getSeeds(self, df, gene):
+        geneTracks = df[df["gene"] == gene]
+        if geneTracks.empty:
+            return None
+
+        return {
+            "seed_artists": geneTracks["artistID"]
+            .sample(n=min(self.seedArtists, len(geneTracks)))
+            .tolist(),
+            "seed_tracks": geneTracks["id"]
+            .sample(n=min(self.seedTracks, len(geneTracks)))
+            .tolist(),
+        }
+
+    def getHistoryTrackIds(self, df):
+        trackIds = set(df["id"])
+        for known in (self.user.recentTracksDF, self.user.libraryDF):
+            if known is not None and "id" in known:
+                trackIds.update(known["id"])
+        if self.user.historyStore is not None:
+            trackIds.update(self.user.historyStore.playedTrackIds(self.user.userId))
+        return trackIds
+
+    def fetchRecommendations(self, seed, limit):
+        try:
+            return self.sp.recommendations(limit=limit, **seed)["tracks"]
+        except Exception as e:
+            print(f"Error fetching recommendations: {e}")
+            instrumentation.recordError("Recommender.fetchRecommendations", e)
+            return []
+
+    def getSimilarTrackIds(self, df, gene, limit, historyIds):
+        """
+        Tracks of gene nearest the centroid of the profile's own tracks of that gene.
+        """
+        if self.similarityIndex is None:
+            return []
+        centroid = self.similarityIndex.centroid(df[df["gene"] == gene])
+        return [
+            trackId
+            for trackId, _ in self.similarityIndex.nearest(
+                centroid, limit, exclude=historyIds, gene=gene
+            )
+        ]
+
+    def recommend(self, df, genes=None, limit=20):
+        """
+        :param df: profile frame the seeds are drawn from
+        :param genes: genes to recommend for, every gene in df when omitted
+        :param limit: recommendations requested per gene
+        :return: dict of gene -> enriched DataFrame of tracks not already in the user's history
+        """
+        if genes is None:
+            genes = list(df["gene"].astype(str).unique())
+
+        seeds = {gene: self.getSeeds(df, gene) for gene in genes}
+        seeds = {gene: seed for gene, seed in seeds.items() if seed is not None}
+        if not seeds:
+            return {gene: pd.DataFrame() for gene in genes}
+
+        with ThreadPoolExecutor(
+            max_workers=min(self.user.maxWorkers, len(seeds))
+        ) as executor:
+            responses = dict(
+                zip(
+                    seeds,
+                    executor.map(
+                        inContext(lambda seed: self.fetchRecommendations(seed, limit)),
+                        seeds.values(),
+                    ),
+                )
+            )
+
+        historyIds = self.getHistoryTrackIds(df)
+        trackIdsByGene = {
+            gene: [track["id"] for track in tracks if track["id"] not in historyIds]
+            for gene, tracks in responses.items()
+        }
+        for gene, trackIds in trackIdsByGene.items():
+            if not trackIds:
+                trackIdsByGene[gene] = self.getSimilarTrackIds(df, gene, limit, historyIds)
+
+        allIds = list(
+            dict.fromkeys(
+                trackId for trackIds in trackIdsByGene.values() for trackId in trackIds
+            )
+        )
+        if not allIds:
+            return {gene: pd.DataFrame() for gene in genes}
+
+        enrichedDF = self.user.addColumnsToDF(self.user.createTrackInfoDataFrame(allIds))
+        enrichedDF = enrichedDF.set_index("id", drop=False)
+
+        return {
+            gene: enrichedDF.loc[
+                [trackId for trackId in trackIdsByGene.get(gene, []) if trackId in enrichedDF.index]
+            ].reset_index(drop=True)
+            for gene in genes
+        }
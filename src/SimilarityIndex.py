@@ -0,0 +1,317 @@
+import os
+import threading
+
+import numpy as np
+
+from genes import GENE_CATEGORIES, calculateGeneCodes
+
+# Feature -> (low, high) used to scale each column to 0-1. Fixed ranges rather than
+# data-derived ones, so vectors added later never invalidate the stored matrix.
+SIMILARITY_FEATURES = {
+    "danceability": (0.0, 1.0),
+    "energy": (0.0, 1.0),
+    "valence": (0.0, 1.0),
+    "acousticness": (0.0, 1.0),
+    "instrumentalness": (0.0, 1.0),
+    "speechiness": (0.0, 1.0),
+    "liveness": (0.0, 1.0),
+    "tempo": (0.0, 250.0),
+    "loudness": (-60.0, 0.0),
+}
+
+FEATURE_LOW = np.array([low for low, _ in SIMILARITY_FEATURES.values()], dtype=np.float32)
+FEATURE_SPAN = np.array(
+    [high - low for low, high in SIMILARITY_FEATURES.values()], dtype=np.float32
+)
+
+# Rows whose distances bound a block's nearest ones before it is partitioned
+PREFIX_ROWS = 4096
+
+
+def nearestRows(distances, wanted):
+    """
+    Indices of the wanted smallest distances, in no particular order.
+    """
+    if len(distances) <= wanted:
+        return np.arange(len(distances))
+    # The wanted-th smallest of a prefix bounds the whole array's, so only the few rows
+    # under it are partitioned rather than all of them
+    prefix = distances[: max(4 * wanted, PREFIX_ROWS)]
+    near = np.flatnonzero(distances <= np.partition(prefix, wanted)[wanted])
+    return near[np.argpartition(distances[near], wanted)[:wanted]]
+
+
+def featureMatrix(df):
+    """
+    Scaled float32 feature vectors, one row per row of df.
+    """
+    raw = np.column_stack(
+        [np.asarray(df[name], dtype=np.float32) for name in SIMILARITY_FEATURES]
+    )
+    return np.clip((raw - FEATURE_LOW) / FEATURE_SPAN, 0.0, 1.0)
+
+
+class FeatureBlock:
+    """
+    Scaled feature vectors stored feature-major, one row per feature, in a buffer with
+    spare capacity. Appends copy only the new vectors and the buffer doubles when full,
+    so adding a batch costs its own size rather than the whole index. Views handed out
+    earlier stay valid, as appends only write past their end.
+    """
+
+    def __init__(self, columns=None, positions=None):
+        """
+        :param columns: (features, n) array to start from, possibly memory-mapped
+        :param positions: index-wide row of each vector, for blocks holding a subset
+        """
+        if columns is None:
+            columns = np.empty((len(SIMILARITY_FEATURES), 0), dtype=np.float32)
+        self.columns = columns
+        self.squaredNorms = np.einsum("ij,ij->j", columns, columns)
+        self.positions = positions
+        self.count = columns.shape[1]
+
+    def __len__(self):
+        return self.count
+
+    def append(self, columns, squaredNorms, positions=None):
+        added = columns.shape[1]
+        end = self.count + added
+        if end > self.columns.shape[1] or not self.columns.flags.writeable:
+            # A memory-mapped block is read-only, so the first append copies it into memory
+            self.grow(max(end, 2 * self.count, 1024))
+        self.columns[:, self.count : end] = columns
+        self.squaredNorms[self.count : end] = squaredNorms
+        if positions is not None:
+            self.positions[self.count : end] = positions
+        self.count = end
+
+    def grow(self, capacity):
+        columns = np.empty((self.columns.shape[0], capacity), dtype=np.float32)
+        columns[:, : self.count] = self.columns[:, : self.count]
+        squaredNorms = np.empty(capacity, dtype=np.float32)
+        squaredNorms[: self.count] = self.squaredNorms[: self.count]
+        self.columns, self.squaredNorms = columns, squaredNorms
+        if self.positions is not None:
+            positions = np.empty(capacity, dtype=np.int64)
+            positions[: self.count] = self.positions[: self.count]
+            self.positions = positions
+
+    def view(self):
+        """
+        :return: (columns, squared norms, index-wide positions or None) of the vectors
+            stored so far
+        """
+        positions = None if self.positions is None else self.positions[: self.count]
+        return self.columns[:, : self.count], self.squaredNorms[: self.count], positions
+
+
+class SimilarityIndex:
+    """
+    Nearest-neighbour index over the audio features of every track enriched by any
+    user. Exact search by blocked NumPy brute force over float32 FeatureBlocks, one for
+    every track plus one per gene for gene-restricted queries. save() writes the vectors
+    to .npy files that load() memory-maps, so worker processes share their pages.
+    """
+
+    def __init__(self, path=None, blockSize=65536):
+        """
+        :param path: file prefix to load from and save to; None keeps the index in memory only
+        :param blockSize: rows scored per block, bounding the temporary distance array
+        """
+        self.path = path
+        self.blockSize = blockSize
+        self.lock = threading.Lock()
+
+        self.ids = []
+        self.positions = {}
+        self.tracks = FeatureBlock()
+        self.geneCodes = np.empty(0, dtype=np.uint8)
+        self.geneBlocks = {}
+        self.indexGenes()
+
+        if path is not None and os.path.exists(f"{path}.columns.npy"):
+            self.load(path)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def genes(self):
+        """
+        Gene code of every track, in index order.
+        """
+        return self.geneCodes[: len(self.ids)]
+
+    @property
+    def matrix(self):
+        """
+        Scaled feature vectors, one row per track.
+        """
+        return self.tracks.view()[0].T
+
+    # Building
+    def add(self, df):
+        """
+        Index the tracks of df not seen before.
+        :param df: DataFrame with id plus the SIMILARITY_FEATURES and gene feature columns
+        :return: number of tracks added
+        """
+        df = df.drop_duplicates(subset="id")
+        # Scored before taking the lock, so queries only wait for the copies
+        df = df[[trackId not in self.positions for trackId in df["id"]]]
+        if df.empty:
+            return 0
+        columns = np.ascontiguousarray(featureMatrix(df).T)
+        squaredNorms = np.einsum("ij,ij->j", columns, columns)
+        codes = calculateGeneCodes(df).astype(np.uint8)
+
+        with self.lock:
+            new = np.array([trackId not in self.positions for trackId in df["id"]])
+            if not new.any():
+                return 0
+            trackIds = df["id"].to_numpy(dtype=object)[new]
+            columns, squaredNorms, codes = columns[:, new], squaredNorms[new], codes[new]
+
+            start = len(self.ids)
+            end = start + len(trackIds)
+            if end > len(self.geneCodes):
+                geneCodes = np.empty(max(end, 2 * start, 1024), dtype=np.uint8)
+                geneCodes[:start] = self.geneCodes[:start]
+                self.geneCodes = geneCodes
+            self.geneCodes[start:end] = codes
+
+            positions = np.arange(start, end)
+            self.ids.extend(trackIds)
+            self.positions.update(zip(trackIds, positions.tolist()))
+            self.tracks.append(columns, squaredNorms)
+            for code in np.unique(codes).tolist():
+                rows = codes == code
+                self.geneBlocks[code].append(columns[:, rows], squaredNorms[rows], positions[rows])
+            return len(trackIds)
+
+    def updateGenes(self, df):
+        """
+        Re-score tracks already indexed, e.g. once audio-analysis summaries refine their
+        genes, moving the ones whose gene changed to their new gene's block.
+        :param df: DataFrame with id plus the gene feature columns
+        :return: number of tracks whose gene changed
+        """
+        df = df.drop_duplicates(subset="id")
+        df = df[[trackId in self.positions for trackId in df["id"]]]
+        if df.empty:
+            return 0
+        codes = calculateGeneCodes(df).astype(np.uint8)
+
+        with self.lock:
+            positions = np.array([self.positions[trackId] for trackId in df["id"]])
+            changed = self.geneCodes[positions] != codes
+            positions, codes = positions[changed], codes[changed]
+            previous = set(self.geneCodes[positions].tolist())
+            self.geneCodes[positions] = codes
+
+            # Blocks that lost rows are rebuilt, as views of them may still be in use;
+            # the others only get the moved rows appended
+            columns, squaredNorms, _ = self.tracks.view()
+            for code in previous:
+                self.indexGene(code)
+            for code in set(codes.tolist()) - previous:
+                rows = positions[codes == code]
+                self.geneBlocks[code].append(columns[:, rows], squaredNorms[rows], rows)
+            return len(positions)
+
+    def indexGenes(self):
+        # A block per gene, so gene-restricted queries only score that gene's rows
+        # without gathering them on every call
+        for code in range(len(GENE_CATEGORIES)):
+            self.indexGene(code)
+
+    def indexGene(self, code):
+        columns, squaredNorms, _ = self.tracks.view()
+        rows = np.flatnonzero(self.genes == code)
+        block = FeatureBlock(positions=np.empty(0, dtype=np.int64))
+        block.append(columns[:, rows], squaredNorms[rows], rows)
+        self.geneBlocks[code] = block
+
+    # Queries
+    def nearest(self, vector, k=20, exclude=(), gene=None):
+        """
+        :param vector: scaled feature vector, e.g. from featureMatrix or centroid
+        :param exclude: track IDs never returned
+        :param gene: only return tracks of this gene
+        :return: list of (track ID, squared distance), nearest first
+        """
+        with self.lock:
+            ids = self.ids
+            block = self.tracks if gene is None else self.geneBlocks[GENE_CATEGORIES.index(gene)]
+            columns, norms, rows = block.view()
+        count = columns.shape[1]
+        if not count:
+            return []
+
+        vector = np.asarray(vector, dtype=np.float32)
+        excluded = {self.positions[trackId] for trackId in exclude if trackId in self.positions}
+        wanted = k + len(excluded)
+
+        candidates = []
+        for start in range(0, count, self.blockSize):
+            block = slice(start, start + self.blockSize)
+            blockRows = np.arange(start, min(start + self.blockSize, count))
+            if rows is not None:
+                blockRows = rows[block]
+            # |a - b|^2 = |a|^2 - 2ab + |b|^2, the |b|^2 term is the same for every row
+            distances = norms[block] - 2 * (vector @ columns[:, block])
+            top = nearestRows(distances, wanted)
+            candidates.append((blockRows[top], distances[top]))
+
+        positions = np.concatenate([c[0] for c in candidates])
+        distances = np.concatenate([c[1] for c in candidates])
+        order = np.argsort(distances, kind="stable")
+        offset = float(vector @ vector)
+
+        results = []
+        for i in order:
+            if positions[i] in excluded:
+                continue
+            results.append((ids[positions[i]], max(0.0, float(distances[i]) + offset)))
+            if len(results) == k:
+                break
+        return results
+
+    def nearestToTrack(self, trackId, k=20, gene=None):
+        position = self.positions.get(trackId)
+        if position is None:
+            return []
+        return self.nearest(self.matrix[position], k, exclude=[trackId], gene=gene)
+
+    def centroid(self, df):
+        """
+        Mean scaled feature vector of the tracks in df, e.g. a user's tracks of one gene.
+        """
+        return featureMatrix(df).mean(axis=0)
+
+    # Persistence
+    def save(self, path=None):
+        path = path or self.path
+        with self.lock:
+            arrays = {
+                "columns": np.ascontiguousarray(self.tracks.view()[0]),
+                "genes": self.genes,
+                "ids": np.array(self.ids, dtype=str),
+            }
+        for name, array in arrays.items():
+            # Written beside the live file and swapped in, so readers never see a partial one
+            temporary = f"{path}.{name}.tmp.npy"
+            np.save(temporary, array)
+            os.replace(temporary, f"{path}.{name}.npy")
+
+    def load(self, path):
+        columns = np.load(f"{path}.columns.npy", mmap_mode="r")
+        genes = np.load(f"{path}.genes.npy")
+        ids = np.load(f"{path}.ids.npy").tolist()
+        with self.lock:
+            self.tracks = FeatureBlock(columns)
+            self.geneCodes = genes
+            self.ids = ids
+            self.positions = {trackId: i for i, trackId in enumerate(ids)}
+            self.indexGenes()
@@ -0,0 +1,213 @@
+import json
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from Instrumentation import instrumentation
+
+# Spotify IDs are 22 base62 characters; collapsing them keeps per-endpoint metrics bounded
+SPOTIFY_ID = re.compile(r"/[0-9A-Za-z]{22}(?=/|$)")
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# A 5xx or dropped connection may come after the server acted on the request, so only
+# these are sent again then; a 429 is always retried, as nothing was done
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+class TokenBucket:
+    """
+    Global request budget shared by every user, plus a hold-off that a 429's
+    Retry-After places on all callers at once.
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+
+        self.tokens = burst
+        self.updatedAt = clock()
+        self.blockedUntil = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a request may be sent.
+        :return: seconds spent waiting
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.burst, self.tokens + (now - self.updatedAt) * self.rate)
+                self.updatedAt = now
+
+                if now < self.blockedUntil:
+                    delay = self.blockedUntil - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                else:
+                    delay = (1 - self.tokens) / self.rate
+
+            self.sleep(delay)
+            waited += delay
+
+    def holdOff(self, seconds):
+        with self.lock:
+            self.blockedUntil = max(self.blockedUntil, self.clock() + seconds)
+            self.tokens = 0
+
+
+class SpotifyTransport(requests.Session):
+    """
+    Process-wide requests session for every spotipy client: one keep-alive
+    connection pool, a token-bucket scheduler that honours Retry-After across all
+    users, coalescing of identical in-flight GETs and per-endpoint metrics.
+    Pass it as requests_session to spotipy.Spotify and SpotifyOAuth.
+    """
+
+    def __init__(
+        self,
+        rate=10.0,
+        burst=20,
+        maxRetries=3,
+        backoffFactor=0.3,
+        poolSize=32,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        super().__init__()
+        # Retries are scheduled here so Retry-After applies to every caller, not just one
+        adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize, max_retries=0)
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+        self.bucket = TokenBucket(rate, burst, clock, sleep)
+        self.maxRetries = maxRetries
+        self.backoffFactor = backoffFactor
+        self.clock = clock
+        self.sleep = sleep
+
+        self.inFlight = {}
+        self.inFlightLock = threading.Lock()
+        self.metrics = {}
+        self.metricsLock = threading.Lock()
+
+    def close(self):
+        # spotipy closes its session when a client is garbage collected; the pool
+        # outlives any one client, so only shutdown() really closes it
+        pass
+
+    def shutdown(self):
+        super().close()
+
+    def request(self, method, url, **kwargs):
+        if method.upper() != "GET":
+            return self.scheduledRequest(method, url, **kwargs)
+
+        key = self.coalescingKey(url, kwargs)
+        with self.inFlightLock:
+            leader = self.inFlight.get(key)
+            if leader is None:
+                future = Future()
+                self.inFlight[key] = future
+        if leader is not None:
+            self.record(endpointName(url), coalesced=1)
+            return leader.result()
+
+        try:
+            response = self.scheduledRequest(method, url, **kwargs)
+            future.set_result(response)
+            return response
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.inFlightLock:
+                del self.inFlight[key]
+
+    def scheduledRequest(self, method, url, **kwargs):
+        endpoint = endpointName(url)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        for attempt in range(self.maxRetries + 1):
+            waited = self.bucket.acquire()
+            start = self.clock()
+            try:
+                with instrumentation.span("spotify", endpoint=endpoint):
+                    response = super().request(method, url, **kwargs)
+            except requests.exceptions.ConnectionError:
+                self.record(endpoint, queueWait=waited, latency=self.clock() - start, errors=1)
+                if attempt == self.maxRetries or not idempotent:
+                    raise
+                self.sleep(self.backoffFactor * (2**attempt))
+                self.record(endpoint, retries=1)
+                continue
+
+            self.record(endpoint, queueWait=waited, latency=self.clock() - start, requests=1)
+            if response.status_code not in RETRY_STATUSES or attempt == self.maxRetries:
+                return response
+            if response.status_code != 429 and not idempotent:
+                return response
+
+            self.record(endpoint, retries=1)
+            if response.status_code == 429:
+                self.record(endpoint, rateLimited=1)
+                self.bucket.holdOff(retryAfterSeconds(response, self.backoffFactor * (2**attempt)))
+            else:
+                self.sleep(self.backoffFactor * (2**attempt))
+
+        return response
+
+    @staticmethod
+    def coalescingKey(url, kwargs):
+        headers = kwargs.get("headers") or {}
+        return (
+            url,
+            json.dumps(kwargs.get("params"), sort_keys=True, default=str),
+            # Same call for different users must not share a response
+            headers.get("Authorization"),
+        )
+
+    def record(self, endpoint, queueWait=0.0, latency=0.0, **counts):
+        with self.metricsLock:
+            stats = self.metrics.setdefault(
+                endpoint,
+                {
+                    "requests": 0,
+                    "retries": 0,
+                    "rateLimited": 0,
+                    "coalesced": 0,
+                    "errors": 0,
+                    "queueWaitSeconds": 0.0,
+                    "latencySeconds": 0.0,
+                    "maxLatencySeconds": 0.0,
+                },
+            )
+            for name, value in counts.items():
+                stats[name] += value
+            stats["queueWaitSeconds"] += queueWait
+            stats["latencySeconds"] += latency
+            stats["maxLatencySeconds"] = max(stats["maxLatencySeconds"], latency)
+
+    def stats(self):
+        with self.metricsLock:
+            return {endpoint: dict(stats) for endpoint, stats in self.metrics.items()}
+
+
+def endpointName(url):
+    path = requests.utils.urlparse(url).path
+    return SPOTIFY_ID.sub("/{id}", path)
+
+
+def retryAfterSeconds(response, default):
+    try:
+        return float(response.headers.get("Retry-After", default))
+    except ValueError:
+        return default
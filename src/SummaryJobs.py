@@ -0,0 +1,149 @@
+import hashlib
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from Instrumentation import instrumentation
+
+
+class OpenAIChatClient:
+    def __init__(self, model="gpt-3.5-turbo"):
+        self.model = model
+
+    def complete(self, messages):
+        import openai
+
+        with instrumentation.span("openai", model=self.model):
+            response = openai.ChatCompletion.create(model=self.model, messages=messages)
+        return response["choices"][0]["message"]["content"]
+
+
+class StubLLMClient:
+    """
+    Stand-in LLM for tests and local runs without an OpenAI key.
+    """
+
+    def __init__(self, response="Test"):
+        self.response = response
+        self.calls = []
+
+    def complete(self, messages):
+        self.calls.append(messages)
+        return self.response
+
+
+def fingerprintTracks(trackIds, geneCounts, tokenBudget=None):
+    """
+    Hash of the track IDs plus gene counts, so unchanged listening yields the same key.
+    :param tokenBudget: prompt token budget, as a different budget builds a different prompt
+    """
+    payload = json.dumps(
+        {
+            "tracks": sorted(trackIds),
+            "genes": sorted(geneCounts.items()),
+            "tokenBudget": tokenBudget,
+        }
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SummaryJobs:
+    """
+    Background GPT summary generation. submit() returns a job ID at once; concurrent
+    requests for the same user share one job, and finished summaries are cached under
+    the tracks fingerprint so repeat visits never reach the LLM.
+    """
+
+    def __init__(self, llmClient, maxWorkers=2, maxCached=1024, maxJobs=4096):
+        self.llmClient = llmClient
+        self.executor = ThreadPoolExecutor(max_workers=maxWorkers)
+        self.maxCached = maxCached
+        self.maxJobs = maxJobs
+
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()
+        self.summaries = OrderedDict()
+        self.activeJobByUser = {}
+
+        self.cacheHits = 0
+        self.llmCalls = 0
+
+    def submit(self, userId, fingerprint, messages):
+        with self.lock:
+            activeJobId = self.activeJobByUser.get(userId)
+            if activeJobId is not None:
+                activeJob = self.jobs.get(activeJobId)
+                if activeJob and activeJob["fingerprint"] == fingerprint:
+                    return activeJobId
+
+            jobId = uuid.uuid4().hex
+            job = {
+                "id": jobId,
+                "userId": userId,
+                "fingerprint": fingerprint,
+                "summary": None,
+                "error": None,
+            }
+
+            if fingerprint in self.summaries:
+                self.summaries.move_to_end(fingerprint)
+                job["status"] = "done"
+                job["summary"] = self.summaries[fingerprint]
+                self.cacheHits += 1
+                self._addJob(job)
+                return jobId
+
+            job["status"] = "pending"
+            self._addJob(job)
+            self.activeJobByUser[userId] = jobId
+
+        self.executor.submit(self._run, userId, job, messages)
+        return jobId
+
+    def getJob(self, jobId):
+        with self.lock:
+            job = self.jobs.get(jobId)
+            return dict(job) if job else None
+
+    def stats(self):
+        with self.lock:
+            return {
+                "cacheHits": self.cacheHits,
+                "llmCalls": self.llmCalls,
+                "cachedSummaries": len(self.summaries),
+                "pendingJobs": sum(
+                    job["status"] in ("pending", "running") for job in self.jobs.values()
+                ),
+            }
+
+    def _run(self, userId, job, messages):
+        with self.lock:
+            job["status"] = "running"
+            self.llmCalls += 1
+
+        try:
+            summary = self.llmClient.complete(messages)
+        except Exception as e:
+            print(f"Error generating summary: {e}")
+            instrumentation.recordError("SummaryJobs.run", e)
+            with self.lock:
+                job["status"] = "error"
+                job["error"] = str(e)
+        else:
+            with self.lock:
+                job["status"] = "done"
+                job["summary"] = summary
+                self.summaries[job["fingerprint"]] = summary
+                while len(self.summaries) > self.maxCached:
+                    self.summaries.popitem(last=False)
+        finally:
+            with self.lock:
+                if self.activeJobByUser.get(userId) == job["id"]:
+                    del self.activeJobByUser[userId]
+
+    def _addJob(self, job):
+        self.jobs[job["id"]] = job
+        while len(self.jobs) > self.maxJobs:
+            self.jobs.popitem(last=False)
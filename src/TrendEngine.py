@@ -0,0 +1,176 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from genes import GENE_CATEGORIES
+
+TREND_FEATURES = ["valence", "tempo", "energy"]
+
+PERIODS = {"day": "D", "week": "W", "month": "M"}
+
+# Rolling windows /trends offers, in periods; a fixed set keeps the answer cache small
+WINDOWS = (2, 4, 8, 12, 26, 52)
+
+
+def aggregateDaily(plays):
+    """
+    Additive daily rollup of a getPlays frame: play counts per gene plus feature
+    sums, indexed by UTC day. Weeks and months are sums of these rows.
+    """
+    days = pd.to_datetime(plays["played_at_ms"], unit="ms").dt.floor("D")
+    counts = pd.crosstab(days, plays["gene"]).reindex(columns=GENE_CATEGORIES, fill_value=0)
+    sums = plays[TREND_FEATURES].groupby(days).sum()
+    daily = pd.concat([counts, sums], axis=1)
+    daily["plays"] = counts.sum(axis=1)
+    daily.index.name = "day"
+    return daily
+
+
+def changePoints(series, window, threshold):
+    """
+    Periods whose value sits more than threshold standard deviations from the
+    mean of the preceding window periods, computed for every column at once.
+    :param series: DataFrame of one column per series, one row per period
+    """
+    previous = series.shift(1).rolling(window, min_periods=2)
+    expected = previous.mean()
+    spread = previous.std().replace(0, np.nan)
+    zScores = (series - expected) / spread
+
+    flagged = zScores.abs().stack()
+    flagged = flagged[flagged >= threshold]
+    return [
+        {
+            "period": period.strftime("%Y-%m-%d"),
+            "series": name,
+            "value": float(series.at[period, name]),
+            "expected": float(expected.at[period, name]),
+            "zScore": float(zScores.at[period, name]),
+        }
+        for period, name in flagged.index
+    ]
+
+
+def toList(values):
+    return [None if pd.isna(value) else float(value) for value in values]
+
+
+class TrendEngine:
+    """
+    Gene share and feature trends over a user's whole listening history. A daily
+    rollup is kept per user and only the days since its last row are re-aggregated
+    when the history store's cursor moves; each (period, window) answer is cached
+    until then, so /trends is a cursor lookup plus, at worst, a small rollup.
+    """
+
+    def __init__(self, historyStore, changeThreshold=2.5, maxAnswers=1024):
+        """
+        :param maxAnswers: least recently used (user, period, window) answers are
+            dropped beyond this size
+        """
+        self.historyStore = historyStore
+        self.changeThreshold = changeThreshold
+        self.maxAnswers = maxAnswers
+
+        self.rollups = {}
+        self.answers = OrderedDict()
+        self.lock = threading.Lock()
+
+    def getDailyRollup(self, userId):
+        cursor = self.historyStore.latestCursor(userId)
+        with self.lock:
+            rollup = self.rollups.get(userId)
+        if rollup is not None and rollup["cursor"] == cursor:
+            return rollup
+
+        if rollup is None or rollup["daily"].empty:
+            daily = aggregateDaily(self.historyStore.getPlays(userId))
+        else:
+            # The newest day may be partial, so it is rebuilt together with anything newer
+            lastDay = rollup["daily"].index[-1]
+            sinceMs = int(lastDay.value // 1_000_000)
+            tail = aggregateDaily(self.historyStore.getPlays(userId, sinceMs))
+            daily = pd.concat([rollup["daily"][rollup["daily"].index < lastDay], tail])
+
+        rollup = {"cursor": cursor, "daily": daily}
+        with self.lock:
+            self.rollups[userId] = rollup
+            for key in [k for k in self.answers if k[0] == userId]:
+                del self.answers[key]
+        return rollup
+
+    def getTrends(self, userId, period="week", window=4):
+        """
+        :param period: "day", "week" or "month"
+        :param window: periods averaged for the rolling feature means and change-point
+            baseline, one of WINDOWS
+        :return: JSON-ready dict of period starts, gene shares, feature means and change points
+        """
+        if window not in WINDOWS:
+            raise ValueError(f"Unsupported trend window {window}")
+
+        rollup = self.getDailyRollup(userId)
+        key = (userId, period, window)
+        with self.lock:
+            answer = self.answers.get(key)
+            if answer is not None:
+                self.answers.move_to_end(key)
+        if answer is not None and answer["cursor"] == rollup["cursor"]:
+            return answer["trends"]
+
+        trends = self.computeTrends(rollup["daily"], period, window)
+        with self.lock:
+            self.answers[key] = {"cursor": rollup["cursor"], "trends": trends}
+            self.answers.move_to_end(key)
+            while len(self.answers) > self.maxAnswers:
+                self.answers.popitem(last=False)
+        return trends
+
+    def computeTrends(self, daily, period, window):
+        if daily.empty:
+            return {
+                "period": period,
+                "periods": [],
+                "plays": [],
+                "geneShare": {},
+                "features": {},
+                "changePoints": [],
+            }
+
+        freq = PERIODS[period]
+        periods = daily.index.to_period(freq)
+        totals = daily.groupby(periods).sum()
+        # Periods without plays stay in the series as gaps rather than vanishing
+        totals = totals.reindex(pd.period_range(periods.min(), periods.max(), freq=freq), fill_value=0)
+        totals.index = totals.index.start_time
+
+        plays = totals["plays"].replace(0, np.nan)
+        geneShare = totals[GENE_CATEGORIES].div(plays, axis=0)
+        geneShare = geneShare.loc[:, totals[GENE_CATEGORIES].sum() > 0]
+
+        means = totals[TREND_FEATURES].div(plays, axis=0)
+        # Weighted by plays, so a quiet week does not count as much as a busy one
+        rollingSums = totals[TREND_FEATURES + ["plays"]].rolling(window, min_periods=1).sum()
+        rolling = rollingSums[TREND_FEATURES].div(rollingSums["plays"].replace(0, np.nan), axis=0)
+
+        return {
+            "period": period,
+            "periods": [start.strftime("%Y-%m-%d") for start in totals.index],
+            "plays": totals["plays"].astype(int).tolist(),
+            "geneShare": {gene: toList(geneShare[gene]) for gene in geneShare},
+            "features": {
+                name: {"mean": toList(means[name]), "rolling": toList(rolling[name])}
+                for name in TREND_FEATURES
+            },
+            "changePoints": changePoints(
+                pd.concat([geneShare, means], axis=1), window, self.changeThreshold
+            ),
+        }
+
+    def invalidate(self, userId):
+        with self.lock:
+            self.rollups.pop(userId, None)
+            for key in [k for k in self.answers if k[0] == userId]:
+                del self.answers[key]
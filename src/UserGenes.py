@@ -1,47 +1,209 @@
-import os
-import spotipy
-from spotipy.oauth2 import SpotifyOAuth
 from dotenv import load_dotenv
+import numpy as np
 import pandas as pd
-import pymongo
-from datetime import datetime, timedelta
+
+from batching import (
+    ARTISTS_BATCH_SIZE,
+    AUDIO_FEATURES_BATCH_SIZE,
+    DEFAULT_MAX_WORKERS,
+    SAVED_CONTAINS_BATCH_SIZE,
+    TRACKS_BATCH_SIZE,
+    fetchInChunks,
+)
+from EnrichmentGraph import EnrichmentGraph
+from genes import (
+    ANALYSIS_GENE_FEATURES,
+    GENE_MODEL,
+    analysisAdjustment,
+    calculateGenes,
+    hasAnalysisFeatures,
+)
+from GeneIndex import GeneIndex
+from Instrumentation import instrumentation
+from LibraryIngest import LibraryIngest
+from Recommender import Recommender
+from trackSchema import ArtistTable, compactAudioFeatures, createCompactTrackFrame
 
 load_dotenv()
 
+LOCAL_SCOPE = "user-library-read user-top-read user-read-recently-played"
+LOCAL_REDIRECT_URI = "http://localhost:5000/callback/"
+
+
+def artistIdsOf(trackInfo):
+    return list(set(artist["id"] for track in trackInfo for artist in track["artists"]))
 
+
+@instrumentation.instrumentMethods
 class UserGenes:
     def __init__(
         self,
-        sp=spotipy.Spotify(
-            auth_manager=SpotifyOAuth(
-                scope="user-library-read user-top-read user-read-recently-played",
-                redirect_uri="http://localhost:5000/callback/",
-            )
-        ),
+        sp=None,
+        entityCache=None,
+        maxWorkers=DEFAULT_MAX_WORKERS,
+        historyStore=None,
+        userId=None,
+        similarityIndex=None,
+        analysisStore=None,
     ):
-        self.sp = sp
+        """
+        :param sp: spotipy client; scripts may leave it out to get one using the local
+            OAuth flow, created on first use so importing this module stays cheap
+        :param analysisStore: AnalysisStore whose summaries refine the genes of the
+            tracks it holds
+        """
+        self._sp = sp
+        self._authManager = None
+        self.entityCache = entityCache
+        self.maxWorkers = maxWorkers
+        self.historyStore = historyStore
+        self.userId = userId
+        self.similarityIndex = similarityIndex
+        self.analysisStore = analysisStore
         # self.mongoClient = pymongo.MongoClient(os.environ.get("MONGO_URI"))
         # self.mongoDB = self.mongoClient["SpotifyGenetics"]
         # self.recentTracksCollection = self.mongoDB["recentTracks"]
-        self.authManager = SpotifyOAuth(
-            scope="user-library-read user-top-read user-read-recently-played",
-            redirect_uri="http://localhost:5000/callback/",
-        )
         self.recentTracksDF = None
+        self.libraryDF = None
+        self.libraryIndex = None
+        self.latestPlayedAt = None
+        self.recentPlays = []
+        self.enrichmentReport = None
         self.topTracksDF = None
         self.topTrackIDs = []
 
         self.audioFeaturesDF = None
         self.readableGenes = None
 
+        self.artists = ArtistTable()
+        self.geneIndex = None
+        self.selectedDF = None
+        self.selectedIndex = None
+
+    @property
+    def sp(self):
+        if self._sp is None:
+            import spotipy
+
+            self._sp = spotipy.Spotify(auth_manager=self.authManager)
+        return self._sp
+
+    @sp.setter
+    def sp(self, sp):
+        self._sp = sp
+
+    @property
+    def authManager(self):
+        if self._authManager is None:
+            from spotipy.oauth2 import SpotifyOAuth
+
+            self._authManager = SpotifyOAuth(
+                scope=LOCAL_SCOPE, redirect_uri=LOCAL_REDIRECT_URI
+            )
+        return self._authManager
+
     def isAuthenticated(self):
         token_info = self.authManager.get_cached_token()
         return self.authManager.validate_token(token_info)
 
     # Track information retrieval
     def initTracksDF(self):
-        self.recentTracksDF = self.getRecentlyPlayed()
-        self.recentTracksDF = self.addColumnsToDF(self.recentTracksDF)
+        for _ in self.iterInitTracksDF():
+            pass
+
+    def iterInitTracksDF(self):
+        """
+        Build recentTracksDF one stage at a time, yielding each stage's name as soon
+        as its columns are in place: "tracks", then "genes", then "library". The
+        Spotify lookups run as an EnrichmentGraph, so saved-track flags and audio
+        features are fetched while the track and artist lookups are still going.
+        """
+        graph = self.recentTracksGraph().start()
+        try:
+            self.recentTracksDF = graph.result("trackFrame")
+            yield "tracks"
+
+            self.recentTracksDF = graph.result("genes")
+            self.geneIndex = GeneIndex(self.recentTracksDF)
+            yield "genes"
+
+            self.recentTracksDF["inLibrary"] = self.recentTracksDF["id"].map(
+                graph.result("saved")
+            )
+            # The selection is a copy, so rebuild it to pick up the library flags
+            self.selectedDF = None
+            if self.historyStore is not None:
+                self.recordHistory()
+            self.enrichmentReport = graph.report()
+            yield "library"
+        finally:
+            graph.shutdown()
+
+    def recentTracksGraph(self):
+        """
+        recent plays -> tracks -> artists -> trackFrame -> genes, with audioFeatures
+        and saved depending only on the played track IDs.
+        """
+        graph = EnrichmentGraph()
+        graph.add("recent", lambda: list(dict.fromkeys(self.fetchRecentPlays())))
+        graph.add("tracks", self.fetchTracksById, ["recent"])
+        graph.add(
+            "artists",
+            lambda tracks: [
+                a for a in self.fetchArtists(artistIdsOf(tracks.values())) if a is not None
+            ],
+            ["tracks"],
+        )
+        graph.add(
+            "trackFrame",
+            lambda tracks, artistInfo: self.createTrackFrame(
+                [tracks[trackId] for trackId, _ in self.recentPlays if trackId in tracks],
+                artistInfo,
+            ),
+            ["tracks", "artists"],
+        )
+        graph.add("audioFeatures", self.fetchAudioFeatures, ["recent"])
+        graph.add(
+            "saved",
+            lambda trackIds: dict(zip(trackIds, self.isInLibrary(trackIds))),
+            ["recent"],
+        )
+        graph.add("genes", self.mergeAudioFeatures, ["trackFrame", "audioFeatures"])
+        return graph
+
+    def initLibraryDF(self, sources=("saved", "top", "recent")):
+        self.libraryIndex = None
+        for chunk in LibraryIngest(self).iterLibrary(sources):
+            if chunk.empty:
+                continue
+            if self.libraryIndex is None:
+                self.libraryIndex = GeneIndex(chunk)
+            else:
+                self.libraryIndex.append(chunk)
+
+        self.libraryDF = (
+            self.libraryIndex.df if self.libraryIndex is not None else pd.DataFrame()
+        )
+
+    def getSelectedDF(self):
+        """
+        recentTracksDF with repeat plays of a track dropped, indexed by gene.
+        """
+        if self.selectedDF is None:
+            self.selectedDF = self.recentTracksDF.drop_duplicates(
+                subset=["trackName", "artistIDs"]
+            )
+            self.selectedIndex = GeneIndex(self.selectedDF)
+        return self.selectedDF
+
+    def getGeneIndexFor(self, df):
+        if df is self.selectedDF:
+            return self.selectedIndex
+        if df is self.recentTracksDF and self.geneIndex is not None:
+            return self.geneIndex
+        if df is self.libraryDF and self.libraryIndex is not None:
+            return self.libraryIndex
+        return GeneIndex(df)
 
     def addColumnsToDF(self, df):
         df["inLibrary"] = self.isInLibrary(df["id"])
@@ -56,91 +218,229 @@ class UserGenes:
         return self.createTrackInfoDataFrame(topTrackIDs)
 
     def getRecentlyPlayed(self, limit=50):
-        recentTracks = self.sp.current_user_recently_played(limit=limit)
-        trackIds = [item["track"]["id"] for item in recentTracks["items"]]
+        return self.createTrackInfoDataFrame(self.fetchRecentPlays(limit))
 
-        return self.createTrackInfoDataFrame(trackIds)
+    def fetchRecentPlays(self, limit=50):
+        """
+        Record the latest plays and their cursor. With a history store, only the plays
+        newer than its cursor are fetched and the rest are read back from the store.
+        :return: the played track IDs, most recent first, with repeats
+        """
+        if self.historyStore is not None:
+            self.syncHistory(scoreTracks=False)
+            self.recentPlays = list(self.historyStore.recentPlays(self.userId, limit))
+        else:
+            recentTracks = self.sp.current_user_recently_played(limit=limit)
+            self.recentPlays = [
+                (item["track"]["id"], item["played_at"]) for item in recentTracks["items"]
+            ]
+        if self.recentPlays:
+            self.latestPlayedAt = self.recentPlays[0][1]
+        return [trackId for trackId, _ in self.recentPlays]
+
+    # Listening history
+    def recordHistory(self):
+        # syncHistory stored the plays; their genes were just calculated, so scoring
+        # the tracks the store has not seen needs no extra Spotify calls
+        known = self.historyStore.knownTrackIds(self.recentTracksDF["id"])
+        newTracks = self.recentTracksDF[~self.recentTracksDF["id"].isin(known)]
+        if not newTracks.empty:
+            self.historyStore.recordTrackGenes(newTracks)
+
+    def syncHistory(self, scoreTracks=True):
+        """
+        Fetch only the plays newer than the stored cursor and score only tracks the
+        store has never seen.
+        :param scoreTracks: False leaves scoring to recordHistory, for profile builds
+            that fetch the new tracks' features anyway
+        :return: the number of new plays recorded
+        """
+        cursor = self.historyStore.latestCursor(self.userId)
+        recentTracks = self.sp.current_user_recently_played(limit=50, after=cursor)
+        plays = [
+            (item["track"]["id"], item["played_at"]) for item in recentTracks["items"]
+        ]
+        if not plays:
+            return 0
+
+        if scoreTracks:
+            known = self.historyStore.knownTrackIds(trackId for trackId, _ in plays)
+            newIds = list(dict.fromkeys(t for t, _ in plays if t not in known))
+            featuresDF = pd.DataFrame(
+                [f for f in self.fetchAudioFeatures(newIds) if f is not None]
+            )
+            if not featuresDF.empty:
+                self.addGeneColumn(featuresDF)
+                self.historyStore.recordTrackGenes(featuresDF)
+
+        return self.historyStore.recordPlays(self.userId, plays)
+
+    def getHistoryGeneData(self, sinceMs=None):
+        return self.historyStore.geneCounts(self.userId, sinceMs)
+
+    # Cached entity lookups
+    def fetchEntities(self, entityType, ids, fetch):
+        if self.entityCache is None:
+            return fetch(ids)
+        return self.entityCache.getMany(entityType, ids, fetch)
+
+    def fetchTracks(self, trackIds):
+        return self.fetchEntities(
+            "track",
+            list(trackIds),
+            lambda ids: fetchInChunks(
+                lambda chunk: self.sp.tracks(chunk)["tracks"],
+                ids,
+                TRACKS_BATCH_SIZE,
+                self.maxWorkers,
+            ),
+        )
 
-    def createTrackInfoDataFrame(self, trackIds) -> pd.DataFrame:
-        trackInfo = self.sp.tracks(trackIds)["tracks"]
-        artistIds = list(
-            set([artist["id"] for track in trackInfo for artist in track["artists"]])
+    def fetchArtists(self, artistIds):
+        return self.fetchEntities(
+            "artist",
+            list(artistIds),
+            lambda ids: fetchInChunks(
+                lambda chunk: self.sp.artists(chunk)["artists"],
+                ids,
+                ARTISTS_BATCH_SIZE,
+                self.maxWorkers,
+            ),
         )
 
-        # Get the artist information using their IDs
-        artistInfo = self.sp.artists(artistIds)["artists"]
-        artistInfoDict = {
-            artist["id"]: {
-                "popularity": artist["popularity"],
-                "genres": artist["genres"],
-            }
-            for artist in artistInfo
+    def fetchAudioFeatures(self, trackIds):
+        return self.fetchEntities(
+            "audio_features",
+            list(trackIds),
+            lambda ids: fetchInChunks(
+                self.sp.audio_features, ids, AUDIO_FEATURES_BATCH_SIZE, self.maxWorkers
+            ),
+        )
+
+    def fetchTracksById(self, trackIds):
+        # Unavailable or relinked-away tracks come back as None
+        return {
+            trackId: track
+            for trackId, track in zip(trackIds, self.fetchTracks(trackIds))
+            if track is not None
         }
 
-        data = []
+    def createTrackInfoDataFrame(self, trackIds) -> pd.DataFrame:
+        trackInfo = [track for track in self.fetchTracks(trackIds) if track is not None]
 
-        for track in trackInfo:
-            artist_names = [artist["name"] for artist in track["artists"]]
-            artist_links = [
-                artist["external_urls"]["spotify"] for artist in track["artists"]
-            ]
+        # Get the artist information using their IDs
+        artistInfo = [a for a in self.fetchArtists(artistIdsOf(trackInfo)) if a is not None]
+        return self.createTrackFrame(trackInfo, artistInfo)
 
-            trackData = {
-                "id": track["id"],
-                "trackName": track["name"],
-                "trackPopularity": f'{track["popularity"]} (0-100)',
-                "trackDurationMs": f'{track["duration_ms"]} ms',
-                "trackExplicit": track["explicit"],
-                "albumName": track["album"]["name"],
-                "albumType": track["album"]["album_type"],
-                "albumReleaseDate": track["album"]["release_date"],
-                "artistNames": artist_names,
-                "artistLinks": artist_links,
-                "artistID": track["artists"][0]["id"],
-                "artistGenres": artistInfoDict[track["artists"][0]["id"]]["genres"],
-                "artistPopularity": f'{artistInfoDict[track["artists"][0]["id"]]["popularity"]} (0-100)',
-                "spotifyURL": track["external_urls"]["spotify"],
-                "albumCoverURL": track["album"]["images"][0]["url"],
-            }
-            data.append(trackData)
+    def createTrackFrame(self, trackInfo, artistInfo):
+        self.artists.add(trackInfo, artistInfo)
+        return createCompactTrackFrame(trackInfo)
 
-        df = pd.DataFrame(data)
-        return df
+    def withPresentationColumns(self, df):
+        return self.artists.withArtistColumns(df)
+
+    def memoryReport(self):
+        frames = {
+            "recentTracksDF": self.recentTracksDF,
+            "selectedDF": self.selectedDF,
+            "libraryDF": self.libraryDF,
+        }
+        report = {
+            name: int(df.memory_usage(deep=True).sum())
+            for name, df in frames.items()
+            if df is not None
+        }
+        report["artistTables"] = self.artists.memoryUsage()
+        report["total"] = sum(report.values())
+        return report
 
     def isInLibrary(self, track_ids):
-        results = self.sp.current_user_saved_tracks_contains(tracks=track_ids)
+        results = fetchInChunks(
+            lambda chunk: self.sp.current_user_saved_tracks_contains(tracks=chunk),
+            track_ids,
+            SAVED_CONTAINS_BATCH_SIZE,
+            self.maxWorkers,
+        )
         return results
 
     # Audio features
-    def mergeAudioFeatures(self, df):
-        audioFeatures = self.sp.audio_features(df["id"])
-        self.audioFeaturesDF = pd.DataFrame(audioFeatures)
+    def mergeAudioFeatures(self, df, audioFeatures=None):
+        """
+        :param audioFeatures: already fetched features of df's tracks, else fetched here
+        """
+        if audioFeatures is None:
+            # Look up each track once so repeated plays don't multiply rows in the merge
+            audioFeatures = self.fetchAudioFeatures(df["id"].unique())
+        self.audioFeaturesDF = compactAudioFeatures(
+            pd.DataFrame([features for features in audioFeatures if features is not None])
+        )
         df = pd.merge(df, self.audioFeaturesDF, on="id")
+        df = self.mergeAnalysisFeatures(df)
 
         self.addGeneColumn(df)
+        if self.similarityIndex is not None:
+            self.similarityIndex.add(df)
         return df
 
+    def mergeAnalysisFeatures(self, df):
+        # Only summaries already stored are used; ingestAnalysis does the downloading
+        if self.analysisStore is None or not len(self.analysisStore):
+            return df
+        summaries = self.analysisStore.frame(df["id"], list(ANALYSIS_GENE_FEATURES))
+        return df.drop(columns=list(ANALYSIS_GENE_FEATURES), errors="ignore").join(
+            summaries, on="id"
+        )
+
+    def ingestAnalysis(self):
+        """
+        Store audio-analysis summaries of the recent tracks that lack one, then
+        re-score recentTracksDF with them and pass the new genes on to the history
+        store and similarity index. One request per new track, so this is meant for
+        background work such as the profile warmer.
+        :return: number of tracks added to the store
+        """
+        missing = self.analysisStore.missing(self.recentTracksDF["id"])
+        added = self.analysisStore.ingest(missing, self.sp.audio_analysis, self.maxWorkers)
+        if added:
+            self.recentTracksDF = self.mergeAnalysisFeatures(self.recentTracksDF)
+            self.addGeneColumn(self.recentTracksDF)
+            self.geneIndex = GeneIndex(self.recentTracksDF)
+            self.selectedDF = None
+
+            rescored = self.recentTracksDF[
+                self.recentTracksDF["id"].isin(
+                    [trackId for trackId in missing if trackId in self.analysisStore]
+                )
+            ]
+            if self.historyStore is not None:
+                self.historyStore.recordTrackGenes(rescored)
+            if self.similarityIndex is not None:
+                self.similarityIndex.updateGenes(rescored)
+        return added
+
     # Gene calculation and analysis
     def calculateGene(self, row):
+        # Weights and cut-offs come from GENE_MODEL, applied in the same order as
+        # calculateGeneCodes so both give identical genes
+        model = GENE_MODEL
+
         # Calculate the mood score using valence and mode
-        valence_weight = 0.8
-        mode_weight = 0.2
-        mood_score = valence_weight * row["valence"] + mode_weight * row["mode"]
-        moodGene = "H" if mood_score > 0.5 else "S"
+        mood_score = model["valenceWeight"] * row["valence"] + model["modeWeight"] * row["mode"]
+        moodGene = "H" if mood_score > model["moodThreshold"] else "S"
 
-        paceGene = "F" if row["tempo"] > 100 else "L"
+        paceGene = "F" if row["tempo"] > model["tempoThreshold"] else "L"
 
         # Calculate the complexity score using the selected features
         complexity_score = (
-            -0.15 * row["instrumentalness"]
-            + 0.25 * row["speechiness"]
-            - 0.15 * row["acousticness"]
-            + 0.2 * row["energy"]
-            + 0.1 * row["danceability"]
-            + 0.15
+            model["instrumentalnessWeight"] * row["instrumentalness"]
+            + model["speechinessWeight"] * row["speechiness"]
+            + model["acousticnessWeight"] * row["acousticness"]
+            + model["energyWeight"] * row["energy"]
+            + model["danceabilityWeight"] * row["danceability"]
+            + model["tempoWeight"]
             * row["tempo"]
             / 200  # normalize tempo to [0, 1] by dividing by an approximate maximum value
-            + 0.2
+            + model["timeSignatureWeight"]
             * (
                 1 if row["time_signature"] != 4 else 0
             )  # assign complexity based on time_signature
@@ -148,11 +448,15 @@ class UserGenes:
 
         # Normalize the complexity score between 0 and 1
         complexity_score = (complexity_score + 1) / 2
+        if hasAnalysisFeatures(row):
+            adjustment = analysisAdjustment(row)
+            if not np.isnan(adjustment):
+                complexity_score = complexity_score + adjustment
 
         # Adjust the threshold to classify tracks as dense
-        textureGene = "D" if complexity_score > 0.55 else "M"
+        textureGene = "D" if complexity_score > model["complexityThreshold"] else "M"
 
-        vocalsGene = "V" if row["instrumentalness"] < 0.5 else "I"
+        vocalsGene = "V" if row["instrumentalness"] < model["instrumentalThreshold"] else "I"
 
         return f"{moodGene}{paceGene}{textureGene}{vocalsGene}"
 
@@ -167,11 +471,7 @@ class UserGenes:
         return self.calculateGene(avgDF)
 
     def getGeneCounts(self):
-        return (
-            self.df["gene"]
-            .value_counts()
-            .apply(lambda x: x / self.df["gene"].count() * 100)
-        )
+        return pd.Series(self.geneIndex.percentages()).sort_values(ascending=False)
 
     def displayGeneCounts(self):
         geneCounts = self.getGeneCounts()
@@ -179,114 +479,70 @@ class UserGenes:
             print(f"{gene}: {count:.2f}%")
 
     def getGeneExamples(self, trait):
-        traitToColumn = {
-            "energy": "energy",
-            "mood": "valence",
-            "tempo": "tempo",
-            "instrumentation": "instrumentalness",
-        }
-
-        columnName = traitToColumn[trait]
+        def withArtistName(examples, label):
+            examples = examples[["trackName", "artistID"]].copy()
+            examples["artistName"] = [
+                self.artists.getName(artistId) for artistId in examples["artistID"]
+            ]
+            examples["Label"] = label
+            return examples[["trackName", "artistName", "Label"]]
 
         # Get top 3 examples
-        topExamples = self.df.nlargest(3, columnName)[["name", "artists"]]
-        topExamples["artists"] = topExamples["artists"].apply(lambda x: x[0])
-        topExamples["Label"] = "Top"
+        topExamples = withArtistName(self.geneIndex.largest(trait, 3), "Top")
 
         # Get 1 contrary example
-        contraryExample = self.df.nsmallest(1, columnName)[["name", "artists"]]
-        contraryExample["artists"] = contraryExample["artists"].apply(lambda x: x[0])
-        contraryExample["Label"] = "Contrary"
+        contraryExample = withArtistName(self.geneIndex.smallest(trait, 1), "Contrary")
 
         # Combine examples into a single dataframe and return
         examplesDf = pd.concat([topExamples, contraryExample])
         return examplesDf
 
-    def getExamplesByGene(self, gene):
-        return self.df[self.df["gene"] == gene]
+    def getExamplesByGene(self, gene, df=None):
+        if df is None:
+            df = self.recentTracksDF
+        return self.getGeneIndexFor(df).rows(gene)
 
     def getGeneDataFromDF(self, df):
-        data = []
-        for gene in df["gene"].unique():
-            data.append(
-                {
-                    "genre": gene,
-                    "count": int(df[df["gene"] == gene]["gene"].count()),
-                }
-            )
-        return data
+        return self.getGeneIndexFor(df).geneData()
 
     def getRecommendationsByGene(self, df, seed_genre=None, limit=20):
         """
         Get music recommendations based on the user's genes and other seed criteria.
         :param seed_genre: a gene to use as seed criteria
         :param limit: the maximum number of recommendations to return
-        :return: a list of recommended tracks, each represented as a dictionary with metadata
+        :return: a DataFrame of recommended tracks not already in the user's history
         """
         if seed_genre is None:
             raise ValueError("A seed genre must be provided.")
 
         self.readableGenes = df[df["gene"] == seed_genre]
 
-        if self.readableGenes.empty:
-            return []
-
-        seed_artists = (
-            self.readableGenes["artistID"]
-            .sample(n=min(2, len(self.readableGenes)))
-            .tolist()
-        )
-        seed_genre = (
-            pd.Series(
-                [
-                    genre
-                    for artistGenre in [
-                        self.sp.artist(artist_id)["genres"]
-                        for artist_id in seed_artists
-                    ]
-                    for genre in artistGenre
-                ]
-            )
-            .sample(n=min(1, len(seed_genre)))
-            .tolist()
-        )
-        seed_tracks = (
-            self.readableGenes["id"].sample(n=min(2, len(self.readableGenes))).tolist()
-        )
-
-        recommendations = self.sp.recommendations(
-            seed_artists=seed_artists,
-            seed_tracks=seed_tracks,
-            limit=limit,
-        )
-
-        recommendationsDF = self.createTrackInfoDataFrame(
-            list(pd.DataFrame(recommendations["tracks"])["id"])
-        )
-
-        recommendationsDF = self.addColumnsToDF(recommendationsDF)
+        return Recommender(self).recommend(df, [seed_genre], limit)[seed_genre]
 
-        return recommendationsDF
+    def getRecommendationsForAllGenes(self, df, limit=20):
+        return Recommender(self).recommend(df, limit=limit)
 
     def addGeneColumn(self, df):
-        df["gene"] = df.apply(self.calculateGene, axis=1)
+        df["gene"] = calculateGenes(df)
 
     def getRecentlyPlayedForCard(self, limit=50):
-        recentTracks = (
-            self.recentTracksDF[
-                [
-                    "trackName",
-                    "artistNames",
-                    "albumCoverURL",
-                    "spotifyURL",
-                    "gene",
-                    "inLibrary",
-                ]
-            ]
-            .drop_duplicates(subset=("trackName", "spotifyURL"))
-            .copy()
+        # gene and inLibrary are missing while the profile is still being built
+        recentTracks = self.withPresentationColumns(
+            self.recentTracksDF.drop_duplicates(subset=("trackName", "id"))
         )
-        recentTracksList = recentTracks.to_dict("records")
+        columns = [
+            column
+            for column in [
+                "trackName",
+                "artistNames",
+                "albumCoverURL",
+                "spotifyURL",
+                "gene",
+                "inLibrary",
+            ]
+            if column in recentTracks
+        ]
+        recentTracksList = recentTracks[columns].to_dict("records")
 
         return [
             {
@@ -294,14 +550,14 @@ class UserGenes:
                 "artist": ", ".join(track["artistNames"]),
                 "image_url": track["albumCoverURL"],
                 "url": track["spotifyURL"],
-                "gene": track["gene"],
-                "is_in_library": track["inLibrary"],
+                "gene": track.get("gene"),
+                "is_in_library": track.get("inLibrary"),
             }
             for track in recentTracksList
         ]
 
     def getTopTracksForCard(self, limit=50):
-        topTracks = self.topTracksDF[
+        topTracks = self.withPresentationColumns(self.topTracksDF)[
             ["trackName", "artistNames", "albumCoverURL", "spotifyURL", "inLibrary"]
         ]
 
@@ -1,50 +1,206 @@
+import atexit
+import hashlib
+import json
 import os
 import secrets
+import threading
+import time
 from dotenv import load_dotenv
 from flask import (
     Flask,
+    Response,
+    abort,
+    g,
     jsonify,
+    make_response,
     redirect,
     render_template,
     request,
     send_from_directory,
     session,
+    stream_with_context,
     url_for,
 )
 from flask_caching import Cache
 from spotipy.oauth2 import SpotifyOAuth
 
-from datetime import datetime
+from urllib.parse import urlencode
 import spotipy
-import openai
-import pandas as pd
 from functools import wraps
 
 from UserGenes import UserGenes
+from ProfileCache import ProfileCache
+from ProfileWarmer import ProfileWarmer
+from AlbumArt import (
+    AlbumArtCache,
+    DirectoryImageFetcher,
+    HTTPImageFetcher,
+    THUMBNAIL_SIZES,
+    imageId,
+    imageMimetype,
+)
+from AnalysisStore import AnalysisStore
+from CohortStats import CohortStats
+from EntityCache import EntityCache, RedisEntityBackend
+from GeneExplorer import GeneExplorer, countWeightSettings
+from HistoryStore import MongoHistoryStore, SQLiteHistoryStore
+from Instrumentation import instrumentation, serverTiming
+from SimilarityIndex import SimilarityIndex
+from SpotifyTransport import SpotifyTransport
+from SummaryJobs import OpenAIChatClient, StubLLMClient, SummaryJobs
+from TrendEngine import PERIODS, WINDOWS, TrendEngine
 from functions import (
     get_selected_dataframe,
-    get_prompt_for_gpt_music_summary,
-    get_gpt_summary_dataframe,
+    get_gpt_summary_messages,
+    get_summary_fingerprint,
     load_env_variables,
 )
 
 
+def get_spotify_client(token_info):
+    auth_manager_with_token = SpotifyOAuth(
+        client_id=os.environ.get("SPOTIFY_CLIENT_ID"),
+        client_secret=os.environ.get("SPOTIFY_CLIENT_SECRET"),
+        redirect_uri=os.environ.get("SPOTIFY_REDIRECT_URI"),
+        scope="user-read-private user-read-email user-library-modify user-library-read user-top-read user-read-recently-played",
+        requests_session=spotify_transport,
+    )
+    auth_manager_with_token.token_info = token_info
+
+    return spotipy.Spotify(
+        auth_manager=auth_manager_with_token, requests_session=spotify_transport
+    )
+
+
+def new_user_profile(sp, user_id=None):
+    return UserGenes(
+        sp,
+        entityCache=entity_cache,
+        historyStore=history_store,
+        userId=user_id,
+        similarityIndex=similarity_index,
+        analysisStore=analysis_store,
+    )
+
+
+def build_user(sp, user_id=None, ingest_analysis=False):
+    user = new_user_profile(sp, user_id)
+    user.initTracksDF()
+    if ingest_analysis:
+        user.ingestAnalysis()
+    profile_built(user_id, user)
+    return user
+
+
+def profile_built(user_id, user):
+    invalidate_user_responses(user_id)
+    # The build scored tracks whose plays were stored before their genes, and may
+    # have re-scored others from audio analysis, without moving the history cursor
+    trend_engine.invalidate(user_id)
+    if user_id is not None:
+        cohort_stats.ingestProfile(user_id, user)
+
+
+def refresh_token_info(token_info):
+    # Refreshes through the refresh token when the access token is about to expire
+    refreshed = auth_manager.validate_token(token_info)
+    if refreshed is None:
+        raise ValueError("Spotify token could not be refreshed")
+    return refreshed
+
+
+def get_warmer_client(token_info):
+    # The warmer refreshes tokens itself, so the client only needs the access token
+    return spotipy.Spotify(auth=token_info["access_token"], requests_session=spotify_transport)
+
+
+def warm_profile(user_id, token_info, key):
+    # Published under the key of the session that opted in, so its next visit hits
+    sp = get_warmer_client(token_info)
+    return profile_cache.refresh(
+        key, sp, lambda: build_user(sp, user_id, ingest_analysis=ANALYSIS_INGEST)
+    )
+
+
+def get_user_profile():
+    token_info = session["token_info"]
+    sp = get_spotify_client(token_info)
+
+    if "user_id" not in session:
+        session["user_id"] = sp.current_user()["id"]
+
+    key = profile_cache.makeKey(session["user_id"], token_info)
+    return profile_cache.getOrBuild(
+        key, sp, lambda: build_user(sp, session["user_id"])
+    )
+
+
+def response_cache_key(user):
+    user_id = session["user_id"]
+    generation = cache.get(f"response-generation:{user_id}") or 0
+    query = urlencode(sorted(request.args.items(multi=True)))
+    # The path carries the gene; latestPlayedAt moves whenever the profile is rebuilt from new plays
+    return f"response:{user_id}:{generation}:{user.latestPlayedAt}:{request.path}?{query}"
+
+
+def invalidate_user_responses(user_id):
+    # Bumping the generation orphans every cached response of the user in all workers.
+    # It never expires: a generation falling back to 0 would revive old responses.
+    if user_id is None:
+        return
+    key = f"response-generation:{user_id}"
+    cache.add(key, 0, timeout=0)
+    if cache_config["CACHE_TYPE"] == "RedisCache":
+        # INCR is atomic and keeps the key's lack of a timeout
+        cache.cache.inc(key)
+    else:
+        # SimpleCache's inc stores the new value with the default timeout
+        with response_generation_lock:
+            cache.set(key, (cache.get(key) or 0) + 1, timeout=0)
+
+
+def cached_for_user(etag=False):
+    """
+    Cache a user_required view's 200 responses per user, path, query and profile
+    version in the shared Flask-Caching store.
+    :param etag: answer If-None-Match with 304 when the cached body is unchanged
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(user, *args, **kwargs):
+            key = response_cache_key(user)
+            cached = cache.get(key)
+            if cached is None:
+                response = make_response(f(user, *args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+
+                body = response.get_data()
+                cached = {
+                    "body": body,
+                    "mimetype": response.mimetype,
+                    "etag": hashlib.sha1(body).hexdigest(),
+                }
+                cache.set(key, cached)
+
+            response = Response(cached["body"], mimetype=cached["mimetype"])
+            response.headers["Cache-Control"] = "private, no-cache"
+            if etag:
+                response.set_etag(cached["etag"])
+                response = response.make_conditional(request)
+            return response
+
+        return decorated_function
+
+    return decorator
+
+
 def user_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if "token_info" in session:
-            token_info = session["token_info"]
-            auth_manager_with_token = SpotifyOAuth(
-                client_id=os.environ.get("SPOTIFY_CLIENT_ID"),
-                client_secret=os.environ.get("SPOTIFY_CLIENT_SECRET"),
-                redirect_uri=os.environ.get("SPOTIFY_REDIRECT_URI"),
-                scope="user-read-private user-read-email user-library-modify user-library-read user-top-read user-read-recently-played",
-            )
-            auth_manager_with_token.token_info = token_info
-
-            sp = spotipy.Spotify(auth_manager=auth_manager_with_token)
-            user = UserGenes(sp)
-            user.initTracksDF()
+            user = get_user_profile()
             return f(user, *args, **kwargs)
         else:
             auth_url = auth_manager.get_authorize_url()
@@ -53,31 +209,170 @@ def user_required(f):
     return decorated_function
 
 
+def metrics_token_required(f):
+    # Off unless METRICS_TOKEN is set; scrapers then send it as a bearer token
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not METRICS_TOKEN:
+            abort(404)
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not secrets.compare_digest(supplied.encode(), METRICS_TOKEN.encode()):
+            return "Unauthorized", 401, {"WWW-Authenticate": "Bearer"}
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
 # Initialize environment variables and user object
 
 load_env_variables()
 
+# Every Spotify client shares one connection pool and one rate-limit budget
+spotify_transport = SpotifyTransport(
+    rate=float(os.environ.get("SPOTIFY_RATE_LIMIT", 10)),
+    burst=int(os.environ.get("SPOTIFY_RATE_BURST", 20)),
+    maxRetries=int(os.environ.get("SPOTIFY_MAX_RETRIES", 3)),
+)
+
 # Initialize the Spotify OAuth object
 auth_manager = SpotifyOAuth(
     client_id=os.environ.get("SPOTIFY_CLIENT_ID"),
     client_secret=os.environ.get("SPOTIFY_CLIENT_SECRET"),
     redirect_uri=os.environ.get("SPOTIFY_REDIRECT_URI"),
     scope="user-read-private user-read-email user-library-modify user-library-read user-top-read user-read-recently-played",
+    requests_session=spotify_transport,
 )
 
 # user = UserGenes(sp=spotipy.Spotify(auth_manager=auth_manager))
 # user.initTracksDF()
 
+# Track, artist and audio feature lookups are shared across users, and across
+# workers when REDIS_URL is set
+entity_cache = EntityCache(
+    maxBytes=int(os.environ.get("ENTITY_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+    backend=RedisEntityBackend.fromURL(os.environ["REDIS_URL"])
+    if os.environ.get("REDIS_URL")
+    else None,
+)
+
+# Audio features of every enriched track, for local "more like this gene" lookups
+similarity_index = SimilarityIndex(os.environ.get("SIMILARITY_INDEX_PATH"))
+if similarity_index.path is not None:
+    atexit.register(similarity_index.save)
+
+# Audio-analysis summaries that refine genes; downloaded only by the profile warmer
+analysis_store = AnalysisStore(os.environ.get("ANALYSIS_STORE_PATH"))
+ANALYSIS_INGEST = os.environ.get("ANALYSIS_INGEST", "0") == "1"
+
+# Every play we see is kept so genes can be charted over the whole history
+if os.environ.get("HISTORY_BACKEND") == "mongo":
+    import pymongo
+
+    history_store = MongoHistoryStore(
+        pymongo.MongoClient(os.environ.get("MONGO_URI"))["SpotifyGenetics"]
+    )
+else:
+    history_store = SQLiteHistoryStore(os.environ.get("HISTORY_DB_PATH", "history.db"))
+
+# Population gene, artist and genre totals, updated as each profile is built
+cohort_stats = CohortStats()
+
+# Daily rollups of that history, refreshed incrementally as new plays arrive
+trend_engine = TrendEngine(history_store)
+
+# GPT summaries run off the request thread; without a key the stub keeps the flow working
+SUMMARY_TOKEN_BUDGET = int(os.environ.get("SUMMARY_TOKEN_BUDGET", 1200))
+summary_jobs = SummaryJobs(
+    OpenAIChatClient() if os.environ.get("OPENAI_API_KEY") else StubLLMClient(),
+    maxWorkers=int(os.environ.get("SUMMARY_WORKERS", 2)),
+)
+
+# Built profiles are shared by every endpoint of a dashboard view
+profile_cache = ProfileCache(
+    ttl=int(os.environ.get("PROFILE_CACHE_TTL", 300)),
+    checkInterval=int(os.environ.get("PROFILE_CACHE_CHECK_INTERVAL", 30)),
+)
+
+# Opted-in users get their profile rebuilt in the background ahead of their next visit
+PROFILE_WARMER_ENABLED = os.environ.get("PROFILE_WARMER_ENABLED", "0") == "1"
+profile_warmer = ProfileWarmer(
+    warm_profile,
+    refreshToken=refresh_token_info,
+    interval=int(os.environ.get("PROFILE_WARM_INTERVAL", 240)),
+    maxConcurrent=int(os.environ.get("PROFILE_WARM_CONCURRENCY", 2)),
+)
+if PROFILE_WARMER_ENABLED:
+    profile_warmer.start()
+    atexit.register(profile_warmer.stop)
+
+# Covers are proxied through /art, which keeps card-sized thumbnails on disk
+ALBUM_ART_PROXY = os.environ.get("ALBUM_ART_PROXY", "1") != "0"
+ALBUM_ART_SIZE = int(os.environ.get("ALBUM_ART_SIZE", 128))
+album_art_cache = AlbumArtCache(
+    os.environ.get("ALBUM_ART_DIR", "album_art"),
+    DirectoryImageFetcher(os.environ["ALBUM_ART_FIXTURES"])
+    if os.environ.get("ALBUM_ART_FIXTURES")
+    else HTTPImageFetcher(),
+    missingTTL=int(os.environ.get("ALBUM_ART_MISSING_TTL", 300)),
+)
+
 # Initialize Flask and configure Flask-Caching
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(16)
 
+# Responses are cached per user; with REDIS_URL every worker process shares them
 cache_config = {
-    "CACHE_TYPE": "simple",
+    "CACHE_TYPE": "RedisCache" if os.environ.get("REDIS_URL") else "SimpleCache",
+    "CACHE_REDIS_URL": os.environ.get("REDIS_URL"),
+    "CACHE_KEY_PREFIX": "genegenetics:",
     "CACHE_DEFAULT_TIMEOUT": 360,
 }
 app.config.from_mapping(cache_config)
 cache = Cache(app)
+response_generation_lock = threading.Lock()
+
+# Every request feeds the /metrics histograms; only sampled ones keep a span tree
+instrumentation.configure(
+    enabled=os.environ.get("INSTRUMENTATION_ENABLED", "1") != "0",
+    sampleRate=float(os.environ.get("INSTRUMENTATION_SAMPLE_RATE", 1.0)),
+)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    # The route template, not the path, so IDs in URLs (summary jobs, genes, images)
+    # never reach /debug/traces
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    g.trace = instrumentation.startTrace(request.endpoint or "unmatched", route=route)
+
+
+@app.after_request
+def finish_request_timing(response):
+    if "request_started" not in g:
+        return response
+
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    if instrumentation.enabled:
+        instrumentation.observe(
+            "request_seconds",
+            time.perf_counter() - g.request_started,
+            route=route,
+            method=request.method,
+            status=response.status_code,
+        )
+    if g.trace is not None:
+        instrumentation.finishTrace(g.trace, status=response.status_code)
+        response.headers["Server-Timing"] = serverTiming(g.trace)
+        g.trace = None
+    return response
+
+
+@app.teardown_request
+def count_request_errors(error):
+    if error is not None and instrumentation.enabled:
+        instrumentation.increment("request_errors_total", error=type(error).__name__)
 
 
 @app.route("/", methods=["GET", "POST"])
@@ -88,55 +383,130 @@ def index():
             auth_url = auth_manager.get_authorize_url()
             return redirect(auth_url)
         else:
-            token_info = session["token_info"]
-            auth_manager_with_token = SpotifyOAuth(
-                client_id=os.environ.get("SPOTIFY_CLIENT_ID"),
-                client_secret=os.environ.get("SPOTIFY_CLIENT_SECRET"),
-                redirect_uri=os.environ.get("SPOTIFY_REDIRECT_URI"),
-                scope="user-read-private user-read-email user-library-modify user-library-read user-top-read user-read-recently-played",
-                token_info=token_info,
-            )
-
-            sp = spotipy.Spotify(auth_manager=auth_manager_with_token)
-            user = UserGenes(sp)
-            user.initTracksDF()
-
-            selected_df = get_selected_dataframe(user)
-
-            # prompt_for_gpt_music_summary = get_prompt_for_gpt_music_summary()
-            # gpt_summary_df = get_gpt_summary_dataframe(selected_df)
-            # gpt_summary_json = gpt_summary_df.to_json(orient="records")
+            # The shell goes out straight away; main.js fills it from /dashboard_stream
             top_tracks_summary_text = "Test"
 
-            sidebar_cards = user.getRecentlyPlayedForCard()
-
             return render_template(
                 "index.html",
-                sidebar_cards=sidebar_cards,
+                sidebar_cards=[],
                 gpt_summary=top_tracks_summary_text,
             )
 
     except Exception as e:
         print(f"An error occurred: {e}")
+        instrumentation.recordError("index", e)
         error_message = (
             "An error occurred while processing your request. Please try again later."
         )
         return render_template("index.html", error_message=error_message)
 
 
+@app.template_filter()
+def art_url(url, size=None):
+    """
+    /art URL of a Spotify album cover at size (default ALBUM_ART_SIZE), or url as is
+    when it is not a Spotify cover or the proxy is off.
+    """
+    image_id = imageId(url)
+    if not ALBUM_ART_PROXY or image_id is None:
+        return url
+    return url_for("album_art", image_id=image_id, size=size or ALBUM_ART_SIZE)
+
+
+def with_card_art(cards):
+    for card in cards:
+        card["image_url"] = art_url(card["image_url"])
+    return cards
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def dashboard_stage_payload(user, stage):
+    payload = {"cards": with_card_art(user.getRecentlyPlayedForCard())}
+    if stage == "genes":
+        payload["chart"] = user.getGeneDataFromDF(get_selected_dataframe(user))
+    return payload
+
+
+@app.route("/dashboard_stream")
+def dashboard_stream():
+    if "token_info" not in session:
+        return redirect(auth_manager.get_authorize_url())
+
+    token_info = session["token_info"]
+    sp = get_spotify_client(token_info)
+    if "user_id" not in session:
+        session["user_id"] = sp.current_user()["id"]
+    user_id = session["user_id"]
+    key = profile_cache.makeKey(user_id, token_info)
+
+    def generate():
+        start = time.perf_counter()
+        timings = {}
+        stage_start = start
+
+        def stage_event(user, stage):
+            nonlocal stage_start
+            timings[stage] = round((time.perf_counter() - stage_start) * 1000, 1)
+            payload = dashboard_stage_payload(user, stage)
+            payload["timings"] = timings
+            stage_start = time.perf_counter()
+            return sse_event(stage, payload)
+
+        try:
+            # Held until the profile is cached, so a request for / opened alongside
+            # the stream waits for this build instead of starting its own
+            with profile_cache.lockFor(key):
+                user = profile_cache.get(key, sp)
+                built = user is None
+                if built:
+                    user = new_user_profile(sp, user_id)
+                    for stage in user.iterInitTracksDF():
+                        yield stage_event(user, stage)
+                    profile_cache.put(key, user)
+                    profile_built(user_id, user)
+
+            if not built:
+                for stage in ["tracks", "genes", "library"]:
+                    yield stage_event(user, stage)
+
+            timings["total"] = round((time.perf_counter() - start) * 1000, 1)
+            yield sse_event(
+                "done", {"timings": timings, "enrichment": user.enrichmentReport}
+            )
+        except Exception as e:
+            print(f"Error: {e}")
+            instrumentation.recordError("dashboard_stream", e)
+            yield sse_event("error", {"message": "Failed to load your profile"})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route("/callback")
 def callback():
     try:
         code = request.args.get("code")
         token_info = auth_manager.get_access_token(code)
         if token_info:
-            sp = spotipy.Spotify(auth_manager=auth_manager)
+            sp = get_spotify_client(token_info)
 
-            # Get user's profile information
-            user = UserGenes(sp)
-            user.initTracksDF()
+            # Get user's profile information and keep it for the first dashboard view
+            user_id = sp.current_user()["id"]
+            user = build_user(sp, user_id)
+            key = profile_cache.makeKey(user_id, token_info)
+            profile_cache.put(key, user)
+            # Keep an opted-in user's warmer on the token their new session uses
+            if profile_warmer.isRegistered(user_id):
+                profile_warmer.register(user_id, token_info, key)
 
             session["token_info"] = token_info
+            session["user_id"] = user_id
             session["logged_in"] = True
 
             return redirect(url_for("index"))
@@ -145,6 +515,7 @@ def callback():
             return "Error: Failed to get access token", 400
     except Exception as e:
         print(f"Error: {e}")
+        instrumentation.recordError("callback", e)
         return "Error: Failed to get access token", 400
 
 
@@ -169,87 +540,294 @@ def favicon():
     )
 
 
+@app.route("/profile_cache_stats")
+def profile_cache_stats():
+    return jsonify(profile_cache.stats())
+
+
+@app.route("/profile_warming", methods=["GET", "POST"])
+def profile_warming():
+    if "token_info" not in session or "user_id" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    user_id = session["user_id"]
+    if request.method == "POST":
+        if not PROFILE_WARMER_ENABLED:
+            return jsonify({"error": "Profile warming is disabled"}), 409
+        data = request.get_json(silent=True) or request.form
+        if str(data.get("enabled", "true")).lower() in ("1", "true", "yes", "on"):
+            token_info = session["token_info"]
+            profile_warmer.register(
+                user_id, token_info, profile_cache.makeKey(user_id, token_info)
+            )
+        else:
+            profile_warmer.unregister(user_id)
+
+    return jsonify(
+        {"available": PROFILE_WARMER_ENABLED, "enabled": profile_warmer.isRegistered(user_id)}
+    )
+
+
+@app.route("/profile_warmer_stats")
+def profile_warmer_stats():
+    return jsonify(profile_warmer.stats())
+
+
+@app.route("/art/<image_id>")
+def album_art(image_id):
+    # Only pages of signed-in users link here; anyone else could use it as an open
+    # proxy onto Spotify's CDN
+    if "token_info" not in session:
+        return "Sign in to view album art", 401
+
+    size = request.args.get("size", ALBUM_ART_SIZE, type=int)
+    if size not in THUMBNAIL_SIZES:
+        return f"size must be one of {', '.join(map(str, THUMBNAIL_SIZES))}", 400
+
+    # Browsers may keep an unknown image's 404 as long as the cache remembers it
+    not_found = (
+        "Unknown image",
+        404,
+        {"Cache-Control": f"private, max-age={album_art_cache.missingTTL}"},
+    )
+    try:
+        art = album_art_cache.get(image_id, size)
+    except ValueError:
+        return not_found
+    except Exception as e:
+        print(f"Error fetching album art: {e}")
+        instrumentation.recordError("album_art", e)
+        return "Failed to fetch image", 502
+    if art is None:
+        return not_found
+
+    data, digest = art
+    response = make_response(data)
+    response.mimetype = imageMimetype(data)
+    # Spotify image IDs never change content, so neither does any size of them
+    # private, so shared caches do not hand covers to clients without a session
+    response.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    response.set_etag(digest)
+    return response.make_conditional(request)
+
+
+@app.route("/album_art_stats")
+def album_art_stats():
+    return jsonify(album_art_cache.stats())
+
+
+@app.route("/analysis_store_stats")
+def analysis_store_stats():
+    return jsonify(analysis_store.stats())
+
+
+@app.route("/entity_cache_stats")
+def entity_cache_stats():
+    return jsonify(entity_cache.stats())
+
+
+@app.route("/spotify_stats")
+def spotify_stats():
+    return jsonify(spotify_transport.stats())
+
+
+@app.route("/metrics")
+@metrics_token_required
+def metrics():
+    return Response(
+        instrumentation.renderPrometheus(), mimetype="text/plain; version=0.0.4"
+    )
+
+
+@app.route("/debug/traces")
+@metrics_token_required
+def debug_traces():
+    return jsonify(instrumentation.recentTraces())
+
+
 @app.route("/sidebar_card_data")
 @user_required
+@cached_for_user(etag=True)
 def sidebar_card_data(user):
-    sidebar_cards = user.getRecentlyPlayedForCard()
+    sidebar_cards = with_card_art(user.getRecentlyPlayedForCard())
     return jsonify(sidebar_cards)
 
 
 @app.route("/chart_data")
 @user_required
+@cached_for_user(etag=True)
 def chart_data(user):
     print("HELLO", session)
     try:
-        selectedDF = get_selected_dataframe(user)
-        data = user.getGeneDataFromDF(selectedDF)
+        if request.args.get("scope") == "history":
+            data = user.getHistoryGeneData()
+        else:
+            selectedDF = get_selected_dataframe(user)
+            data = user.getGeneDataFromDF(selectedDF)
 
         options = {}
         return jsonify({"data": data, "options": options})
     except Exception as e:
         print(f"Error: {e}")
+        instrumentation.recordError("chart_data", e)
         return "Error occurred", 500
 
 
+@app.route("/cohort")
+def cohort():
+    k = request.args.get("k", 10, type=int)
+    return jsonify(
+        {
+            **cohort_stats.populationGenes(),
+            "topArtists": cohort_stats.topArtists(k),
+            "topGenres": [
+                {**genre, "topGenes": cohort_stats.genesForGenre(genre["name"])}
+                for genre in cohort_stats.topGenres(k)
+            ],
+        }
+    )
+
+
+@app.route("/cohort/me")
+@user_required
+def cohort_me(user):
+    comparison = cohort_stats.compareUser(user.userId)
+    if comparison is None:
+        cohort_stats.ingestProfile(user.userId, user)
+        comparison = cohort_stats.compareUser(user.userId)
+    return jsonify({"genes": comparison})
+
+
+# Largest grid /genes/explore evaluates in one request. Thresholds are cheap to sweep,
+# but every weight combination re-scores every cohort track, so those get their own,
+# much smaller cap
+MAX_EXPLORE_VARIANTS = int(os.environ.get("MAX_EXPLORE_VARIANTS", 20000))
+MAX_EXPLORE_WEIGHT_SETTINGS = int(os.environ.get("MAX_EXPLORE_WEIGHT_SETTINGS", 16))
+
+
+@app.route("/genes/explore", methods=["POST"])
+@user_required
+def explore_genes(user):
+    """
+    Gene distributions of the user's tracks and of every track in the history store
+    under each combination of a grid of GENE_MODEL settings, e.g.
+    {"grid": {"tempoThreshold": [90, 100, 110], "energyWeight": [0.1, 0.2]}}.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "body must be a JSON object"}), 400
+    grid = data.get("grid")
+    if not isinstance(grid, dict) or not all(
+        isinstance(values, list) and values for values in grid.values()
+    ):
+        return jsonify({"error": "grid must map parameters to non-empty lists"}), 400
+
+    variants = 1
+    for values in grid.values():
+        variants *= len(values)
+    if variants > MAX_EXPLORE_VARIANTS:
+        return jsonify({"error": f"grid has more than {MAX_EXPLORE_VARIANTS} variants"}), 400
+    if countWeightSettings(grid) > MAX_EXPLORE_WEIGHT_SETTINGS:
+        return jsonify(
+            {"error": f"grid has more than {MAX_EXPLORE_WEIGHT_SETTINGS} weight combinations"}
+        ), 400
+
+    scopes = {
+        "user": lambda: get_selected_dataframe(user),
+        "cohort": history_store.trackFeatures,
+    }
+    try:
+        return jsonify(
+            {
+                scope: GeneExplorer(scopes[scope]()).sweep(grid)
+                for scope in data.get("scopes", list(scopes))
+                if scope in scopes
+            }
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@app.route("/trends")
+@user_required
+def trends(user):
+    period = request.args.get("period", "week")
+    if period not in PERIODS:
+        return jsonify({"error": f"period must be one of {', '.join(PERIODS)}"}), 400
+    window = request.args.get("window", 4, type=int)
+    if window not in WINDOWS:
+        return jsonify({"error": f"window must be one of {', '.join(map(str, WINDOWS))}"}), 400
+
+    return jsonify(trend_engine.getTrends(user.userId, period, window))
+
+
 @app.route("/songs/<genre>")
-@cache.cached()
 @user_required
+@cached_for_user()
 def songs(user, genre):
-    selectedDF = get_selected_dataframe(user)
-    selectedDF = selectedDF[selectedDF["gene"] == genre]
+    selectedDF = user.getExamplesByGene(genre, get_selected_dataframe(user))
 
-    songs = selectedDF[
+    songs = user.withPresentationColumns(selectedDF)[
         ["trackName", "spotifyURL", "artistNames", "artistLinks", "albumCoverURL"]
     ].to_dict("records")
 
     recommendations = user.getRecommendationsByGene(
         selectedDF.reset_index(drop=True), seed_genre=genre
     )
-
-    promptForGPTMusicSummary = get_prompt_for_gpt_music_summary(genre=genre)
-    gptSummaryDF = get_gpt_summary_dataframe(selectedDF)
-    gptSummaryJSON = gptSummaryDF.to_json(orient="records")
+    if not recommendations.empty:
+        recommendations = user.withPresentationColumns(recommendations)
 
     topTracksSummaryText = "Test"
-    return render_template(
-        "songs.html",
-        genre=genre,
-        songs=songs,
-        recommendations=recommendations,
-        musicTasteSummary=topTracksSummaryText,
-    )
+    with instrumentation.span("render", template="songs.html"):
+        return render_template(
+            "songs.html",
+            genre=genre,
+            songs=songs,
+            recommendations=recommendations,
+            musicTasteSummary=topTracksSummaryText,
+        )
 
 
 @app.route("/generate_summary", methods=["POST"])
 @user_required
-def generate_summary():
+def generate_summary(user):
     selectedDF = get_selected_dataframe(user)
+    messages, prompt_report = get_gpt_summary_messages(
+        user, selectedDF, SUMMARY_TOKEN_BUDGET
+    )
 
-    promptForGPTMusicSummary = get_prompt_for_gpt_music_summary()
+    job_id = summary_jobs.submit(
+        session["user_id"],
+        get_summary_fingerprint(selectedDF, SUMMARY_TOKEN_BUDGET),
+        messages,
+    )
+    job = summary_jobs.getJob(job_id)
 
-    # Construct the messages for the GPT-3.5 request
-    messages = [
+    return jsonify(
         {
-            "role": "system",
-            "content": promptForGPTMusicSummary,
-        },
+            "job_id": job_id,
+            "status": job["status"],
+            "summary": job["summary"],
+            "prompt": prompt_report,
+        }
+    ), (200 if job["status"] == "done" else 202)
+
+
+@app.route("/summary/<job_id>")
+def summary_status(job_id):
+    job = summary_jobs.getJob(job_id)
+    # Someone else's job is reported as unknown, so job IDs cannot be probed
+    if job is None or job["userId"] != session.get("user_id"):
+        return jsonify({"error": "Unknown summary job"}), 404
+
+    return jsonify(
         {
-            "role": "user",
-            "content": f"Here is a list of my recently listened to tracks",
-        },
-    ]
-
-    # Add the selected dataframe to the messages
-    messages[1]["content"] += selectedDF.to_json(orient="records")
-
-    # Send the request to GPT-3.5
-    topTracksSummaryResp = openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=messages,
+            "job_id": job_id,
+            "status": job["status"],
+            "summary": job["summary"],
+            "error": job["error"],
+        }
     )
-    topTracksSummaryText = topTracksSummaryResp["choices"][0]["message"]["content"]
-
-    return jsonify({"summary": topTracksSummaryText})
 
 
 if __name__ == "__main__":
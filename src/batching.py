@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from Instrumentation import inContext
+
+# Maximum IDs Spotify accepts per call on its batch endpoints
+TRACKS_BATCH_SIZE = 50
+ARTISTS_BATCH_SIZE = 50
+AUDIO_FEATURES_BATCH_SIZE = 100
+SAVED_CONTAINS_BATCH_SIZE = 50
+PAGE_SIZE = 50
+
+DEFAULT_MAX_WORKERS = 8
+
+
+def chunked(items, size):
+    items = list(items)
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def fetchInChunks(fetch, ids, size, maxWorkers=DEFAULT_MAX_WORKERS):
+    """
+    Split ids into batches of at most size, run fetch on each batch through a
+    bounded thread pool and concatenate the results in the original order.
+    :param fetch: callable taking a list of IDs and returning a list aligned with it
+    """
+    chunks = chunked(ids, size)
+    if len(chunks) <= 1:
+        return fetch(chunks[0]) if chunks else []
+
+    with ThreadPoolExecutor(max_workers=min(maxWorkers, len(chunks))) as executor:
+        results = executor.map(inContext(fetch), chunks)
+        return [item for chunk in results for item in chunk]
+
+
+def fetchAllPages(fetchPage, pageSize=PAGE_SIZE, maxWorkers=DEFAULT_MAX_WORKERS):
+    """
+    Collect every item from an offset-paged Spotify endpoint. The first page
+    reports the total, after which the remaining pages are requested concurrently.
+    :param fetchPage: callable taking (limit, offset) and returning a Spotify paging object
+    """
+    first = fetchPage(pageSize, 0)
+    items = list(first["items"])
+    offsets = range(pageSize, first.get("total") or 0, pageSize)
+    if not offsets:
+        return items
+
+    with ThreadPoolExecutor(max_workers=min(maxWorkers, len(offsets))) as executor:
+        for page in executor.map(
+            inContext(lambda offset: fetchPage(pageSize, offset)), offsets
+        ):
+            items.extend(page["items"])
+
+    return items
@@ -1,12 +1,12 @@
-import openai
-import os
 from dotenv import load_dotenv
 from UserGenes import UserGenes
+from SummaryJobs import fingerprintTracks
+from promptBuilder import DEFAULT_TOKEN_BUDGET, buildSummaryPrompt, estimateTokens
 
 
 def load_env_variables():
+    # openai is imported on the first summary and reads OPENAI_API_KEY itself
     load_dotenv()
-    openai.api_key = os.environ.get("OPENAI_API_KEY")
 
 
 def init_user():
@@ -16,14 +16,7 @@ def init_user():
 
 
 def get_selected_dataframe(user):
-    df = user.recentTracksDF
-    subset = ["trackName", "artistNames"]
-
-    # Convert lists in the "artistNames" column to tuples or strings
-    df["artistNames"] = df["artistNames"].apply(tuple)
-
-    df = df.drop_duplicates(subset=subset)
-    return df
+    return user.getSelectedDF()
 
 
 def get_prompt_for_gpt_music_summary(genre=""):
@@ -42,24 +35,26 @@ def get_prompt_for_gpt_music_summary(genre=""):
     """
 
 
-def get_gpt_summary_dataframe(selected_df):
-    return selected_df[
-        [
-            "trackName",
-            "trackPopularity",
-            "trackDurationMs",
-            "trackExplicit",
-            "albumName",
-            "albumType",
-            "albumReleaseDate",
-            "artistNames",
-            "artistLinks",
-            "artistGenres",
-            "artistPopularity",
-            "type",
-            "track_href",
-            "duration_ms",
-            "time_signature",
-            "gene",
-        ]
-    ][:20]
+def get_gpt_summary_messages(user, selected_df, token_budget=DEFAULT_TOKEN_BUDGET):
+    """
+    :return: the chat messages and a report of the prompt's size
+    """
+    # A digest aggregated by gene and artist rather than every track as JSON
+    prompt, report = buildSummaryPrompt(
+        user.withPresentationColumns(selected_df),
+        token_budget,
+        introduction="Here is a digest of my recently listened to tracks.",
+    )
+    system_prompt = get_prompt_for_gpt_music_summary()
+    report["systemTokens"] = estimateTokens(system_prompt)
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt},
+    ]
+    return messages, report
+
+
+def get_summary_fingerprint(selected_df, token_budget=DEFAULT_TOKEN_BUDGET):
+    gene_counts = selected_df["gene"].astype(str).value_counts().to_dict()
+    return fingerprintTracks(selected_df["id"].tolist(), gene_counts, token_budget)
@@ -0,0 +1,143 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+GENE_FEATURES = [
+    "valence",
+    "mode",
+    "tempo",
+    "instrumentalness",
+    "speechiness",
+    "acousticness",
+    "energy",
+    "danceability",
+    "time_signature",
+]
+
+# Weights and cut-offs of the gene model, read by UserGenes.calculateGene and
+# calculateGeneCodes; GeneExplorer sweeps variants of them
+GENE_MODEL = {
+    "valenceWeight": 0.8,
+    "modeWeight": 0.2,
+    "moodThreshold": 0.5,
+    "tempoThreshold": 100.0,
+    "instrumentalnessWeight": -0.15,
+    "speechinessWeight": 0.25,
+    "acousticnessWeight": -0.15,
+    "energyWeight": 0.2,
+    "danceabilityWeight": 0.1,
+    "tempoWeight": 0.15,
+    "timeSignatureWeight": 0.2,
+    "complexityThreshold": 0.55,
+    "instrumentalThreshold": 0.5,
+}
+
+# Audio-analysis summaries (AnalysisStore) that refine the texture gene when a track
+# has them, at their rough typical value for a three-to-four minute song: Spotify's
+# sections last about 25 s and its segments about a quarter of a second, and the timbre
+# coefficients' standard deviation across the segments averages about 25
+ANALYSIS_TYPICAL = {"sectionCount": 8.0, "segmentsPerSecond": 4.0, "timbreSpread": 25.0}
+
+# Each summary saturates at twice its typical value, so it maps onto 0-1 with a typical
+# track at ANALYSIS_CENTRE and twice as busy a track at the top
+ANALYSIS_GENE_FEATURES = {name: 2 * value for name, value in ANALYSIS_TYPICAL.items()}
+ANALYSIS_CENTRE = 0.5
+
+# The adjustment spans +-0.1 of the normalized complexity score, less than the largest
+# single audio-feature term (speechiness, up to 0.25 / 2), so a track's structure tips
+# tracks near complexityThreshold one way or the other but cannot override its features
+ANALYSIS_WEIGHT = 0.2
+
+# Every possible gene, in code order: mood, pace, texture, vocals from most to least significant bit
+GENE_CATEGORIES = [
+    "".join(letters)
+    for letters in itertools.product(("H", "S"), ("F", "L"), ("D", "M"), ("V", "I"))
+]
+
+
+def getFeatureColumns(features):
+    """
+    Pull the gene features out of a DataFrame, a dict of arrays or a NumPy
+    structured array as float64 column arrays.
+    """
+    return {
+        name: np.asarray(features[name], dtype=np.float64) for name in GENE_FEATURES
+    }
+
+
+def hasAnalysisFeatures(features):
+    names = getattr(getattr(features, "dtype", None), "names", None) or features
+    return all(name in names for name in ANALYSIS_GENE_FEATURES)
+
+
+def analysisAdjustment(features):
+    """
+    Shift of the normalized complexity score from a track's structure: more sections,
+    denser segments and more varied timbre make it denser. Zero for a track at
+    ANALYSIS_TYPICAL, NaN where the track has no analysis summary.
+    """
+    complexity = 0.0
+    for name, saturation in ANALYSIS_GENE_FEATURES.items():
+        values = np.asarray(features[name], dtype=np.float64)
+        complexity = complexity + np.minimum(values / saturation, 1.0)
+    return ANALYSIS_WEIGHT * (complexity / len(ANALYSIS_GENE_FEATURES) - ANALYSIS_CENTRE)
+
+
+def geneScores(features, model=GENE_MODEL):
+    """
+    The four scores a gene thresholds, as float64 arrays: mood, tempo, complexity
+    (normalized, with the audio-analysis adjustment where available) and
+    instrumentalness.
+    """
+    columns = getFeatureColumns(features)
+
+    mood_score = model["valenceWeight"] * columns["valence"] + model["modeWeight"] * columns["mode"]
+
+    complexity_score = (
+        model["instrumentalnessWeight"] * columns["instrumentalness"]
+        + model["speechinessWeight"] * columns["speechiness"]
+        + model["acousticnessWeight"] * columns["acousticness"]
+        + model["energyWeight"] * columns["energy"]
+        + model["danceabilityWeight"] * columns["danceability"]
+        + model["tempoWeight"] * columns["tempo"] / 200
+        + model["timeSignatureWeight"] * (columns["time_signature"] != 4).astype(np.int64)
+    )
+    complexity_score = (complexity_score + 1) / 2
+    if hasAnalysisFeatures(features):
+        adjustment = analysisAdjustment(features)
+        complexity_score = np.where(
+            np.isnan(adjustment), complexity_score, complexity_score + adjustment
+        )
+
+    return mood_score, columns["tempo"], complexity_score, columns["instrumentalness"]
+
+
+def calculateGeneCodes(features, model=GENE_MODEL):
+    """
+    Vectorized UserGenes.calculateGene over whole columns.
+    Operations are applied in the same order as the row-wise version so the
+    float64 scores, and therefore the genes, are bit-for-bit identical.
+    :param model: weights and cut-offs, GENE_MODEL unless exploring variants
+    :return: uint8 array of indices into GENE_CATEGORIES
+    """
+    mood_score, tempo, complexity_score, instrumentalness = geneScores(features, model)
+
+    isSad = ~(mood_score > model["moodThreshold"])
+    isSlow = ~(tempo > model["tempoThreshold"])
+    isMinimal = ~(complexity_score > model["complexityThreshold"])
+    isInstrumental = ~(instrumentalness < model["instrumentalThreshold"])
+
+    return (
+        (isSad.astype(np.uint8) << 3)
+        | (isSlow.astype(np.uint8) << 2)
+        | (isMinimal.astype(np.uint8) << 1)
+        | isInstrumental.astype(np.uint8)
+    )
+
+
+def calculateGenes(features):
+    """
+    Gene for every row of features as a categorical over all 16 genes.
+    """
+    return pd.Categorical.from_codes(calculateGeneCodes(features), GENE_CATEGORIES)
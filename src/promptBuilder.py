@@ -0,0 +1,132 @@
+import math
+import re
+
+DEFAULT_TOKEN_BUDGET = 1200
+
+# Fraction of the budget left after the gene and feature summary that artists may take
+ARTIST_BUDGET_SHARE = 0.4
+
+SUMMARY_FEATURES = ["valence", "energy", "danceability", "acousticness", "tempo"]
+
+WORD_PIECES = re.compile(r"\w+|[^\w\s]")
+
+
+def estimateTokens(text):
+    """
+    Token count of text for the OpenAI chat models. Uses tiktoken when it is
+    installed, else a local estimate of one token per four characters of each word
+    plus one per punctuation mark, which lands within ~15% on English prose.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return sum(
+            max(1, math.ceil(len(piece) / 4)) if piece[0].isalnum() else 1
+            for piece in WORD_PIECES.findall(text)
+        )
+    return len(tiktoken.get_encoding("cl100k_base").encode(text))
+
+
+def formatTrack(row):
+    year = str(row["albumReleaseDate"])[:4]
+    return f'"{row["trackName"]}" by {", ".join(row["artistNames"])} ({year}, popularity {row["trackPopularity"]})'
+
+
+def geneSection(df):
+    counts = df["gene"].astype(str).value_counts()
+    total = counts.sum()
+    return ["Genes (share of tracks):"] + [
+        f"- {gene}: {count} tracks, {count / total:.0%}" for gene, count in counts.items()
+    ]
+
+
+def featureSection(df):
+    means = df[SUMMARY_FEATURES].mean()
+    return [
+        "Average audio features: "
+        + ", ".join(
+            f"{name} {means[name]:.0f}" if name == "tempo" else f"{name} {means[name]:.2f}"
+            for name in SUMMARY_FEATURES
+        )
+    ]
+
+
+def artistLines(df):
+    """
+    One line per lead artist, most tracks first, with genres and popularity.
+    """
+    artists = (
+        df.assign(artistName=df["artistNames"].str[0], artistID=df["artistID"].astype(str))
+        .groupby("artistID", sort=False)
+        .agg(
+            artistName=("artistName", "first"),
+            tracks=("id", "size"),
+            popularity=("artistPopularity", "first"),
+            genres=("artistGenres", "first"),
+        )
+        .sort_values(["tracks", "popularity"], ascending=False)
+    )
+    return [
+        f"- {row.artistName}: {row.tracks} tracks, popularity {row.popularity}"
+        + (f", {', '.join(row.genres[:3])}" if len(row.genres) else "")
+        for row in artists.itertuples()
+    ]
+
+
+def exampleLines(df):
+    """
+    Example tracks interleaved across genes, most popular first within each gene,
+    so trimming from the end drops examples evenly rather than whole genes.
+    """
+    ranked = df.sort_values("trackPopularity", ascending=False)
+    ranked = ranked.assign(rank=ranked.groupby(ranked["gene"].astype(str)).cumcount())
+    ranked = ranked.sort_values(["rank", "gene"], kind="stable")
+    return [f"- [{row['gene']}] {formatTrack(row)}" for _, row in ranked.iterrows()]
+
+
+def buildSummaryPrompt(df, tokenBudget=DEFAULT_TOKEN_BUDGET, introduction=""):
+    """
+    Compact plain-text digest of a listener's tracks for the GPT summary: gene shares,
+    average features, lead artists and example tracks, with no URLs or IDs. Artists
+    and examples are added until tokenBudget would be exceeded.
+    :param df: deduplicated tracks with presentation columns (UserGenes.withPresentationColumns)
+    :return: (prompt text, report dict with the prompt size and what was included)
+    """
+    df = df.drop_duplicates(subset=["trackName", "artistIDs"])
+    lines = [introduction] if introduction else []
+    lines += geneSection(df) + featureSection(df)
+    tokens = estimateTokens("\n".join(lines))
+
+    # Artists may use part of what is left, so examples are never crowded out entirely
+    artistLimit = tokens + ARTIST_BUDGET_SHARE * max(0, tokenBudget - tokens)
+    included = {}
+    for heading, candidates, limit in (
+        ("Top artists:", artistLines(df), artistLimit),
+        ("Example tracks:", exampleLines(df), tokenBudget),
+    ):
+        section = [heading]
+        sectionTokens = estimateTokens(heading)
+        for line in candidates:
+            lineTokens = estimateTokens(line)
+            if tokens + sectionTokens + lineTokens > limit:
+                break
+            section.append(line)
+            sectionTokens += lineTokens
+        included[heading] = (len(section) - 1, len(candidates))
+        if len(section) > 1:
+            lines += section
+            tokens += sectionTokens
+
+    prompt = "\n".join(lines)
+    artists, totalArtists = included["Top artists:"]
+    examples, totalExamples = included["Example tracks:"]
+    return prompt, {
+        "tokens": estimateTokens(prompt),
+        "tokenBudget": tokenBudget,
+        "tracks": len(df),
+        "artists": artists,
+        "totalArtists": totalArtists,
+        "examples": examples,
+        "totalExamples": totalExamples,
+        "truncated": artists < totalArtists or examples < totalExamples,
+    }
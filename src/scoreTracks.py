@@ -0,0 +1,200 @@
+"""
+Gene-classify a bulk track export without running Flask. Input is read in chunks,
+rows missing audio features are enriched through the batched audio-features
+endpoint, chunks are scored in a process pool and written out as they finish, so
+memory stays bounded by chunk size times chunks in flight.
+
+    python src/scoreTracks.py dfs/audioFeatures.csv scored.csv
+    python src/scoreTracks.py trackIds.jsonl scored.parquet --chunk-size 20000 --workers 4
+
+Inputs and outputs may be .csv, .jsonl or .parquet (Parquet needs pyarrow). Inputs
+need an id column; any GENE_FEATURES column they lack is fetched from Spotify with
+the SPOTIPY_CLIENT_ID/SPOTIPY_CLIENT_SECRET app credentials.
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from batching import AUDIO_FEATURES_BATCH_SIZE, DEFAULT_MAX_WORKERS, fetchInChunks
+from genes import GENE_CATEGORIES, GENE_FEATURES, calculateGeneCodes
+
+DEFAULT_CHUNK_SIZE = 10_000
+
+
+def fileFormat(path):
+    extension = os.path.splitext(path)[1].lower()
+    formats = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet"}
+    if extension not in formats:
+        raise ValueError(f"Unsupported file type {extension!r}, expected .csv, .jsonl or .parquet")
+    return formats[extension]
+
+
+def readChunks(path, chunkSize):
+    kind = fileFormat(path)
+    if kind == "csv":
+        yield from pd.read_csv(path, chunksize=chunkSize)
+    elif kind == "jsonl":
+        yield from pd.read_json(path, lines=True, chunksize=chunkSize)
+    else:
+        import pyarrow.parquet
+
+        for batch in pyarrow.parquet.ParquetFile(path).iter_batches(batch_size=chunkSize):
+            yield batch.to_pandas()
+
+
+def renderChunk(df, kind, header):
+    """
+    Serialise a scored chunk for ChunkWriter. Text formats are rendered here, in
+    the worker, since formatting rows costs far more than scoring them.
+    """
+    if kind == "csv":
+        return df.to_csv(header=header, index=False)
+    if kind == "jsonl":
+        text = df.to_json(orient="records", lines=True)
+        # Older pandas leaves off the final newline, newer pandas adds it
+        return text if not text or text.endswith("\n") else text + "\n"
+    return df
+
+
+class ChunkWriter:
+    """
+    Appends rendered chunks to one output file, creating it on the first chunk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.kind = fileFormat(path)
+        self.parquetWriter = None
+        self.chunks = 0
+        self.rows = 0
+
+    def write(self, rendered, rows):
+        if self.kind in ("csv", "jsonl"):
+            with open(self.path, "a" if self.chunks else "w") as f:
+                f.write(rendered)
+        else:
+            import pyarrow
+            import pyarrow.parquet
+
+            table = pyarrow.Table.from_pandas(rendered, preserve_index=False)
+            if self.parquetWriter is None:
+                self.parquetWriter = pyarrow.parquet.ParquetWriter(self.path, table.schema)
+            self.parquetWriter.write_table(table)
+        self.chunks += 1
+        self.rows += rows
+
+    def close(self):
+        if self.parquetWriter is not None:
+            self.parquetWriter.close()
+
+
+def createSpotifyClient():
+    import spotipy
+    from spotipy.oauth2 import SpotifyClientCredentials
+
+    return spotipy.Spotify(auth_manager=SpotifyClientCredentials())
+
+
+def enrichChunk(df, sp, maxWorkers=DEFAULT_MAX_WORKERS):
+    """
+    Fill in audio features for the rows of df that are missing any gene feature.
+    """
+    for name in GENE_FEATURES:
+        if name not in df:
+            df[name] = float("nan")
+
+    missing = df[GENE_FEATURES].isna().any(axis=1)
+    if not missing.any():
+        return df
+
+    trackIds = df.loc[missing, "id"].dropna().unique()
+    fetched = [
+        features
+        for features in fetchInChunks(
+            sp.audio_features, trackIds, AUDIO_FEATURES_BATCH_SIZE, maxWorkers
+        )
+        if features is not None
+    ]
+    if not fetched:
+        return df
+
+    features = pd.DataFrame(fetched).drop_duplicates(subset="id").set_index("id")[GENE_FEATURES]
+    filled = df.loc[missing, ["id"]].join(features, on="id")[GENE_FEATURES]
+    df.loc[missing, GENE_FEATURES] = df.loc[missing, GENE_FEATURES].fillna(filled)
+    return df
+
+
+def scoreChunk(df):
+    """
+    Add a gene column; rows whose features could not be found are left without one.
+    """
+    complete = df[GENE_FEATURES].notna().all(axis=1).to_numpy()
+    genes = pd.Series(None, index=df.index, dtype=object)
+    codes = calculateGeneCodes(df.loc[complete, GENE_FEATURES])
+    genes[complete] = [GENE_CATEGORIES[code] for code in codes]
+    df["gene"] = genes
+    return df
+
+
+def scoreAndRender(df, kind, header):
+    # Runs in the pool's worker processes
+    return renderChunk(scoreChunk(df), kind, header), len(df)
+
+
+def scoreFile(inputPath, outputPath, chunkSize=DEFAULT_CHUNK_SIZE, workers=None, sp=None):
+    """
+    :param workers: scoring processes; 1 scores in this process
+    :param sp: spotipy client for enrichment, created on demand when rows lack features
+    :return: number of rows written
+    """
+    workers = workers or os.cpu_count() or 1
+    writer = ChunkWriter(outputPath)
+
+    def enriched():
+        nonlocal sp
+        for df in readChunks(inputPath, chunkSize):
+            needsFeatures = any(name not in df for name in GENE_FEATURES) or (
+                df[GENE_FEATURES].isna().to_numpy().any()
+            )
+            if needsFeatures and sp is None:
+                sp = createSpotifyClient()
+            yield enrichChunk(df, sp) if needsFeatures else df
+
+    try:
+        if workers == 1:
+            for i, df in enumerate(enriched()):
+                writer.write(*scoreAndRender(df, writer.kind, i == 0))
+            return writer.rows
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Bounded read-ahead: at most two chunks per worker are held at once,
+            # and results are written in input order as soon as they are ready
+            pending = []
+            for i, df in enumerate(enriched()):
+                pending.append(executor.submit(scoreAndRender, df, writer.kind, i == 0))
+                if len(pending) >= 2 * workers:
+                    writer.write(*pending.pop(0).result())
+            for future in pending:
+                writer.write(*future.result())
+        return writer.rows
+    finally:
+        writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gene-classify a bulk track export.")
+    parser.add_argument("input", help=".csv, .jsonl or .parquet with an id column")
+    parser.add_argument("output", help=".csv, .jsonl or .parquet to write")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None, help="scoring processes, default every core")
+    args = parser.parse_args(argv)
+
+    rows = scoreFile(args.input, args.output, args.chunk_size, args.workers)
+    print(f"Scored {rows} tracks into {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,7 +16,7 @@ document.addEventListener('DOMContentLoaded', async () => {
     }
 
 
-    async function renderChart() {
+    function renderChart(data) {
         if (chart) {
             chart.destroy(); // Destroy the previous chart instance if it exists
         }
@@ -25,10 +25,6 @@ document.addEventListener('DOMContentLoaded', async () => {
         chartElement.width = 2000;
         chartElement.height = 1200;
 
-
-        const response = await fetch(`/chart_data`);
-        const chartData = await response.json();
-        const data = chartData.data;
         const labels = data.map(item => item.genre);
         const counts = data.map(item => item.count);
         const maxCount = Math.max(...counts);
@@ -75,10 +71,7 @@ document.addEventListener('DOMContentLoaded', async () => {
         };
     }
 
-    async function updateSidebarCards() {
-        const response = await fetch(`/sidebar_card_data`);
-        const sidebarCards = await response.json();
-
+    function renderSidebarCards(sidebarCards) {
         const sidebarCardContainer = document.querySelector('.recently-played-cards');
         sidebarCardContainer.innerHTML = '';
 
@@ -107,12 +100,14 @@ document.addEventListener('DOMContentLoaded', async () => {
             songArtist.textContent = song.artist;
 
             const songGene = document.createElement('p');
-            songGene.textContent = song.gene;
+            songGene.textContent = song.gene || '';
             songGene.classList.add('gene');
 
 
             const libraryIndicator = document.createElement('i');
-            if (song.is_in_library) {
+            if (song.is_in_library === null || song.is_in_library === undefined) {
+                // Library flags arrive in the last stage of the dashboard stream
+            } else if (song.is_in_library) {
                 libraryIndicator.classList.add('fas', 'fa-check-circle', 'in-library-indicator', 'library-indicator', 'in-library');
                 libraryIndicator.title = "This song is in your library";
             } else {
@@ -138,7 +133,12 @@ document.addEventListener('DOMContentLoaded', async () => {
         showLoadingScreen();
 
         try {
-            await Promise.all([renderChart(), updateSidebarCards()]);
+            const [chartResponse, sidebarResponse] = await Promise.all([
+                fetch(`/chart_data`),
+                fetch(`/sidebar_card_data`),
+            ]);
+            renderChart((await chartResponse.json()).data);
+            renderSidebarCards(await sidebarResponse.json());
         } catch (error) {
             console.error(error);
             // Handle error as needed
@@ -147,7 +147,44 @@ document.addEventListener('DOMContentLoaded', async () => {
         }
     }
 
+    function streamChartAndSidebar() {
+        showLoadingScreen();
+
+        // Each stage is rendered as soon as the server finishes it
+        const source = new EventSource(`/dashboard_stream`);
+
+        source.addEventListener('tracks', (event) => {
+            renderSidebarCards(JSON.parse(event.data).cards);
+        });
+
+        source.addEventListener('genes', (event) => {
+            const stage = JSON.parse(event.data);
+            renderSidebarCards(stage.cards);
+            renderChart(stage.chart);
+        });
+
+        source.addEventListener('library', (event) => {
+            renderSidebarCards(JSON.parse(event.data).cards);
+        });
+
+        source.addEventListener('done', (event) => {
+            console.info('Dashboard stage timings (ms):', JSON.parse(event.data).timings);
+            source.close();
+        });
 
-    // Call the function initially to render the chart and update the sidebar cards
-    await updateChartAndSidebar();
+        source.addEventListener('error', (event) => {
+            source.close();
+            hideLoadingScreen();
+            if (event.data) {
+                console.error(JSON.parse(event.data).message);
+            }
+        });
+    }
+
+    // Render the chart and sidebar cards, progressively where the browser supports it
+    if (window.EventSource) {
+        streamChartAndSidebar();
+    } else {
+        await updateChartAndSidebar();
+    }
 });
\ No newline at end of file
@@ -0,0 +1,231 @@
+import threading
+
+import pandas as pd
+
+SPOTIFY_OPEN_URL = "https://open.spotify.com"
+SPOTIFY_API_URL = "https://api.spotify.com/v1"
+
+# Audio feature columns that only restate the track ID or another column
+REDUNDANT_FEATURE_COLUMNS = ["type", "uri", "track_href", "analysis_url", "duration_ms"]
+
+FEATURE_DTYPES = {"key": "int8", "mode": "int8", "time_signature": "int8"}
+
+
+def trackURL(trackId):
+    return f"{SPOTIFY_OPEN_URL}/track/{trackId}"
+
+
+def artistURL(artistId):
+    return f"{SPOTIFY_OPEN_URL}/artist/{artistId}"
+
+
+def trackHref(trackId):
+    return f"{SPOTIFY_API_URL}/tracks/{trackId}"
+
+
+def analysisURL(trackId):
+    return f"{SPOTIFY_API_URL}/audio-analysis/{trackId}"
+
+
+def formatPopularity(popularity):
+    return f"{popularity} (0-100)"
+
+
+def formatDuration(durationMs):
+    return f"{durationMs} ms"
+
+
+def appendCategorical(frames):
+    """
+    Concatenate frames, keeping columns categorical when their categories differ.
+    """
+    frames = [frame for frame in frames if frame is not None]
+    categorical = [
+        column
+        for column in frames[0].columns
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype)
+    ]
+    combined = pd.concat(frames, ignore_index=True)
+    return combined.astype({column: "category" for column in categorical})
+
+
+def createCompactTrackFrame(trackInfo):
+    """
+    Typed track frame from Spotify track objects: integer popularity and duration,
+    categorical album type and artist IDs, and no derivable URL or list columns.
+    """
+    return pd.DataFrame(
+        {
+            "id": [track["id"] for track in trackInfo],
+            "trackName": [track["name"] for track in trackInfo],
+            "trackPopularity": pd.array(
+                [track["popularity"] for track in trackInfo], dtype="uint8"
+            ),
+            "trackDurationMs": pd.array(
+                [track["duration_ms"] for track in trackInfo], dtype="uint32"
+            ),
+            "trackExplicit": pd.array(
+                [track["explicit"] for track in trackInfo], dtype="bool"
+            ),
+            "albumName": [track["album"]["name"] for track in trackInfo],
+            "albumType": pd.Categorical(
+                [track["album"]["album_type"] for track in trackInfo]
+            ),
+            "albumReleaseDate": [track["album"]["release_date"] for track in trackInfo],
+            "artistID": pd.Categorical(
+                [track["artists"][0]["id"] for track in trackInfo]
+            ),
+            # Every credited artist, used to tell apart same-named tracks
+            "artistIDs": pd.Categorical(
+                [",".join(a["id"] for a in track["artists"]) for track in trackInfo]
+            ),
+            "albumCoverURL": [track["album"]["images"][0]["url"] for track in trackInfo],
+        }
+    )
+
+
+def compactAudioFeatures(audioFeaturesDF):
+    return audioFeaturesDF.drop(
+        columns=[c for c in REDUNDANT_FEATURE_COLUMNS if c in audioFeaturesDF]
+    ).astype({c: t for c, t in FEATURE_DTYPES.items() if c in audioFeaturesDF})
+
+
+class ArtistTable:
+    """
+    Side tables for the artists of a profile's tracks: one row per artist, one row
+    per (track, artist position) and one row per (artist, genre), all keyed by
+    interned categorical IDs instead of per-track Python lists.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.artistsDF = pd.DataFrame(
+            {
+                "artistName": pd.Series(dtype=object),
+                "artistPopularity": pd.Series(dtype="uint8"),
+            },
+            index=pd.Index([], name="artistID"),
+        )
+        self.trackArtistsDF = pd.DataFrame(
+            {
+                "id": pd.Categorical([]),
+                "position": pd.Series(dtype="uint8"),
+                "artistID": pd.Categorical([]),
+            }
+        )
+        self.artistGenresDF = pd.DataFrame(
+            {"artistID": pd.Categorical([]), "genre": pd.Categorical([])}
+        )
+
+    def add(self, trackInfo, artistInfo):
+        trackArtists = pd.DataFrame(
+            {
+                "id": pd.Categorical(
+                    [track["id"] for track in trackInfo for _ in track["artists"]]
+                ),
+                "position": pd.array(
+                    [i for track in trackInfo for i in range(len(track["artists"]))],
+                    dtype="uint8",
+                ),
+                "artistID": pd.Categorical(
+                    [a["id"] for track in trackInfo for a in track["artists"]]
+                ),
+            }
+        )
+        # Names come from the track objects, which credit every artist
+        names = {a["id"]: a["name"] for track in trackInfo for a in track["artists"]}
+        popularity = {artist["id"]: artist["popularity"] for artist in artistInfo}
+        artists = pd.DataFrame(
+            {
+                "artistName": list(names.values()),
+                "artistPopularity": pd.array(
+                    [popularity.get(artistId, 0) for artistId in names], dtype="uint8"
+                ),
+            },
+            index=pd.Index(list(names), name="artistID"),
+        )
+        genres = pd.DataFrame(
+            {
+                "artistID": pd.Categorical(
+                    [a["id"] for a in artistInfo for _ in a["genres"]]
+                ),
+                "genre": pd.Categorical([g for a in artistInfo for g in a["genres"]]),
+            }
+        )
+
+        with self.lock:
+            newArtists = artists[~artists.index.isin(self.artistsDF.index)]
+            self.artistsDF = pd.concat([self.artistsDF, newArtists])
+
+            knownTracks = set(self.trackArtistsDF["id"].astype(str))
+            trackArtists = trackArtists[~trackArtists["id"].astype(str).isin(knownTracks)]
+            if not trackArtists.empty:
+                self.trackArtistsDF = appendCategorical(
+                    [self.trackArtistsDF, trackArtists]
+                )
+
+            knownArtists = set(self.artistGenresDF["artistID"].astype(str))
+            genres = genres[~genres["artistID"].astype(str).isin(knownArtists)]
+            if not genres.empty:
+                self.artistGenresDF = appendCategorical([self.artistGenresDF, genres])
+
+    def getArtistNames(self, trackIds):
+        """
+        Credited artist names per track ID, in credit order.
+        """
+        with self.lock:
+            trackArtists = self.trackArtistsDF
+            artistsDF = self.artistsDF
+        rows = trackArtists[trackArtists["id"].isin(list(trackIds))].copy()
+        rows["artistName"] = rows["artistID"].astype(str).map(artistsDF["artistName"])
+        rows = rows.sort_values(["id", "position"])
+        return rows["artistName"].groupby(rows["id"], observed=True).agg(list)
+
+    def getArtistLinks(self, trackIds):
+        with self.lock:
+            trackArtists = self.trackArtistsDF
+        rows = trackArtists[trackArtists["id"].isin(list(trackIds))]
+        rows = rows.sort_values(["id", "position"])
+        # Aggregated as plain strings; lists can't be cast back to the categorical dtype
+        links = rows["artistID"].astype(str).map(artistURL)
+        return links.groupby(rows["id"], observed=True).agg(list)
+
+    def getGenres(self, artistIds):
+        with self.lock:
+            artistGenres = self.artistGenresDF
+        rows = artistGenres[artistGenres["artistID"].isin(list(artistIds))]
+        genres = rows["genre"].astype(str)
+        return genres.groupby(rows["artistID"], observed=True).agg(list)
+
+    def getName(self, artistId):
+        return self.artistsDF.at[artistId, "artistName"]
+
+    def getPopularity(self, artistIds):
+        return pd.Series(list(artistIds)).astype(str).map(self.artistsDF["artistPopularity"])
+
+    def withArtistColumns(self, df):
+        """
+        Copy of df with the list-valued artist columns the templates and GPT prompt
+        expect, derived from the side tables on demand.
+        """
+        df = df.copy()
+        trackIds = df["id"]
+        artistIds = df["artistID"].astype(str)
+
+        names = self.getArtistNames(trackIds)
+        links = self.getArtistLinks(trackIds)
+        genres = self.getGenres(artistIds)
+
+        df["artistNames"] = [names.get(trackId, []) for trackId in trackIds]
+        df["artistLinks"] = [links.get(trackId, []) for trackId in trackIds]
+        df["artistGenres"] = [genres.get(artistId, []) for artistId in artistIds]
+        df["artistPopularity"] = self.getPopularity(artistIds).to_numpy()
+        df["spotifyURL"] = [trackURL(trackId) for trackId in trackIds]
+        return df
+
+    def memoryUsage(self):
+        return int(
+            self.artistsDF.memory_usage(deep=True).sum()
+            + self.trackArtistsDF.memory_usage(deep=True).sum()
+            + self.artistGenresDF.memory_usage(deep=True).sum()
+        )
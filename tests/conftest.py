@@ -0,0 +1,61 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+# app.py builds its OAuth helpers at import time, so give it placeholder settings
+for name, value in {
+    "SPOTIPY_CLIENT_ID": "test",
+    "SPOTIPY_CLIENT_SECRET": "test",
+    "SPOTIPY_REDIRECT_URI": "http://localhost:5000/callback/",
+    "SPOTIFY_CLIENT_ID": "test",
+    "SPOTIFY_CLIENT_SECRET": "test",
+    "SPOTIFY_REDIRECT_URI": "http://localhost:5000/callback/",
+    "HISTORY_DB_PATH": ":memory:",
+}.items():
+    os.environ.setdefault(name, value)
+os.environ.pop("OPENAI_API_KEY", None)
+
+
+@pytest.fixture
+def webapp(monkeypatch):
+    """
+    The Flask app module with every Spotify client replaced by one FakeSpotify per
+    access token, and its response, profile and entity caches emptied.
+    """
+    import app as webapp
+    from FakeSpotify import FakeSpotify
+
+    clients = {}
+
+    def fakeClient(token_info):
+        token = token_info["access_token"]
+        if token not in clients:
+            clients[token] = FakeSpotify(userId=token)
+        return clients[token]
+
+    monkeypatch.setattr(webapp, "get_spotify_client", fakeClient)
+    monkeypatch.setattr(webapp, "get_warmer_client", fakeClient)
+    webapp.cache.clear()
+    webapp.profile_cache.clear()
+    webapp.entity_cache.clear()
+    return webapp
+
+
+@pytest.fixture
+def login(webapp):
+    """
+    Test client whose session is logged in as userId, with FakeSpotify's token.
+    """
+
+    def login(userId="fake-user"):
+        client = webapp.app.test_client()
+        with client.session_transaction() as session:
+            session["logged_in"] = True
+            session["token_info"] = {"access_token": userId}
+            session["user_id"] = userId
+        return client
+
+    return login
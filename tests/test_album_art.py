@@ -0,0 +1,69 @@
+import io
+
+from AlbumArt import AlbumArtCache
+
+IMAGE = "ab67616d0000b273" + "0" * 24
+
+
+def jpeg(size=700):
+    from PIL import Image
+
+    output = io.BytesIO()
+    Image.new("RGB", (size, size), "red").save(output, format="JPEG")
+    return output.getvalue()
+
+
+def test_unknown_images_are_not_refetched_until_the_ttl_passes(tmp_path):
+    now = [0.0]
+    fetched = []
+
+    def fetcher(imageId):
+        fetched.append(imageId)
+        return None
+
+    cache = AlbumArtCache(str(tmp_path), fetcher, missingTTL=300, clock=lambda: now[0])
+
+    assert cache.get(IMAGE) is None
+    assert cache.get(IMAGE) is None
+    assert cache.get(IMAGE, 64) is None
+    assert fetched == [IMAGE]
+    assert cache.stats()["missingHits"] == 2
+
+    now[0] += 300
+    assert cache.get(IMAGE) is None
+    assert fetched == [IMAGE, IMAGE]
+
+
+def test_art_requires_a_session(webapp, monkeypatch, login):
+    fetched = []
+    monkeypatch.setattr(webapp.album_art_cache, "fetcher", fetched.append)
+
+    response = webapp.app.test_client().get(f"/art/{IMAGE}")
+    assert response.status_code == 401
+    assert fetched == []
+
+    response = login().get(f"/art/{IMAGE}")
+    assert response.status_code == 404
+    assert "max-age=" in response.headers["Cache-Control"]
+    assert fetched == [IMAGE]
+
+
+def test_per_key_state_stays_bounded(tmp_path):
+    cache = AlbumArtCache(str(tmp_path), lambda imageId: jpeg(), maxRefs=2)
+    images = [f"{i:016x}" for i in range(3)]
+    for image in images:
+        for size in (640, 64):
+            assert cache.get(image, size) is not None
+
+    assert cache.keyLocks == {}
+    assert list(cache.refs) == [(images[2], 640), (images[2], 64)]
+    # Refs dropped from memory are read back from disk
+    assert cache.get(images[0], 64) is not None
+    assert cache.stats()["originFetches"] == 3
+
+
+def test_served_art_is_only_cached_privately(webapp, monkeypatch, login):
+    monkeypatch.setattr(webapp.album_art_cache, "fetcher", lambda imageId: jpeg())
+    response = login().get(f"/art/{'f' * 16}?size=64")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"].startswith("private")
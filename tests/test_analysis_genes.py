@@ -0,0 +1,35 @@
+from genes import GENE_CATEGORIES
+
+
+def geneCounts(rows):
+    return {row["genre"]: row["count"] for row in rows}
+
+
+def test_ingested_analysis_reaches_history_chart_and_similarity_index(webapp, login, monkeypatch):
+    client = login("analysis-user")
+    before = geneCounts(client.get("/chart_data?scope=history").json["data"])
+    assert sum(before.values()) == 50
+
+    # The warmer's build downloads the analyses and re-scores the profile
+    monkeypatch.setattr(webapp, "ANALYSIS_INGEST", True)
+    webapp.profile_cache.clear()
+    key = ("analysis-user", "analysis-user")
+    assert webapp.warm_profile("analysis-user", {"access_token": "analysis-user"}, key)
+    user = webapp.profile_cache.get(key, None)
+    assert "timbreSpread" in user.recentTracksDF
+
+    expected = user.recentTracksDF["gene"].astype(str).value_counts().to_dict()
+    assert expected != before
+    after = geneCounts(client.get("/chart_data?scope=history").json["data"])
+    assert after == expected
+
+    index = webapp.similarity_index
+    tracks = user.recentTracksDF.drop_duplicates(subset="id")
+    indexed = [
+        GENE_CATEGORIES[index.genes[index.positions[trackId]]] for trackId in tracks["id"]
+    ]
+    assert indexed == tracks["gene"].astype(str).tolist()
+    for gene in set(indexed):
+        block = index.geneBlocks[GENE_CATEGORIES.index(gene)]
+        blockIds = {index.ids[position] for position in block.view()[2]}
+        assert set(tracks["id"][tracks["gene"] == gene]) <= blockIds
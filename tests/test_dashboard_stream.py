@@ -0,0 +1,40 @@
+import threading
+import time
+
+from FakeSpotify import FakeSpotify
+
+
+def test_stream_and_chart_build_the_profile_once(webapp, login, monkeypatch):
+    sp = FakeSpotify(userId="stream-user", latency={"tracks": 0.2})
+    monkeypatch.setattr(webapp, "get_spotify_client", lambda token_info: sp)
+
+    responses = {}
+
+    def stream():
+        responses["stream"] = login("stream-user").get("/dashboard_stream").get_data(as_text=True)
+
+    streaming = threading.Thread(target=stream)
+    streaming.start()
+    # Let the stream take the profile's lock before the chart asks for it
+    time.sleep(0.05)
+    responses["chart"] = login("stream-user").get("/chart_data")
+    streaming.join()
+
+    assert responses["chart"].status_code == 200
+    assert "event: library" in responses["stream"]
+    assert "event: done" in responses["stream"]
+    assert sp.callCounts["current_user_recently_played"] == 1
+    assert sp.callCounts["tracks"] == 1
+
+
+def test_stream_replays_cached_profile_stages(webapp, login, monkeypatch):
+    sp = FakeSpotify(userId="cached-user")
+    monkeypatch.setattr(webapp, "get_spotify_client", lambda token_info: sp)
+
+    assert login("cached-user").get("/chart_data").status_code == 200
+    sp.resetCounts()
+    body = login("cached-user").get("/dashboard_stream").get_data(as_text=True)
+
+    for stage in ("tracks", "genes", "library", "done"):
+        assert f"event: {stage}" in body
+    assert sp.callCounts == {}
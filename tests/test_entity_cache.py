@@ -0,0 +1,103 @@
+import json
+
+from EntityCache import EntityCache, RedisEntityBackend
+
+
+class FakeRedis:
+    """
+    The slice of redis.Redis RedisEntityBackend uses, with expiry on a fake clock.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.values = {}
+
+    def mget(self, keys):
+        now = self.clock()
+        return [
+            value if value is not None and expiresAt > now else None
+            for value, expiresAt in (self.values.get(key, (None, 0)) for key in keys)
+        ]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def setex(self, key, ttl, value):
+        self.commands.append((key, ttl, value))
+
+    def execute(self):
+        for key, ttl, value in self.commands:
+            self.client.values[key] = (value.encode(), self.client.clock() + ttl)
+        self.commands = []
+
+
+class Fetcher:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, ids):
+        self.calls.append(list(ids))
+        return [None if entityId == "gone" else {"id": entityId} for entityId in ids]
+
+
+def test_only_misses_are_fetched():
+    cache = EntityCache()
+    fetch = Fetcher()
+
+    assert cache.getMany("track", ["a", "b", "a"], fetch) == [{"id": "a"}, {"id": "b"}, {"id": "a"}]
+    assert cache.getMany("track", ["b", "c", "gone"], fetch) == [{"id": "b"}, {"id": "c"}, None]
+    assert fetch.calls == [["a", "b"], ["c", "gone"]]
+    assert cache.stats()["hits"] == 1
+
+
+def test_entries_expire_after_their_type_ttl():
+    now = [0.0]
+    cache = EntityCache(ttls={"track": 10, "artist": 100}, clock=lambda: now[0])
+    fetch = Fetcher()
+    cache.getMany("track", ["x"], fetch)
+    cache.getMany("artist", ["x"], fetch)
+
+    now[0] += 50
+    cache.getMany("track", ["x"], fetch)
+    cache.getMany("artist", ["x"], fetch)
+    assert fetch.calls == [["x"], ["x"], ["x"]]
+
+
+def test_least_recently_used_entries_are_evicted_past_max_bytes():
+    entrySize = len(json.dumps({"id": "a"}))
+    cache = EntityCache(maxBytes=2 * entrySize)
+    fetch = Fetcher()
+    cache.getMany("track", ["a", "b"], fetch)
+    cache.getMany("track", ["a"], fetch)
+    cache.getMany("track", ["c"], fetch)
+
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytesHeld"] == 2 * entrySize
+    cache.getMany("track", ["a", "b"], fetch)
+    assert fetch.calls[-1] == ["b"]
+
+
+def test_workers_share_lookups_through_the_backend():
+    now = [0.0]
+    clock = lambda: now[0]
+    redis = FakeRedis(clock)
+    first = EntityCache(ttls={"track": 10}, backend=RedisEntityBackend(redis), clock=clock)
+    second = EntityCache(ttls={"track": 10}, backend=RedisEntityBackend(redis), clock=clock)
+    fetch = Fetcher()
+
+    first.getMany("track", ["a", "b"], fetch)
+    assert second.getMany("track", ["a", "b", "c"], fetch) == [{"id": "a"}, {"id": "b"}, {"id": "c"}]
+    assert fetch.calls == [["a", "b"], ["c"]]
+    assert second.stats()["backendHits"] == 2
+
+    # The shared copies expire with the type's TTL too
+    now[0] += 11
+    second.clear()
+    second.getMany("track", ["a"], fetch)
+    assert fetch.calls[-1] == ["a"]
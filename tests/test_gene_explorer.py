@@ -0,0 +1,36 @@
+from GeneExplorer import countWeightSettings
+
+
+def test_only_weights_count_as_weight_settings():
+    grid = {
+        "tempoThreshold": [90, 100, 110],
+        "moodThreshold": [0.4, 0.5],
+        "energyWeight": [0.1, 0.2],
+        "speechinessWeight": [0.2, 0.25, 0.3],
+    }
+    assert countWeightSettings(grid) == 6
+    assert countWeightSettings({"tempoThreshold": list(range(1000))}) == 1
+
+
+def test_explore_caps_weight_combinations(webapp, login, monkeypatch):
+    monkeypatch.setattr(webapp, "MAX_EXPLORE_WEIGHT_SETTINGS", 4)
+    client = login("explore-user")
+
+    thresholds = {"tempoThreshold": list(range(60, 160, 5)), "moodThreshold": [0.4, 0.5, 0.6]}
+    response = client.post("/genes/explore", json={"grid": {**thresholds, "energyWeight": [0.1, 0.2]}})
+    assert response.status_code == 200
+    assert len(response.json["user"]["variants"]) == 120
+
+    response = client.post(
+        "/genes/explore", json={"grid": {"energyWeight": [0.1, 0.15, 0.2, 0.25, 0.3]}}
+    )
+    assert response.status_code == 400
+    assert "weight combinations" in response.json["error"]
+
+
+def test_explore_rejects_bodies_that_are_not_objects(login):
+    client = login("explore-body-user")
+    for body in [[{"grid": {}}], "grid", 3, None]:
+        response = client.post("/genes/explore", json=body)
+        assert response.status_code == 400
+    assert client.post("/genes/explore", data="not json").status_code == 400
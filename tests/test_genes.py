@@ -0,0 +1,80 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from genes import ANALYSIS_GENE_FEATURES, ANALYSIS_TYPICAL, GENE_MODEL, calculateGenes
+from UserGenes import UserGenes
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+from bench_genes import makeFeatures  # noqa: E402
+
+
+def track(energy, **overrides):
+    """
+    A slow, vocal, sad track whose texture rests on energy alone: its normalized
+    complexity score is (0.2 * energy + 1) / 2 against the 0.55 threshold.
+    """
+    features = {
+        "valence": 0.0,
+        "mode": 0,
+        "tempo": 0.0,
+        "instrumentalness": 0.0,
+        "speechiness": 0.0,
+        "acousticness": 0.0,
+        "energy": energy,
+        "danceability": 0.0,
+        "time_signature": 4,
+    }
+    return {**features, **overrides}
+
+
+BUSY = {name: 2 * value for name, value in ANALYSIS_TYPICAL.items()}
+SPARSE = {name: value / 4 for name, value in ANALYSIS_TYPICAL.items()}
+
+
+def texture(row):
+    vectorized = str(calculateGenes(pd.DataFrame([row]))[0])
+    # calculateGene does not touch self
+    assert UserGenes.calculateGene(None, row) == vectorized
+    return vectorized[2]
+
+
+def test_typical_analysis_leaves_the_texture_alone():
+    assert set(ANALYSIS_GENE_FEATURES) == set(ANALYSIS_TYPICAL)
+    # Scores 0.545 and 0.555, either side of the threshold
+    assert texture(track(0.45, **ANALYSIS_TYPICAL)) == texture(track(0.45)) == "M"
+    assert texture(track(0.55, **ANALYSIS_TYPICAL)) == texture(track(0.55)) == "D"
+
+
+@pytest.mark.parametrize("energy", [0.45, 0.3])
+def test_busy_structure_makes_a_track_below_the_threshold_dense(energy):
+    assert texture(track(energy)) == "M"
+    assert texture(track(energy, **BUSY)) == "D"
+
+
+@pytest.mark.parametrize("energy", [0.55, 0.7])
+def test_sparse_structure_makes_a_track_above_the_threshold_minimal(energy):
+    assert texture(track(energy)) == "D"
+    assert texture(track(energy, **SPARSE)) == "M"
+
+
+def test_analysis_cannot_override_clear_audio_features():
+    # Scores 0.425 and 0.725, further from the threshold than the adjustment reaches
+    assert texture(track(0.0, acousticness=1.0, **BUSY)) == "M"
+    assert texture(track(1.0, speechiness=1.0, **SPARSE)) == "D"
+
+
+def test_row_wise_genes_follow_gene_model(monkeypatch):
+    row = track(0.45)
+    assert texture(row) == "M"
+    monkeypatch.setitem(GENE_MODEL, "complexityThreshold", 0.5)
+    assert texture(row) == "D"
+
+
+def test_row_wise_and_vectorized_genes_agree():
+    features = makeFeatures(2000)
+    rowwise = features.apply(lambda row: UserGenes.calculateGene(None, row), axis=1)
+    assert (rowwise.to_numpy() == np.asarray(calculateGenes(features), dtype=object)).all()
@@ -0,0 +1,80 @@
+import pandas as pd
+
+from EntityCache import EntityCache
+from FakeSpotify import PLAY_INTERVAL_MS, FakeSpotify
+from HistoryStore import SQLiteHistoryStore
+from UserGenes import UserGenes
+
+
+class RecordingSpotify(FakeSpotify):
+    """
+    FakeSpotify that also records the IDs each batch endpoint was asked for.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requested = {}
+
+    def record(self, endpoint, ids):
+        with self.lock:
+            self.requested.setdefault(endpoint, []).extend(ids)
+
+    def tracks(self, tracks, market=None):
+        self.record("tracks", tracks)
+        return super().tracks(tracks, market)
+
+    def audio_features(self, tracks=[]):
+        self.record("audio_features", tracks)
+        return super().audio_features(tracks)
+
+    def resetCounts(self):
+        super().resetCounts()
+        self.requested = {}
+
+
+def build(sp, store, cache):
+    user = UserGenes(sp, entityCache=cache, historyStore=store, userId=sp.userId)
+    user.initTracksDF()
+    return user
+
+
+def test_second_build_fetches_only_new_plays():
+    sp = RecordingSpotify()
+    store = SQLiteHistoryStore(":memory:")
+    cache = EntityCache()
+
+    first = build(sp, store, cache)
+    assert len(first.recentPlays) == 50
+    assert store.latestCursor(sp.userId) is not None
+
+    # Two more plays, of tracks the first build never saw
+    sp.now += pd.Timedelta(milliseconds=2 * PLAY_INTERVAL_MS)
+    sp.resetCounts()
+    second = build(sp, store, cache)
+
+    newIds = [trackId for trackId, _ in second.recentPlays[:2]]
+    assert not set(newIds) & set(first.recentTracksDF["id"])
+    assert sp.callCounts["current_user_recently_played"] == 1
+    assert sorted(sp.requested["tracks"]) == sorted(newIds)
+    assert sorted(sp.requested["audio_features"]) == sorted(newIds)
+
+    # The window still covers the latest 50 plays, and the new ones are in the history
+    assert second.recentPlays[2:] == first.recentPlays[:48]
+    assert second.latestPlayedAt == second.recentPlays[0][1]
+    assert store.knownTrackIds(newIds) == set(newIds)
+    assert sum(row["count"] for row in store.geneCounts(sp.userId)) == 52
+
+
+def test_sync_history_scores_only_unseen_tracks():
+    sp = RecordingSpotify()
+    store = SQLiteHistoryStore(":memory:")
+    user = UserGenes(sp, historyStore=store, userId=sp.userId)
+
+    assert user.syncHistory() == 50
+    sp.resetCounts()
+    assert user.syncHistory() == 0
+    assert "audio_features" not in sp.callCounts
+
+    sp.now += pd.Timedelta(milliseconds=PLAY_INTERVAL_MS)
+    assert user.syncHistory() == 1
+    assert len(sp.requested["audio_features"]) == 1
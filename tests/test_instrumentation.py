@@ -0,0 +1,60 @@
+from FakeSpotify import FakeSpotify
+from Instrumentation import Instrumentation, instrumentation
+from Recommender import Recommender
+from UserGenes import UserGenes
+
+
+def test_metrics_and_traces_are_off_without_a_token(webapp, monkeypatch):
+    monkeypatch.setattr(webapp, "METRICS_TOKEN", None)
+    client = webapp.app.test_client()
+    assert client.get("/metrics").status_code == 404
+    assert client.get("/debug/traces").status_code == 404
+
+
+def test_metrics_and_traces_need_the_token(webapp, monkeypatch):
+    monkeypatch.setattr(webapp, "METRICS_TOKEN", "scrape-secret")
+    client = webapp.app.test_client()
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/debug/traces", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    authorized = {"Authorization": "Bearer scrape-secret"}
+    assert client.get("/metrics", headers=authorized).status_code == 200
+    assert client.get("/debug/traces", headers=authorized).status_code == 200
+
+
+def test_traces_record_route_templates_not_paths(webapp, login, monkeypatch):
+    monkeypatch.setattr(webapp, "METRICS_TOKEN", "scrape-secret")
+    login("trace-user").get("/summary/0123456789abcdef")
+
+    traces = webapp.app.test_client().get(
+        "/debug/traces", headers={"Authorization": "Bearer scrape-secret"}
+    ).json
+    summaryTrace = next(trace for trace in traces if trace["name"] == "summary_status")
+    assert summaryTrace["labels"]["route"] == "/summary/<job_id>"
+    assert "0123456789abcdef" not in str(traces)
+
+
+def test_handled_errors_are_counted_and_marked_on_the_span():
+    metrics = Instrumentation()
+    root = metrics.startTrace("request")
+    with metrics.span("work") as span:
+        metrics.recordError("work.step", ValueError("boom"))
+    metrics.finishTrace(root)
+
+    assert span.error == "ValueError"
+    assert 'handled_errors_total{error="ValueError",where="work.step"} 1' in metrics.renderPrometheus()
+
+
+def test_failed_recommendations_are_recorded():
+    class FailingSpotify(FakeSpotify):
+        def recommendations(self, **kwargs):
+            raise RuntimeError("rate limited")
+
+    key = (
+        "handled_errors_total",
+        (("error", "RuntimeError"), ("where", "Recommender.fetchRecommendations")),
+    )
+    before = instrumentation.counters.get(key, 0)
+    recommender = Recommender(UserGenes(FailingSpotify()))
+    assert recommender.fetchRecommendations({"seed_tracks": ["x"]}, 5) == []
+    assert instrumentation.counters[key] == before + 1
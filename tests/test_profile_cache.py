@@ -0,0 +1,20 @@
+from ProfileCache import ProfileCache
+
+
+def test_key_locks_do_not_outlive_their_entries():
+    now = [0.0]
+    cache = ProfileCache(ttl=300, maxEntries=2, clock=lambda: now[0])
+
+    # Each token refresh replaces the user's entry and shares its lock
+    for token in ["t1", "t2", "t3"]:
+        key = ("refreshing-user", token)
+        cache.getOrBuild(key, None, lambda: object())
+    assert list(cache.keyLocks) == ["refreshing-user"]
+
+    now[0] += 301
+    assert cache.get(("refreshing-user", "t3"), None) is None
+    assert cache.keyLocks == {}
+
+    for userId in ["a", "b", "c"]:
+        cache.getOrBuild((userId, "token"), None, lambda: object())
+    assert set(cache.keyLocks) == {"b", "c"}
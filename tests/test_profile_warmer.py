@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+from ProfileWarmer import ProfileWarmer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def failingRefresh(tokenInfo):
+    raise ValueError("Spotify token could not be refreshed")
+
+
+def test_warms_are_jittered_around_the_interval(clock):
+    warmer = ProfileWarmer(
+        lambda *args: True, interval=100, jitter=0.2, clock=clock, rng=random.Random(1)
+    )
+    for i in range(20):
+        warmer.register(f"user-{i}", {"access_token": f"user-{i}"}, (f"user-{i}", f"user-{i}"))
+
+    delays = [entry["nextRunAt"] - clock.now for entry in warmer.users.values()]
+    assert all(80 <= delay <= 120 for delay in delays)
+    assert len(set(delays)) == len(delays)
+
+
+def test_due_users_are_built_through_the_profile_cache(webapp, clock):
+    key = ("warm-user", "warm-user")
+    warmer = ProfileWarmer(webapp.warm_profile, interval=100, jitter=0, clock=clock)
+    warmer.register("warm-user", {"access_token": "warm-user"}, key)
+
+    assert warmer.runDue() == 0
+    clock.now += 100
+    assert warmer.runDue() == 1
+    assert webapp.profile_cache.get(key, None) is not None
+    assert warmer.users["warm-user"]["nextRunAt"] == clock.now + 100
+
+    # Nothing played since, so the next warm only re-stamps the cached profile
+    clock.now += 100
+    assert warmer.runDue() == 1
+    assert warmer.stats()["warmed"] == 1
+    assert warmer.stats()["unchanged"] == 1
+
+
+def test_failures_back_off_and_drop_the_user(clock):
+    warmer = ProfileWarmer(
+        lambda *args: True,
+        refreshToken=failingRefresh,
+        interval=1000,
+        jitter=0,
+        retryDelay=30,
+        maxFailures=3,
+        clock=clock,
+    )
+    warmer.register("revoked-user", {"access_token": "revoked-user"}, ("revoked-user", "revoked-user"))
+    clock.now += 1000
+
+    delays = []
+    for _ in range(2):
+        assert warmer.runDue() == 1
+        delays.append(warmer.users["revoked-user"]["nextRunAt"] - clock.now)
+        clock.now += delays[-1]
+    assert delays == [30, 60]
+
+    assert warmer.runDue() == 1
+    assert not warmer.isRegistered("revoked-user")
+    assert warmer.stats()["failures"] == 3
+    assert warmer.stats()["dropped"] == 1
+
+
+def test_registration_during_a_warm_is_kept(clock):
+    newToken = {"access_token": "new-token"}
+
+    def warm(userId, tokenInfo, cacheKey):
+        # The user signs in again while their profile is being warmed
+        warmer.register(userId, newToken, (userId, "new-token"))
+        raise ValueError("Spotify token could not be refreshed")
+
+    warmer = ProfileWarmer(warm, interval=100, jitter=0, maxFailures=1, clock=clock)
+    warmer.register("busy-user", {"access_token": "old-token"}, ("busy-user", "old-token"))
+    clock.now += 100
+
+    assert warmer.runDue() == 1
+    entry = warmer.users["busy-user"]
+    assert entry["tokenInfo"] is newToken
+    assert entry["cacheKey"] == ("busy-user", "new-token")
+    assert entry["failures"] == 0
+    assert warmer.stats()["dropped"] == 0
@@ -0,0 +1,14 @@
+def test_response_generation_outlives_the_default_timeout(webapp, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("cachelib.simple.time", lambda: now[0])
+    key = "response-generation:generation-user"
+
+    webapp.invalidate_user_responses("generation-user")
+    webapp.invalidate_user_responses("generation-user")
+    assert webapp.cache.get(key) == 2
+
+    # Well past CACHE_DEFAULT_TIMEOUT, so responses cached at generation 0 stay orphaned
+    now[0] += 10 * webapp.cache_config["CACHE_DEFAULT_TIMEOUT"]
+    assert webapp.cache.get(key) == 2
+    webapp.invalidate_user_responses("generation-user")
+    assert webapp.cache.get(key) == 3
@@ -0,0 +1,16 @@
+import json
+
+import pandas as pd
+
+from scoreTracks import renderChunk
+
+
+def test_jsonl_chunks_concatenate_into_one_record_per_line():
+    chunks = [pd.DataFrame({"id": [f"{start}-{i}" for i in range(7)]}) for start in range(3)]
+    text = "".join(renderChunk(chunk, "jsonl", header=False) for chunk in chunks)
+
+    lines = text.split("\n")
+    assert lines.pop() == ""
+    assert [json.loads(line)["id"] for line in lines] == [
+        f"{start}-{i}" for start in range(3) for i in range(7)
+    ]
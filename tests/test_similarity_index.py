@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from FakeSpotify import FakeSpotify
+from genes import GENE_CATEGORIES, calculateGeneCodes
+from SimilarityIndex import SimilarityIndex, featureMatrix
+
+
+def catalogue(scale=3000):
+    return pd.DataFrame(list(FakeSpotify(scale=scale).features_.values()))
+
+
+def bruteForce(features, vector, k, gene=None):
+    rows = np.arange(len(features))
+    if gene is not None:
+        rows = rows[calculateGeneCodes(features) == GENE_CATEGORIES.index(gene)]
+    distances = ((featureMatrix(features.iloc[rows]) - vector) ** 2).sum(axis=1)
+    order = np.argsort(distances, kind="stable")[:k]
+    return features["id"].to_numpy()[rows[order]].tolist(), distances[order]
+
+
+def assertSameNeighbours(found, expected):
+    ids, distances = expected
+    assert np.allclose([d for _, d in found], distances, atol=1e-5)
+    # Ties may come back in either order
+    assert {trackId for trackId, d in found if d < distances[-1] - 1e-5} <= set(ids)
+
+
+def test_incremental_adds_match_brute_force():
+    features = catalogue()
+    index = SimilarityIndex(blockSize=1000)
+    for start in range(0, len(features), 250):
+        index.add(features.iloc[start : start + 250])
+    assert len(index) == len(features)
+    assert index.add(features.iloc[:100]) == 0
+
+    for i in (0, 17, 2024):
+        vector = featureMatrix(features.iloc[[i]])[0]
+        assertSameNeighbours(index.nearest(vector, 20), bruteForce(features, vector, 20))
+        gene = GENE_CATEGORIES[int(index.genes[i])]
+        assertSameNeighbours(
+            index.nearest(vector, 10, gene=gene), bruteForce(features, vector, 10, gene)
+        )
+
+
+def test_adds_grow_the_buffers_geometrically():
+    features = catalogue()
+    index = SimilarityIndex()
+    buffers = set()
+    for start in range(0, len(features), 10):
+        index.add(features.iloc[start : start + 10])
+        buffers.add(id(index.tracks.columns))
+    # One buffer per doubling rather than one per add
+    assert len(buffers) <= int(np.log2(len(features) / 1024)) + 2
+
+
+def test_saved_index_reloads_memory_mapped_and_keeps_growing(tmp_path):
+    features = catalogue()
+    index = SimilarityIndex()
+    index.add(features.iloc[:2000])
+    path = str(tmp_path / "similarity")
+    index.save(path)
+
+    loaded = SimilarityIndex(path)
+    assert isinstance(loaded.tracks.columns, np.memmap)
+    assert loaded.ids == index.ids
+    loaded.add(features.iloc[2000:])
+
+    vector = featureMatrix(features.iloc[[2500]])[0]
+    assertSameNeighbours(loaded.nearest(vector, 20), bruteForce(features, vector, 20))
+    assert loaded.nearestToTrack(features["id"][2500], 5)[0][0] != features["id"][2500]
+
+
+def test_update_genes_moves_tracks_between_gene_blocks():
+    features = catalogue()
+    index = SimilarityIndex()
+    index.add(features)
+
+    # Sad tracks become happy
+    changed = features[calculateGeneCodes(features) >> 3 == 1].head(50).assign(valence=1.0, mode=1)
+    assert index.updateGenes(changed) == 50
+    assert index.updateGenes(changed) == 0
+
+    codes = calculateGeneCodes(changed)
+    for trackId, code in zip(changed["id"], codes):
+        position = index.positions[trackId]
+        assert index.genes[position] == code
+        for gene, block in index.geneBlocks.items():
+            assert (position in block.view()[2]) == (gene == code)
+
+    # Only the gene moves; the stored feature vector stays as it was added
+    trackId = changed["id"].iloc[0]
+    vector = index.matrix[index.positions[trackId]]
+    assert index.nearest(vector, 1, gene=GENE_CATEGORIES[codes[0]])[0][0] == trackId
@@ -0,0 +1,138 @@
+import threading
+import time
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+from SpotifyTransport import SpotifyTransport, TokenBucket
+
+URL = "https://api.spotify.com/v1/me/player/recently-played"
+
+
+class FakeClock:
+    """
+    Clock whose sleep only moves time forward, recording each delay.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class ScriptedAdapter(BaseAdapter):
+    """
+    Answers each request with the next scripted status, or raises it when it is an
+    exception; optionally blocks every send until release is set.
+    """
+
+    def __init__(self, script, release=None):
+        super().__init__()
+        self.script = list(script)
+        self.release = release
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append(request.method)
+        if self.release is not None:
+            self.release.wait(5)
+        step = self.script.pop(0) if self.script else 200
+        if isinstance(step, Exception):
+            raise step
+        status, headers = step if isinstance(step, tuple) else (step, {})
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers)
+        response._content = b"{}"
+        response.request = request
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def transportFor(clock, adapter, **kwargs):
+    transport = SpotifyTransport(clock=clock, sleep=clock.sleep, **kwargs)
+    transport.mount("https://", adapter)
+    return transport
+
+
+def test_bucket_waits_for_tokens_and_hold_offs():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=2, clock=clock, sleep=clock.sleep)
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(0.5)
+
+    bucket.holdOff(7)
+    # Tokens refill during the hold-off, so it is the only wait
+    assert bucket.acquire() == pytest.approx(7)
+
+
+def test_retry_after_holds_off_the_next_attempt():
+    clock = FakeClock()
+    adapter = ScriptedAdapter([(429, {"Retry-After": "7"}), 200])
+    transport = transportFor(clock, adapter)
+
+    assert transport.get(URL).status_code == 200
+    assert adapter.sent == ["GET", "GET"]
+    assert clock.now >= 7
+    stats = transport.stats()["/v1/me/player/recently-played"]
+    assert stats["rateLimited"] == 1
+    assert stats["retries"] == 1
+
+
+def test_server_errors_back_off_and_give_up_after_max_retries():
+    clock = FakeClock()
+    adapter = ScriptedAdapter([503, 503, 503])
+    transport = transportFor(clock, adapter, maxRetries=2, backoffFactor=0.5)
+
+    assert transport.get(URL).status_code == 503
+    assert adapter.sent == ["GET"] * 3
+    assert clock.sleeps == [0.5, 1.0]
+
+
+def test_writes_are_not_repeated_after_server_errors():
+    clock = FakeClock()
+    adapter = ScriptedAdapter([503, requests.exceptions.ConnectionError("reset"), (429, {}), 200])
+    transport = transportFor(clock, adapter)
+
+    assert transport.post(URL).status_code == 503
+    with pytest.raises(requests.exceptions.ConnectionError):
+        transport.post(URL)
+    # Spotify did nothing with a rate-limited write, so it is sent again
+    assert transport.post(URL).status_code == 200
+    assert adapter.sent == ["POST"] * 4
+
+
+def test_identical_gets_in_flight_share_one_request():
+    release = threading.Event()
+    adapter = ScriptedAdapter([200], release=release)
+    transport = transportFor(FakeClock(), adapter)
+    headers = {"Authorization": "Bearer token"}
+
+    responses = []
+    threads = [
+        threading.Thread(target=lambda: responses.append(transport.get(URL, headers=headers)))
+        for _ in range(2)
+    ]
+    threads[0].start()
+    while not transport.inFlight:
+        time.sleep(0.001)
+    threads[1].start()
+    while transport.stats().get("/v1/me/player/recently-played", {}).get("coalesced") != 1:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert adapter.sent == ["GET"]
+    assert responses[0] is responses[1]
@@ -0,0 +1,38 @@
+import time
+
+
+def waitForSummary(client, jobId):
+    for _ in range(100):
+        response = client.get(f"/summary/{jobId}")
+        if response.status_code != 200 or response.json["status"] in ("done", "error"):
+            return response
+        time.sleep(0.01)
+    return response
+
+
+def test_summary_job_is_visible_only_to_its_owner(webapp, login):
+    owner = login("owner")
+    jobId = owner.post("/generate_summary").json["job_id"]
+
+    response = waitForSummary(owner, jobId)
+    assert response.status_code == 200
+    assert response.json["status"] == "done"
+
+    assert login("someone-else").get(f"/summary/{jobId}").status_code == 404
+    assert webapp.app.test_client().get(f"/summary/{jobId}").status_code == 404
+
+
+def test_changing_the_token_budget_does_not_reuse_cached_summaries(webapp, login, monkeypatch):
+    client = login("budget-user")
+    first = client.post("/generate_summary").json
+    assert waitForSummary(client, first["job_id"]).json["status"] == "done"
+
+    # Same tracks and budget: answered from the summary cache
+    assert client.post("/generate_summary").json["status"] == "done"
+
+    monkeypatch.setattr(webapp, "SUMMARY_TOKEN_BUDGET", webapp.SUMMARY_TOKEN_BUDGET // 2)
+    llmCalls = webapp.summary_jobs.stats()["llmCalls"]
+    second = client.post("/generate_summary").json
+    assert second["prompt"]["tokenBudget"] != first["prompt"]["tokenBudget"]
+    assert waitForSummary(client, second["job_id"]).json["status"] == "done"
+    assert webapp.summary_jobs.stats()["llmCalls"] == llmCalls + 1
@@ -0,0 +1,51 @@
+import pytest
+
+from FakeSpotify import FakeSpotify
+from HistoryStore import SQLiteHistoryStore
+from TrendEngine import TrendEngine
+from UserGenes import UserGenes
+
+
+def historyOf(*userIds):
+    store = SQLiteHistoryStore(":memory:")
+    for userId in userIds:
+        UserGenes(FakeSpotify(userId=userId), historyStore=store, userId=userId).syncHistory()
+    return store
+
+
+def test_unsupported_windows_are_rejected():
+    engine = TrendEngine(historyOf("trend-user"))
+    with pytest.raises(ValueError):
+        engine.getTrends("trend-user", "week", 5)
+    assert engine.answers == {}
+
+
+def test_answer_cache_keeps_the_most_recently_used():
+    engine = TrendEngine(historyOf("a", "b"), maxAnswers=2)
+    engine.getTrends("a", "week", 4)
+    engine.getTrends("b", "week", 4)
+    engine.getTrends("a", "week", 4)
+    engine.getTrends("a", "day", 4)
+
+    assert list(engine.answers) == [("a", "week", 4), ("a", "day", 4)]
+
+
+def test_trends_route_rejects_unsupported_windows(login):
+    client = login("trend-route-user")
+    assert client.get("/trends?window=4").status_code == 200
+    assert client.get("/trends?window=1000000").status_code == 400
+
+
+def test_trends_are_recomputed_once_the_profile_is_built(webapp, monkeypatch):
+    store = SQLiteHistoryStore(":memory:")
+    monkeypatch.setattr(webapp, "history_store", store)
+    monkeypatch.setattr(webapp, "trend_engine", TrendEngine(store))
+
+    user = webapp.new_user_profile(FakeSpotify(userId="trend-build-user"), "trend-build-user")
+    # A profile build stores the plays first and their genes later
+    user.syncHistory(scoreTracks=False)
+    assert sum(webapp.trend_engine.getTrends("trend-build-user")["plays"]) == 0
+
+    user.initTracksDF()
+    webapp.profile_built("trend-build-user", user)
+    assert sum(webapp.trend_engine.getTrends("trend-build-user")["plays"]) > 0